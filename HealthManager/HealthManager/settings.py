@@ -93,7 +93,19 @@ OAUTH2_PROVIDER = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
-    )
+    ),
+    # JSON mã hóa bằng orjson; client có thể chọn MessagePack qua Accept / Content-Type: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': (
+        'healths.renderers.ORJSONRenderer',
+        'healths.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'healths.renderers.ORJSONParser',
+        'healths.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 MIDDLEWARE = [
@@ -126,6 +138,23 @@ TEMPLATES = [
 
 MEDIA_ROOT = '%s/healths/static/' % BASE_DIR
 
+# File xuất dữ liệu người dùng, nằm ngoài static để không bị phục vụ công khai
+EXPORT_ROOT = '%s/exports/' % BASE_DIR
+
+# Số tiến trình worker chạy báo cáo dài hạn (report-jobs)
+REPORT_WORKERS = 2
+
+# Cache dùng chung cho mọi tiến trình (gunicorn worker, lệnh quản trị, worker báo cáo):
+# version dữ liệu báo cáo và danh sách chuyên gia phải đổi ở tất cả tiến trình cùng lúc.
+# Dùng Redis trong bộ nhớ để một lần đọc trúng cache rẻ hơn hẳn việc tính lại từ database.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'TIMEOUT': 60 * 60,
+    }
+}
+
 WSGI_APPLICATION = 'HealthManager.wsgi.application'
 
 
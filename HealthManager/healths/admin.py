@@ -1,12 +1,12 @@
 from django.contrib import admin
+from django.http import JsonResponse
 from django.template.response import TemplateResponse
 from django.urls import path
-from django.db.models import Avg, Sum
+from django.db.models import F
 from datetime import  date
 from django import forms
 from django.utils.html import mark_safe
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
-from django.db.models.functions import TruncWeek, TruncMonth
 from django.core.exceptions import PermissionDenied
 
 from .models import (
@@ -17,6 +17,8 @@ from .models import (
     HealthJournal, Reminder,
     ChatMessage, TrackingMode, ExpertType
 )
+from .rollups import summary_expressions
+from .charts import progress_rollups, cached_chart_data, CHART_METRICS, MAX_COMPARE_USERS
 
 # ----- User Admin -----
 class UserAdmin(admin.ModelAdmin):
@@ -53,6 +55,10 @@ class RegularUserAdminForm(forms.ModelForm):
 
         if tracking_mode == TrackingMode.PERSONAL and (trainer or nutritionist):
             raise forms.ValidationError("Chế độ cá nhân không được liên kết với chuyên gia.")
+
+        for field, expert in (('connected_trainer', trainer), ('connected_nutritionist', nutritionist)):
+            if expert and expert != getattr(self.instance, field) and expert.is_full:
+                self.add_error(field, "Chuyên gia đã nhận đủ số lượng khách hàng.")
         return cleaned_data
 
 class RegularUserAdmin(admin.ModelAdmin):
@@ -116,7 +122,7 @@ class ExpertAdminForm(forms.ModelForm):
 class ExpertAdmin(admin.ModelAdmin):
     form = ExpertAdminForm
 
-    list_display = ['id', 'user', 'get_full_name', 'expert_type', 'specialization', 'experience_years', 'active', 'created_date', 'avg_rating']
+    list_display = ['id', 'user', 'get_full_name', 'expert_type', 'specialization', 'experience_years', 'active', 'created_date', 'avg_rating', 'client_count', 'max_clients']
     list_filter = ['id', 'expert_type', 'active']
     search_fields = ['user__username', 'specialization']
 
@@ -126,9 +132,10 @@ class ExpertAdmin(admin.ModelAdmin):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
     def avg_rating(self, obj):
-        avg = obj.reviews.aggregate(avg=Avg('rating'))['avg']
+        avg = obj.avg_rating
         return round(avg, 2) if avg else '-'
     avg_rating.short_description = 'Rating'
+    avg_rating.admin_order_field = 'rating_score'
 
     def get_full_name(self, obj):
         return obj.user.get_full_name()
@@ -429,6 +436,45 @@ class ReportFilterForm(forms.Form):
     year = forms.IntegerField(initial=date.today().year, label="Năm")
     month = forms.IntegerField(required=False, min_value=1, max_value=12, label="Tháng")
     week = forms.IntegerField(required=False, min_value=1, max_value=53, label="Tuần")
+    compare = forms.ChoiceField(required=False, label="So sánh theo", choices=[
+        ('', 'Không so sánh'), ('user', 'Người dùng'), ('goal', 'Mục tiêu'),
+        ('gender', 'Giới tính'), ('tracking_mode', 'Chế độ theo dõi'),
+    ])
+    user_ids = forms.CharField(required=False, label="Danh sách ID người dùng (cách nhau dấu phẩy)")
+    metric = forms.ChoiceField(required=False, label="Chỉ số so sánh", choices=list(CHART_METRICS.items()))
+
+    def clean_user_ids(self):
+        raw = self.cleaned_data.get('user_ids') or ''
+        try:
+            ids = sorted({int(part) for part in raw.split(',') if part.strip()})
+        except ValueError:
+            raise forms.ValidationError("ID người dùng phải là số.")
+        return tuple(ids)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        ids = set(cleaned_data.get('user_ids') or ())
+        if cleaned_data.get('user_id'):
+            ids.add(cleaned_data['user_id'])
+        if len(ids) > MAX_COMPARE_USERS:
+            self.add_error('user_ids', f"Tối đa {MAX_COMPARE_USERS} người dùng.")
+        elif cleaned_data.get('compare') == 'user' and not ids:
+            # Không giới hạn thì mỗi người dùng trong bảng là một chuỗi
+            self.add_error('user_ids', "So sánh theo người dùng cần nhập ID người dùng.")
+        return cleaned_data
+
+    def chart_filters(self):
+        data = self.cleaned_data
+        user_ids = data.get('user_ids') or ()
+        if data.get('user_id'):
+            user_ids = tuple(sorted(set(user_ids) | {data['user_id']}))
+        return {
+            'year': data['year'],
+            'month': data.get('month'),
+            'week': data.get('week'),
+            'user_ids': user_ids,
+            'compare': data.get('compare') or None,
+        }
 
 class HealthAdminSite(admin.AdminSite):
     site_header = 'Hệ thống Quản Lý Sức Khỏe Và Theo Dõi Hoạt Động Cá Nhân'
@@ -436,35 +482,23 @@ class HealthAdminSite(admin.AdminSite):
     index_title = "Bảng điều khiển quản trị"
 
     def get_urls(self):
-        return [path('user-progress/', self.user_progress_view)] + super().get_urls()
+        return [
+            path('user-progress/', self.admin_view(self.user_progress_view)),
+            path('user-progress/chart-data/', self.admin_view(self.user_progress_chart_data),
+                 name='user-progress-chart-data'),
+        ] + super().get_urls()
 
     def user_progress_view(self, request):
         form = ReportFilterForm(request.GET or None)
         statistics = []
 
         if form.is_valid():
-            user_id = form.cleaned_data.get('user_id')
-            year = form.cleaned_data.get('year')
-            month = form.cleaned_data.get('month')
-            week = form.cleaned_data.get('week')
-
-
-            qs = HealthTracking.objects.filter(date__year=year)
-            if user_id:
-                qs = qs.filter(user_id=user_id)
-
-            if week:
-                qs = qs.filter(date__week=week, date__year=year).annotate(period=TruncWeek('date'))
-            elif month:
-                qs = qs.filter(date__month=month).annotate(period=TruncMonth('date'))
-            else:
-                qs = qs.annotate(period=TruncMonth('date'))
-
-            statistics = qs.values('period').annotate(
-                total_steps=Sum('steps'),
-                avg_bmi=Avg('bmi'),
-                avg_heart_rate=Avg('heart_rate'),
-                total_water_intake=Sum('water_intake'),
+            filters = form.chart_filters()
+
+            # Đọc từ bảng tổng hợp theo tuần/tháng thay vì gom nhóm lại HealthTracking mỗi lần tải trang
+            qs = progress_rollups(filters['year'], filters['month'], filters['week'], filters['user_ids'])
+            statistics = qs.values(period=F('period_start')).annotate(
+                **summary_expressions()
             ).order_by('period')
 
         return TemplateResponse(request, 'admin/user_progress.html', {
@@ -472,6 +506,17 @@ class HealthAdminSite(admin.AdminSite):
             'statistics': statistics,
         })
 
+    def user_progress_chart_data(self, request):
+        """
+        Dữ liệu biểu đồ dạng JSON cho trang thống kê, có thể so sánh nhiều người dùng hoặc theo nhóm
+        (mục tiêu, giới tính, chế độ theo dõi). Kết quả được cache theo tổ hợp bộ lọc, ?refresh=1 để tính lại.
+        """
+        form = ReportFilterForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        data = cached_chart_data(refresh=request.GET.get('refresh') == '1', **form.chart_filters())
+        return JsonResponse(data)
+
 admin_site = HealthAdminSite(name='myadmin')
 
 admin_site.register(User, UserAdmin)
@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils.timezone import localdate
+
+from .models import HealthTracking, HealthAnomaly, AnomalyMetric
+
+# Số ngày trước đó dùng làm mốc so sánh
+BASELINE_WINDOW = 28
+# Cần ít nhất chừng này ngày có dữ liệu trong cửa sổ mới đánh giá
+MIN_BASELINE_DAYS = 7
+# Chỉ ghi nhận bất thường trong chừng này ngày gần nhất
+DETECTION_DAYS = 7
+Z_THRESHOLD = 3.0
+# Độ lệch chuẩn tối thiểu, tránh z-score khổng lồ khi dữ liệu gần như không đổi
+MIN_STD = {AnomalyMetric.HEART_RATE: 3.0, AnomalyMetric.STEPS: 500.0}
+# Số người dùng mỗi lần nạp vào mảng
+DETECTION_CHUNK_SIZE = 1000
+
+
+def load_matrix(user_ids, metric, start, days):
+    """
+    Nạp dữ liệu của nhiều người dùng vào ma trận (số người dùng x số ngày), ô trống là NaN.
+    Bước chân bằng 0 được coi là không có dữ liệu (giá trị mặc định khi không ghi nhận).
+    """
+    index = {user_id: row for row, user_id in enumerate(user_ids)}
+    matrix = np.full((len(user_ids), days), np.nan)
+    rows = HealthTracking.objects.filter(
+        user_id__in=user_ids, date__gte=start, date__lt=start + timedelta(days=days)
+    ).values_list('user_id', 'date', metric)
+    for user_id, day, value in rows.iterator(chunk_size=5000):
+        if value:
+            matrix[index[user_id], (day - start).days] = value
+    return matrix
+
+
+def rolling_zscores(matrix, window=BASELINE_WINDOW, min_std=0.0):
+    """
+    Tính mốc (trung bình, độ lệch chuẩn) của `window` ngày liền trước cho mọi ô cùng lúc bằng tổng tích lũy,
+    bỏ qua NaN. Trả về (z, baseline, counts) cùng kích thước với matrix.
+    """
+    present = ~np.isnan(matrix)
+    values = np.where(present, matrix, 0.0)
+    pad = np.zeros((matrix.shape[0], 1))
+    cum_count = np.concatenate([pad, np.cumsum(present, axis=1)], axis=1)
+    cum_sum = np.concatenate([pad, np.cumsum(values, axis=1)], axis=1)
+    cum_sq = np.concatenate([pad, np.cumsum(values ** 2, axis=1)], axis=1)
+
+    # Cửa sổ của ngày t là [t - window, t - 1]
+    end = np.arange(matrix.shape[1])
+    begin = np.maximum(end - window, 0)
+    counts = cum_count[:, end] - cum_count[:, begin]
+    sums = cum_sum[:, end] - cum_sum[:, begin]
+    squares = cum_sq[:, end] - cum_sq[:, begin]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+        variance = np.maximum(squares / counts - mean ** 2, 0.0)
+        std = np.maximum(np.sqrt(variance), min_std)
+        z = (matrix - mean) / std
+    return z, mean, counts
+
+
+def detect_anomalies(user_ids, today=None):
+    """
+    Phát hiện bất thường của nhiều người dùng trong một lượt và lưu lại (upsert theo user, ngày, chỉ số).
+    Bất thường cũ trong các ngày vừa tính lại mà không còn vượt ngưỡng (dữ liệu đã sửa, nhập lại) bị xóa.
+    Trả về số bất thường được ghi nhận.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    today = today or localdate()
+    days = BASELINE_WINDOW + DETECTION_DAYS
+    start = today - timedelta(days=days - 1)
+
+    anomalies = []
+    for metric in AnomalyMetric.values:
+        matrix = load_matrix(user_ids, metric, start, days)
+        z, baseline, counts = rolling_zscores(matrix, min_std=MIN_STD[metric])
+        recent = np.zeros_like(matrix, dtype=bool)
+        recent[:, -DETECTION_DAYS:] = True
+        with np.errstate(invalid='ignore'):
+            flagged = recent & (counts >= MIN_BASELINE_DAYS) & (np.abs(z) >= Z_THRESHOLD)
+        for row, col in zip(*np.nonzero(flagged)):
+            anomalies.append(HealthAnomaly(
+                user_id=user_ids[row], date=start + timedelta(days=int(col)), metric=metric,
+                value=float(matrix[row, col]), baseline=round(float(baseline[row, col]), 2),
+                z_score=round(float(z[row, col]), 2),
+            ))
+
+    options = {'update_conflicts': True, 'update_fields': ['value', 'baseline', 'z_score', 'updated_date']}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['user', 'date', 'metric']
+    # Chỉ xóa những dòng không còn đúng, dòng vẫn bất thường được upsert nên giữ nguyên is_read
+    current = {(anomaly.user_id, anomaly.date, anomaly.metric) for anomaly in anomalies}
+    existing = HealthAnomaly.objects.filter(
+        user_id__in=user_ids, date__gt=today - timedelta(days=DETECTION_DAYS), date__lte=today
+    ).values_list('id', 'user_id', 'date', 'metric')
+    stale = [anomaly_id for anomaly_id, *key in existing if tuple(key) not in current]
+    with transaction.atomic():
+        HealthAnomaly.objects.filter(id__in=stale).delete()
+        HealthAnomaly.objects.bulk_create(anomalies, batch_size=1000, **options)
+    return len(anomalies)
+
+
+def detect_in_chunks(user_ids, today=None, chunk_size=DETECTION_CHUNK_SIZE):
+    """Chạy detect_anomalies theo từng nhóm người dùng để bộ nhớ không tăng theo tổng số người dùng."""
+    user_ids = list(user_ids)
+    total = 0
+    for offset in range(0, len(user_ids), chunk_size):
+        total += detect_anomalies(user_ids[offset:offset + chunk_size], today=today)
+    return total
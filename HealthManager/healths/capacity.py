@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Count, IntegerField
+from django.db.models.functions import Coalesce
+
+from .models import Expert, RegularUser
+
+
+def release_experts(connections):
+    """Trừ số khách hàng của các chuyên gia trong `connections` (dict như RegularUser.locked_connections)."""
+    expert_ids = [expert_id for expert_id in connections.values() if expert_id is not None]
+    if expert_ids:
+        Expert.objects.filter(pk__in=expert_ids, client_count__gt=0).update(client_count=F('client_count') - 1)
+
+
+def client_count_subquery(field):
+    clients = RegularUser.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(clients.annotate(count=Count('id')).values('count'), output_field=IntegerField()), 0)
+
+
+def repair_client_counts(expert_ids=None):
+    """Đếm lại số khách hàng của chuyên gia từ RegularUser, trả về số chuyên gia được cập nhật."""
+    experts = Expert.objects.all()
+    if expert_ids:
+        experts = experts.filter(pk__in=expert_ids)
+    with transaction.atomic():
+        return experts.update(
+            client_count=client_count_subquery('connected_trainer') + client_count_subquery('connected_nutritionist')
+        )
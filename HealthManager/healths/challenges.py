@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import ChallengeParticipant, ChallengeMetric, HealthTracking
+
+# Số dòng tối đa cho một lần xem bảng xếp hạng
+MAX_LEADERBOARD_SIZE = 100
+
+
+def entries_on(user_id, day):
+    """Các lượt tham gia của người dùng vào thử thách đang diễn ra trong ngày `day`."""
+    return ChallengeParticipant.objects.filter(
+        user_id=user_id, challenge__start_date__lte=day, challenge__end_date__gte=day
+    )
+
+
+def apply_tracking_change(user_id, old=None, new=None):
+    """
+    Cộng phần chênh lệch của một bản ghi theo dõi vào điểm thử thách (cùng quy ước old/new như rollups.apply_change).
+    Mỗi (ngày, chỉ số) là một lệnh UPDATE có điều kiện, không quét lại HealthTracking.
+    """
+    deltas = {}
+    for values, sign in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        for metric in ChallengeMetric.values:
+            key = (values['date'], metric)
+            deltas[key] = deltas.get(key, 0) + sign * (values.get(metric) or 0)
+
+    with transaction.atomic():
+        for (day, metric), delta in deltas.items():
+            if delta:
+                entries_on(user_id, day).filter(challenge__metric=metric).update(score=F('score') + delta)
+
+
+def compute_score(participant):
+    challenge = participant.challenge
+    total = HealthTracking.objects.filter(
+        user_id=participant.user_id, date__gte=challenge.start_date, date__lte=challenge.end_date
+    ).aggregate(total=Sum(challenge.metric))['total']
+    return float(total or 0)
+
+
+def refresh_scores(user_id, dates):
+    """Tính lại điểm các thử thách có chứa những ngày này (dùng khi không biết giá trị cũ, ví dụ upsert hàng loạt)."""
+    dates = list(dates)
+    if not dates:
+        return
+    participants = ChallengeParticipant.objects.filter(
+        user_id=user_id, challenge__start_date__lte=max(dates), challenge__end_date__gte=min(dates)
+    ).select_related('challenge')
+    for participant in participants:
+        ChallengeParticipant.objects.filter(pk=participant.pk).update(score=compute_score(participant))
+
+
+def top_entries(challenge, limit):
+    """Top-N theo điểm, hạng đồng điểm theo kiểu 1, 2, 2, 4."""
+    rows = list(challenge.participants.order_by('-score', 'id').values(
+        'user_id', 'user__user__username', 'score'
+    )[:limit])
+    result = []
+    for position, row in enumerate(rows, start=1):
+        rank = result[-1]['rank'] if result and result[-1]['score'] == row['score'] else position
+        result.append({'rank': rank, 'user_id': row['user_id'], 'username': row['user__user__username'],
+                       'score': row['score']})
+    return result
+
+
+def rank_of(participant):
+    """Hạng = số người có điểm cao hơn + 1, đếm trên chỉ mục (challenge, -score)."""
+    higher = ChallengeParticipant.objects.filter(challenge_id=participant.challenge_id, score__gt=participant.score)
+    return higher.count() + 1
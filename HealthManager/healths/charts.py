@@ -0,0 +1,111 @@
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import F, OuterRef, Subquery
+
+from .models import HealthTrackingRollup, HealthProfile, PeriodType, HealthGoal, Gender, TrackingMode
+from .rollups import summary_expressions
+
+# Kết quả biểu đồ admin được cache theo tổ hợp bộ lọc trong chừng này giây
+CHART_CACHE_TIMEOUT = 300
+
+CHART_METRICS = {
+    'total_steps': 'Tổng bước chân',
+    'avg_heart_rate': 'Nhịp tim trung bình',
+    'total_water_intake': 'Tổng lượng nước uống',
+    'avg_bmi': 'Chỉ số BMI trung bình',
+}
+
+# Cách chia nhóm để so sánh -> (trường gom nhóm, nhãn hiển thị của từng giá trị)
+SEGMENTS = {
+    'user': ('user_id', None),
+    'goal': ('goal', dict(HealthGoal.choices)),
+    'gender': ('user__user__gender', dict(Gender.choices)),
+    'tracking_mode': ('user__tracking_mode', dict(TrackingMode.choices)),
+}
+
+# Số người dùng tối đa khi so sánh theo từng người
+MAX_COMPARE_USERS = 50
+
+
+def progress_rollups(year, month=None, week=None, user_ids=None):
+    """Các dòng tổng hợp của tuần/tháng được chọn, hoặc mọi tháng trong năm."""
+    qs = HealthTrackingRollup.objects.all()
+    if user_ids:
+        qs = qs.filter(user_id__in=user_ids)
+
+    if week:
+        try:
+            week_start = date.fromisocalendar(year, week, 1)
+        except ValueError:
+            week_start = None
+        return qs.filter(period_type=PeriodType.WEEK, period_start=week_start)
+    if month:
+        return qs.filter(period_type=PeriodType.MONTH, period_start=date(year, month, 1))
+    return qs.filter(period_type=PeriodType.MONTH, period_start__year=year)
+
+
+def chart_data(year, month=None, week=None, user_ids=None, compare=None):
+    """
+    Dữ liệu biểu đồ: nhãn các kỳ và một chuỗi cho mỗi nhóm (hoặc một chuỗi chung nếu không so sánh),
+    tất cả từ một truy vấn gom nhóm trên bảng tổng hợp.
+    """
+    if compare == 'user' and not 0 < len(user_ids or ()) <= MAX_COMPARE_USERS:
+        raise ValueError(f"So sánh theo người dùng cần từ 1 đến {MAX_COMPARE_USERS} ID người dùng.")
+    qs = progress_rollups(year, month, week, user_ids)
+    group = {'period': F('period_start')}
+    labels = None
+    if compare:
+        field, labels = SEGMENTS[compare]
+        if compare == 'goal':
+            # Mục tiêu lấy từ hồ sơ sức khỏe mới nhất của người dùng
+            latest_goal = HealthProfile.objects.filter(user=OuterRef('user_id')).order_by('-created_date', '-id')
+            qs = qs.annotate(goal=Subquery(latest_goal.values('goal')[:1]))
+            group['segment'] = F('goal')
+        else:
+            group['segment'] = F(field)
+        if compare == 'user':
+            group['username'] = F('user__user__username')
+
+    rows = qs.values(**group).annotate(**summary_expressions()).order_by('period')
+
+    periods = []
+    series = {}
+    for row in rows:
+        period = row['period'].isoformat()
+        if not periods or periods[-1] != period:
+            periods.append(period)
+        key = row.get('segment', 'all')
+        if key not in series:
+            if compare == 'user':
+                label = row['username']
+            elif compare:
+                label = labels.get(key, 'Chưa xác định')
+            else:
+                label = 'Tất cả'
+            series[key] = {'key': key, 'label': label, 'values': {}}
+        series[key]['values'][period] = {
+            name: round(float(row[name]), 2) if row[name] is not None else None for name in CHART_METRICS
+        }
+
+    return {
+        'labels': periods,
+        'metrics': CHART_METRICS,
+        'series': [{
+            'key': item['key'],
+            'label': item['label'],
+            **{name: [item['values'].get(period, {}).get(name) for period in periods] for name in CHART_METRICS},
+        } for item in series.values()],
+    }
+
+
+def cached_chart_data(refresh=False, **filters):
+    """chart_data được cache theo tổ hợp bộ lọc; refresh=True để bỏ qua cache."""
+    signature = repr(sorted((name, value) for name, value in filters.items()))
+    key = 'admin:chart:' + hashlib.md5(signature.encode()).hexdigest()
+    data = None if refresh else cache.get(key)
+    if data is None:
+        data = chart_data(**filters)
+        cache.set(key, data, timeout=CHART_CACHE_TIMEOUT)
+    return data
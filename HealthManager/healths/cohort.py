@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.db.models import OuterRef, Subquery, F, FloatField, IntegerField, ExpressionWrapper, Value, Count, Sum
+from django.db.models.functions import NullIf, Coalesce
+
+from .models import HealthProfile, HealthTracking, HealthTrackingRollup, PeriodType
+
+# Các chỉ số số học được phép sắp xếp và lọc bằng ?min_<tên>= / ?max_<tên>=
+COHORT_METRICS = ('weight', 'height', 'last_bmi', 'last_steps', 'last_heart_rate', 'last_water_intake',
+                  'week_days', 'week_steps', 'week_avg_heart_rate', 'week_water_intake')
+
+COHORT_ORDERING = COHORT_METRICS + ('username', 'last_name', 'last_date', 'goal')
+
+COHORT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'tracking_mode', 'goal', 'last_date') + COHORT_METRICS
+
+
+def cohort_queryset(clients, week_start, until=None):
+    """
+    Gắn hồ sơ sức khỏe mới nhất, lần theo dõi mới nhất và tổng tuần (từ bảng tổng hợp) cho từng người dùng
+    bằng subquery, cả danh sách chỉ tốn một truy vấn. `until`: chỉ tính tuần đến hết ngày này (tuần hiện tại),
+    các bản ghi có ngày sau đó được trừ khỏi dòng tổng hợp.
+    """
+    profile = HealthProfile.objects.filter(user=OuterRef('pk')).order_by('-created_date', '-id')
+    tracking = HealthTracking.objects.filter(user=OuterRef('pk')).order_by('-date')
+    week = HealthTrackingRollup.objects.filter(user=OuterRef('pk'), period_type=PeriodType.WEEK, period_start=week_start)
+    future = HealthTracking.objects.filter(
+        user=OuterRef('pk'), date__gt=until, date__lt=week_start + timedelta(days=7)
+    ).order_by().values('user') if until else None
+
+    def week_total(counter, field, aggregate, output_field):
+        total = Coalesce(Subquery(week.values(counter)[:1]), Value(0), output_field=output_field)
+        if future is None:
+            return total
+        subtract = Subquery(future.annotate(value=aggregate(field)).values('value'), output_field=output_field)
+        return total - Coalesce(subtract, Value(0), output_field=output_field)
+
+    week_days = week_total('days', 'id', Count, IntegerField())
+    week_steps = week_total('total_steps', 'steps', Sum, IntegerField())
+    heart_rate_sum = week_total('heart_rate_sum', 'heart_rate', Sum, FloatField())
+    heart_rate_count = week_total('heart_rate_count', 'heart_rate', Count, FloatField())
+
+    return clients.annotate(
+        username=F('user__username'),
+        first_name=F('user__first_name'),
+        last_name=F('user__last_name'),
+        weight=Subquery(profile.values('weight')[:1]),
+        height=Subquery(profile.values('height')[:1]),
+        goal=Subquery(profile.values('goal')[:1]),
+        last_date=Subquery(tracking.values('date')[:1]),
+        last_bmi=Subquery(tracking.values('bmi')[:1]),
+        last_steps=Subquery(tracking.values('steps')[:1]),
+        last_heart_rate=Subquery(tracking.values('heart_rate')[:1]),
+        last_water_intake=Subquery(tracking.values('water_intake')[:1]),
+        week_days=week_days,
+        week_steps=week_steps,
+        week_avg_heart_rate=ExpressionWrapper(heart_rate_sum / NullIf(heart_rate_count, 0), output_field=FloatField()),
+        week_water_intake=week_total('total_water', 'water_intake', Sum, FloatField()),
+    )
@@ -0,0 +1,40 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Trang cũ không bao giờ bị đọc lại sau khi version đổi, timeout chỉ để dọn bộ nhớ
+DIRECTORY_CACHE_TIMEOUT = 60 * 60
+
+DIRECTORY_VERSION_KEY = 'experts:directory:version'
+
+
+def directory_version():
+    version = cache.get(DIRECTORY_VERSION_KEY)
+    if version is None:
+        cache.add(DIRECTORY_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(DIRECTORY_VERSION_KEY)
+    return version
+
+
+def bump_directory_version():
+    # Version nằm trong cache dùng chung (settings.CACHES) nên mọi tiến trình cùng thấy thay đổi.
+    # Ghi giá trị mới thay vì incr để hai lần bump đồng thời không trùng version
+    cache.set(DIRECTORY_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_directory_on_commit():
+    """Mọi trang danh sách chuyên gia hết hiệu lực sau khi transaction commit."""
+    transaction.on_commit(bump_directory_version)
+
+
+def cached_directory(expert_type, filters, compute):
+    """Dữ liệu danh sách chuyên gia đã serialize, cache theo loại chuyên gia và tổ hợp bộ lọc đã chuẩn hóa."""
+    signature = repr(sorted(filters.items()))
+    key = f"experts:directory:{directory_version()}:{expert_type}:" + hashlib.md5(signature.encode()).hexdigest()
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout=DIRECTORY_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import (DataExportJob, JobStatus, HealthProfile, HealthTracking, HealthJournal, WorkoutPlan,
+                     WorkoutSession, MealPlan, MealPlanMeal, Reminder, ChatMessage)
+
+# Số dòng đọc mỗi lần từ DB, giữ bộ nhớ ổn định bất kể lịch sử dài bao nhiêu
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            # CloudinaryField, FieldFile... chỉ cần giá trị dạng chuỗi
+            return str(o)
+
+
+def export_tables(regular_user):
+    """Danh sách (tên file trong zip, queryset) của toàn bộ dữ liệu thuộc về người dùng."""
+    user = regular_user.user
+    return [
+        ('health_profiles.ndjson', HealthProfile.objects.filter(user=regular_user)),
+        ('health_trackings.ndjson', HealthTracking.objects.filter(user=regular_user)),
+        ('health_journals.ndjson', HealthJournal.objects.filter(user=regular_user)),
+        ('workout_plans.ndjson', WorkoutPlan.objects.filter(user=regular_user)),
+        ('workout_sessions.ndjson', WorkoutSession.objects.filter(workout_plan__user=regular_user)),
+        ('meal_plans.ndjson', MealPlan.objects.filter(user=regular_user)),
+        ('meal_plan_meals.ndjson', MealPlanMeal.objects.filter(meal_plan__user=regular_user)),
+        ('reminders.ndjson', Reminder.objects.filter(user=regular_user)),
+        ('chat_messages.ndjson', ChatMessage.objects.filter(Q(sender=user) | Q(receiver=user))),
+    ]
+
+
+def iter_rows(queryset):
+    """
+    Các dòng (dict) của queryset theo pk, mỗi lô là một truy vấn `pk > pk cuối` riêng.
+    Không dùng .iterator(): trên MySQL driver vẫn nạp toàn bộ kết quả vào bộ nhớ.
+    """
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch.order_by('pk').values()[:EXPORT_CHUNK_SIZE])
+        yield from rows
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        last_pk = rows[-1]['id']
+
+
+def write_archive(job, path):
+    """Ghi từng bảng thành một file NDJSON trong zip, đọc theo lô nên không nạp cả bảng vào bộ nhớ."""
+    total = 0
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, queryset in export_tables(job.user):
+            with archive.open(name, 'w', force_zip64=True) as stream:
+                for row in iter_rows(queryset):
+                    stream.write(json.dumps(row, cls=ExportEncoder, ensure_ascii=False).encode('utf-8'))
+                    stream.write(b'\n')
+                    total += 1
+    return total
+
+
+def run_export(job_id):
+    job = DataExportJob.objects.select_related('user').get(pk=job_id)
+    updated = DataExportJob.objects.filter(pk=job_id, status=JobStatus.PENDING).update(status=JobStatus.RUNNING)
+    if not updated:
+        return job
+
+    name = f"user_{job.user_id}_{job.pk}_{now():%Y%m%d%H%M%S}.zip"
+    path = job.file.storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        job.row_count = write_archive(job, path)
+        job.file.name = name
+        job.status = JobStatus.COMPLETED
+    except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+    job.finished_date = now()
+    job.save(update_fields=['status', 'file', 'row_count', 'error', 'finished_date', 'updated_date'])
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_export(job_id)
+    finally:
+        # Luồng nền có kết nối DB riêng, phải tự đóng
+        connection.close()
+
+
+def start_export(regular_user):
+    """Tạo job xuất dữ liệu và chạy nền sau khi transaction hiện tại commit."""
+    job = DataExportJob.objects.create(user=regular_user)
+    transaction.on_commit(lambda: threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True).start())
+    return job
@@ -0,0 +1,338 @@
+import codecs
+import csv
+import math
+import time
+import zipfile
+from datetime import date, datetime
+from xml.etree.ElementTree import iterparse
+
+from django.db import transaction, close_old_connections
+from django.utils.timezone import now
+
+from .models import HealthTracking, HealthProfile, HealthImportJob, JobStatus
+from .report_jobs import submit
+
+# Số ngày ghi vào DB trong một transaction
+IMPORT_BATCH_SIZE = 1000
+
+IMPORT_FORMATS = ('csv', 'xml')
+
+# Giới hạn của PositiveIntegerField: giá trị (hoặc tổng trong ngày) vượt quá bị tính là không hợp lệ
+MAX_METRIC_VALUE = 2147483647
+
+
+class ConflictMode:
+    UPDATE = 'update'  # ghi đè các chỉ số có trong file, giữ nguyên chỉ số không có
+    SKIP = 'skip'  # bỏ qua những ngày đã có bản ghi
+
+    choices = (UPDATE, SKIP)
+
+
+# Apple Health: loại bản ghi -> (trường, đơn vị -> hệ số quy đổi)
+APPLE_RECORD_TYPES = {
+    'HKQuantityTypeIdentifierStepCount': ('steps', {'count': 1}),
+    'HKQuantityTypeIdentifierHeartRate': ('heart_rate', {'count/min': 1}),
+    'HKQuantityTypeIdentifierDietaryWater': ('water_intake', {'mL': 0.001, 'L': 1, 'fl_oz_us': 0.0295735}),
+    'HKQuantityTypeIdentifierBodyMass': ('weight', {'kg': 1, 'lb': 0.45359237}),
+    'HKQuantityTypeIdentifierHeight': ('height', {'cm': 1, 'm': 100, 'in': 2.54, 'ft': 30.48}),
+}
+
+# Tên cột CSV được chấp nhận cho mỗi trường (không phân biệt hoa thường)
+CSV_COLUMNS = {
+    'date': ('date', 'day', 'ngay'),
+    'steps': ('steps', 'step_count', 'buoc_chan'),
+    'heart_rate': ('heart_rate', 'heartrate', 'bpm', 'nhip_tim'),
+    'water_intake': ('water_intake', 'water', 'nuoc'),
+    'weight': ('weight', 'can_nang'),
+    'height': ('height', 'chieu_cao'),
+}
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.xml') or name.endswith('.zip'):
+        return 'xml'
+    return None
+
+
+def parse_day(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        pass
+    for fmt in ('%d/%m/%Y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(value.split()[0], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_value(value):
+    """Số thực hữu hạn trong khoảng [0, MAX_METRIC_VALUE], None nếu không đọc được (kể cả inf, nan, 1e30)."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or not 0 <= number <= MAX_METRIC_VALUE:
+        return None
+    return number
+
+
+def iter_csv_records(stream):
+    """Đọc CSV từng dòng, sinh ra (ngày, trường, giá trị, nguồn); CSV không có nguồn nên nguồn là None."""
+    reader = csv.reader(codecs.iterdecode(stream, 'utf-8-sig'))
+    header = [column.strip().lower() for column in next(reader, [])]
+    columns = {}
+    for field, names in CSV_COLUMNS.items():
+        for index, column in enumerate(header):
+            if column in names:
+                columns[field] = index
+                break
+    if 'date' not in columns:
+        raise ValueError("File CSV phải có cột 'date'.")
+
+    for row in reader:
+        try:
+            day = parse_day(row[columns['date']])
+        except IndexError:
+            day = None
+        if day is None:
+            yield None, None, None, None
+            continue
+        for field, index in columns.items():
+            if field == 'date' or index >= len(row) or not row[index].strip():
+                continue
+            value = parse_value(row[index])
+            if value is None:
+                yield None, None, None, None
+            else:
+                yield day, field, value, None
+
+
+def iter_apple_health_records(stream):
+    """
+    Đọc export.xml của Apple Health bằng iterparse, sinh ra (ngày, trường, giá trị, sourceName).
+    Phần tử đã đọc được xóa khỏi cây ngay, nên bộ nhớ không tăng theo kích thước file.
+    """
+    events = iterparse(stream, events=('start', 'end'))
+    _, root = next(events)
+    depth = 0
+    for event, elem in events:
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth:
+            continue
+        # Hết một phần tử con trực tiếp của gốc (Record, Workout, ...)
+        mapping = APPLE_RECORD_TYPES.get(elem.get('type')) if elem.tag == 'Record' else None
+        if mapping:
+            field, units = mapping
+            factor = units.get(elem.get('unit'))
+            day = parse_day(elem.get('startDate'))
+            value = parse_value(elem.get('value'))
+            if factor is None or day is None or value is None:
+                yield None, None, None, None
+            else:
+                yield day, field, value * factor, elem.get('sourceName')
+        root.clear()
+
+
+def open_apple_export(stream):
+    """File .zip từ Apple Health chứa apple_health_export/export.xml, giải nén dạng luồng."""
+    if not zipfile.is_zipfile(stream):
+        stream.seek(0)
+        return stream
+    stream.seek(0)
+    archive = zipfile.ZipFile(stream)
+    for name in archive.namelist():
+        if name.endswith('export.xml'):
+            return archive.open(name)
+    raise ValueError("Không tìm thấy export.xml trong file zip.")
+
+
+class DailyAccumulator:
+    """
+    Gộp các bản ghi thô theo ngày: cộng dồn bước chân/nước, trung bình nhịp tim, giữ số đo cơ thể mới nhất.
+    Bước chân/nước được cộng riêng theo nguồn (iPhone, Apple Watch... cùng ghi một hoạt động) và mỗi ngày lấy
+    nguồn có tổng lớn nhất, tránh đếm trùng.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.latest_body = {}  # trường -> (ngày, giá trị)
+        self.records = 0
+        self.invalid = 0
+
+    def add(self, day, field, value, source=None):
+        # Giá trị sau khi quy đổi đơn vị cũng phải nằm trong giới hạn
+        if day is None or not 0 <= value <= MAX_METRIC_VALUE:
+            self.invalid += 1
+            return
+        self.records += 1
+        if field in ('weight', 'height'):
+            if field not in self.latest_body or day >= self.latest_body[field][0]:
+                self.latest_body[field] = (day, value)
+            return
+        bucket = self.days.setdefault(day, {})
+        if field == 'heart_rate':
+            total, count = bucket.get('heart_rate', (0.0, 0))
+            bucket['heart_rate'] = (total + value, count + 1)
+        else:
+            totals = bucket.setdefault(field, {})
+            totals[source] = totals.get(source, 0) + value
+
+    def rows(self):
+        for day in sorted(self.days):
+            bucket = self.days[day]
+            # Tổng trong ngày vượt giới hạn của cột: bỏ chỉ số đó và tính là không hợp lệ
+            for field in ('steps', 'water_intake'):
+                if field not in bucket:
+                    continue
+                bucket[field] = max(bucket[field].values())
+                if bucket[field] > MAX_METRIC_VALUE:
+                    del bucket[field]
+                    self.invalid += 1
+            row = {'date': day}
+            if 'steps' in bucket:
+                row['steps'] = max(int(round(bucket['steps'])), 0)
+            if 'heart_rate' in bucket:
+                total, count = bucket['heart_rate']
+                row['heart_rate'] = max(int(round(total / count)), 0)
+            if 'water_intake' in bucket:
+                row['water_intake'] = round(max(bucket['water_intake'], 0.0), 3)
+            yield row
+
+
+def write_rows(regular_user, rows, on_conflict):
+    """Ghi một lô theo ngày. Trả về (số tạo mới, số cập nhật, số bỏ qua)."""
+    dates = [row['date'] for row in rows]
+    existing = {
+        item['date']: item
+        for item in HealthTracking.objects.filter(user=regular_user, date__in=dates)
+        .values('date', 'steps', 'heart_rate', 'water_intake')
+    }
+    if on_conflict == ConflictMode.SKIP:
+        rows = [row for row in rows if row['date'] not in existing]
+        skipped = len(dates) - len(rows)
+    else:
+        skipped = 0
+
+    merged = []
+    for row in rows:
+        # Chỉ số không có trong file thì giữ giá trị cũ (hoặc mặc định của model)
+        base = existing.get(row['date'], {'steps': 0, 'heart_rate': None, 'water_intake': 0.0})
+        merged.append({
+            'date': row['date'],
+            'steps': row.get('steps', base['steps']),
+            'heart_rate': row.get('heart_rate', base['heart_rate']),
+            'water_intake': row.get('water_intake', base['water_intake']),
+        })
+    if not merged:
+        return 0, 0, skipped
+
+    updated = len(HealthTracking.bulk_upsert(regular_user, merged))
+    return len(merged) - updated, updated, skipped
+
+
+def update_profile(regular_user, latest_body):
+    """Tạo hồ sơ sức khỏe mới từ cân nặng/chiều cao mới nhất trong file; cần hồ sơ cũ để lấy tuổi và mục tiêu."""
+    if not latest_body:
+        return False
+    latest = regular_user.health_profiles.order_by('-created_date').first()
+    if latest is None:
+        return False
+    weight = round(latest_body['weight'][1], 1) if 'weight' in latest_body else latest.weight
+    height = round(latest_body['height'][1], 1) if 'height' in latest_body else latest.height
+    if weight == latest.weight and height == latest.height:
+        return False
+    HealthProfile.objects.create(user=regular_user, weight=weight, height=height, age=latest.age, goal=latest.goal)
+    return True
+
+
+def import_health_data(regular_user, stream, file_format, on_conflict=ConflictMode.UPDATE,
+                       batch_size=IMPORT_BATCH_SIZE):
+    """
+    Nhập dữ liệu lịch sử từ file CSV hoặc Apple Health XML (stream nhị phân).
+    File được đọc tuần tự, chỉ giữ bảng gộp theo ngày trong bộ nhớ, sau đó ghi theo lô lớn.
+    """
+    accumulator = DailyAccumulator()
+    if file_format == 'csv':
+        records = iter_csv_records(stream)
+    else:
+        records = iter_apple_health_records(open_apple_export(stream))
+    for day, field, value, source in records:
+        accumulator.add(day, field, value, source)
+
+    summary = {'records': accumulator.records, 'invalid': accumulator.invalid, 'days': len(accumulator.days),
+               'created': 0, 'updated': 0, 'skipped': 0}
+    batch = []
+    for row in accumulator.rows():
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _write_batch(regular_user, batch, on_conflict, summary)
+            batch = []
+    if batch:
+        _write_batch(regular_user, batch, on_conflict, summary)
+
+    summary['invalid'] = accumulator.invalid
+    summary['profile_updated'] = update_profile(regular_user, accumulator.latest_body)
+    return summary
+
+
+def _write_batch(regular_user, batch, on_conflict, summary):
+    with transaction.atomic():
+        created, updated, skipped = write_rows(regular_user, batch, on_conflict)
+    summary['created'] += created
+    summary['updated'] += updated
+    summary['skipped'] += skipped
+
+
+def run_import(job_id):
+    """Nhập file của một job đang chờ; file tải lên bị xóa sau khi xử lý xong dù thành công hay không."""
+    job = HealthImportJob.objects.select_related('user').get(pk=job_id)
+    updated = HealthImportJob.objects.filter(pk=job_id, status=JobStatus.PENDING).update(status=JobStatus.RUNNING)
+    if not updated:
+        return job
+
+    started = time.perf_counter()
+    try:
+        with job.file.open('rb') as stream:
+            summary = import_health_data(job.user, stream, job.file_format, job.on_conflict)
+        summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        job.summary = summary
+        job.status = JobStatus.COMPLETED
+    except (ValueError, SyntaxError) as e:  # ParseError của ElementTree kế thừa SyntaxError
+        job.status = JobStatus.FAILED
+        job.error = f"File không hợp lệ: {e}"
+    except Exception as e:
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+    job.file.delete(save=False)
+    job.finished_date = now()
+    job.save(update_fields=['status', 'file', 'summary', 'error', 'finished_date', 'updated_date'])
+    return job
+
+
+def run_import_in_worker(job_id):
+    """Chạy trong tiến trình worker của pool báo cáo."""
+    close_old_connections()
+    try:
+        run_import(job_id)
+    finally:
+        close_old_connections()
+
+
+def start_import(regular_user, upload, file_format, on_conflict):
+    """Lưu file tải lên, tạo job nhập dữ liệu và đưa vào pool worker sau khi transaction hiện tại commit."""
+    job = HealthImportJob(user=regular_user, file_format=file_format, on_conflict=on_conflict)
+    job.file.save(f"user_{regular_user.pk}_{upload.name}", upload, save=False)
+    job.save()
+    transaction.on_commit(lambda: submit(run_import_in_worker, job.pk))
+    return job
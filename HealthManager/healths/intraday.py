@@ -0,0 +1,84 @@
+import zlib
+from array import array
+
+from django.db import transaction
+
+from .models import IntradaySampleChunk, HealthTracking, SampleMetric
+
+# Mỗi ngày có 1440 ô (một ô mỗi phút), ô trống mang giá trị MISSING
+MINUTES_PER_DAY = 24 * 60
+MISSING = 0xFFFF
+MAX_SAMPLE_VALUE = MISSING - 1
+
+
+def empty_slots():
+    return array('H', [MISSING]) * MINUTES_PER_DAY
+
+
+def encode_slots(slots):
+    """
+    Mã hóa mảng 1440 ô uint16 thành blob nén.
+    Dữ liệu theo phút lặp lại nhiều (ô trống, nhịp tim ít thay đổi) nên zlib nén rất tốt.
+    """
+    return zlib.compress(array('H', slots).tobytes(), 6)
+
+
+def decode_slots(blob):
+    if not blob:
+        return empty_slots()
+    slots = array('H')
+    slots.frombytes(zlib.decompress(bytes(blob)))
+    return slots
+
+
+def iter_samples(slots):
+    for minute, value in enumerate(slots):
+        if value != MISSING:
+            yield minute, value
+
+
+def summarize(metric, slots):
+    """Giá trị theo ngày tương ứng: tổng bước chân, hoặc nhịp tim trung bình."""
+    values = [value for value in slots if value != MISSING]
+    if not values:
+        return None
+    if metric == SampleMetric.STEPS:
+        return sum(values)
+    return round(sum(values) / len(values))
+
+
+def merge_samples(user, day, metric, samples):
+    """
+    Ghi các mẫu (minute, value) của một ngày vào chunk tương ứng rồi cập nhật HealthTracking của ngày đó.
+    Chi phí mỗi lần ghi là cố định: đọc một chunk, ghi một chunk và một bản ghi theo dõi.
+    """
+    with transaction.atomic():
+        chunk, _ = IntradaySampleChunk.objects.select_for_update().get_or_create(
+            user=user, date=day, metric=metric, defaults={'samples': b''}
+        )
+        slots = decode_slots(chunk.samples)
+        for minute, value in samples:
+            slots[minute] = value
+
+        chunk.samples = encode_slots(slots)
+        chunk.sample_count = sum(1 for value in slots if value != MISSING)
+        chunk.save(update_fields=['samples', 'sample_count', 'updated_date'])
+
+        rollup_day(user, day, metric, slots)
+    return chunk
+
+
+def rollup_day(user, day, metric, slots):
+    # Dùng save() của HealthTracking để BMI vẫn được điền như khi tạo bản ghi thủ công
+    value = summarize(metric, slots)
+    tracking = HealthTracking.objects.filter(user=user, date=day).first()
+    if tracking is None:
+        if value is None:
+            return None
+        tracking = HealthTracking(user=user, date=day)
+    if metric == SampleMetric.STEPS:
+        tracking.steps = value or 0
+    else:
+        tracking.heart_rate = value
+    tracking.save()
+    return tracking
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from healths.models import HealthTracking
+from healths.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Tính lại bảng tổng hợp tuần/tháng/năm của HealthTracking từ dữ liệu gốc"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="ID RegularUser cần tính lại (có thể lặp lại), mặc định là tất cả")
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        if not user_ids:
+            user_ids = HealthTracking.objects.values_list('user_id', flat=True).distinct().order_by('user_id')
+
+        count = 0
+        for count, user_id in enumerate(user_ids, start=1):
+            refresh_rollups(user_id)
+            if count % 100 == 0:
+                self.stdout.write(f"Đã xử lý {count} người dùng...")
+
+        self.stdout.write(self.style.SUCCESS(f"Đã tính lại bảng tổng hợp cho {count} người dùng."))
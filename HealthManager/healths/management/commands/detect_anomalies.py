@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from healths.anomalies import detect_in_chunks, DETECTION_CHUNK_SIZE
+from healths.models import RegularUser
+
+
+class Command(BaseCommand):
+    help = "Phát hiện chỉ số bất thường (z-score so với các ngày trước) cho người dùng đang kết nối với chuyên gia"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="ID RegularUser cần kiểm tra (có thể lặp lại), mặc định là mọi người dùng có chuyên gia")
+        parser.add_argument('--date', help="Ngày kiểm tra (YYYY-MM-DD), mặc định là hôm nay")
+        parser.add_argument('--chunk-size', type=int, default=DETECTION_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        if not user_ids:
+            user_ids = RegularUser.objects.filter(
+                Q(connected_trainer__isnull=False) | Q(connected_nutritionist__isnull=False)
+            ).order_by('id').values_list('id', flat=True)
+
+        today = parse_date(options['date']) if options['date'] else None
+        started = time.perf_counter()
+        user_ids = list(user_ids)
+        total = detect_in_chunks(user_ids, today=today, chunk_size=options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã kiểm tra {len(user_ids)} người dùng trong {time.perf_counter() - started:.1f}s, "
+            f"ghi nhận {total} bất thường."
+        ))
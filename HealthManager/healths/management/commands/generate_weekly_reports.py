@@ -0,0 +1,35 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+
+from healths.weekly_reports import generate_weekly_reports
+
+
+class Command(BaseCommand):
+    help = "Sinh báo cáo tuần (HTML) cho mọi khách hàng của chuyên gia bằng pool tiến trình"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', help="Một ngày bất kỳ trong tuần cần báo cáo (YYYY-MM-DD), mặc định là tuần trước")
+        parser.add_argument('--expert', type=int, action='append', dest='experts',
+                            help="ID chuyên gia (có thể lặp lại), mặc định là tất cả")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Số tiến trình render, 1 để chạy tuần tự")
+        parser.add_argument('--chunk-size', type=int, default=8, help="Số báo cáo gửi cho worker mỗi lần")
+
+    def handle(self, *args, **options):
+        day = parse_date(options['week']) if options['week'] else localdate() - timedelta(days=7)
+        week_start = day - timedelta(days=day.weekday())
+
+        started = time.perf_counter()
+        count = generate_weekly_reports(week_start, options['experts'], options['workers'], options['chunk_size'])
+        elapsed = time.perf_counter() - started
+
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tạo {count} báo cáo tuần {week_start} trong {elapsed:.2f}s ({rate:.1f} báo cáo/giây, "
+            f"{options['workers']} tiến trình)."
+        ))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from healths.imports import import_health_data, detect_format, ConflictMode, IMPORT_FORMATS, IMPORT_BATCH_SIZE
+from healths.models import RegularUser
+
+
+class Command(BaseCommand):
+    help = "Nhập dữ liệu sức khỏe lịch sử từ file CSV hoặc export của Apple Health (.xml/.zip) cho một người dùng"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', type=int, help="ID RegularUser nhận dữ liệu")
+        parser.add_argument('path', help="Đường dẫn file cần nhập")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Mặc định đoán theo đuôi file")
+        parser.add_argument('--on-conflict', choices=ConflictMode.choices, default=ConflictMode.UPDATE,
+                            help="Cách xử lý ngày đã có dữ liệu")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            regular_user = RegularUser.objects.get(pk=options['user'])
+        except RegularUser.DoesNotExist:
+            raise CommandError(f"Không tìm thấy người dùng {options['user']}.")
+
+        file_format = options['format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError("Không nhận diện được định dạng file, hãy dùng --format.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                summary = import_health_data(regular_user, stream, file_format, options['on_conflict'],
+                                             batch_size=options['batch_size'])
+        except (OSError, ValueError, SyntaxError) as e:
+            raise CommandError(f"Không thể nhập file: {e}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã đọc {summary['records']} bản ghi ({summary['invalid']} lỗi) trong {elapsed:.1f}s: "
+            f"{summary['created']} ngày mới, {summary['updated']} ngày cập nhật, {summary['skipped']} ngày bỏ qua."
+        ))
+        if summary['profile_updated']:
+            self.stdout.write("Đã cập nhật hồ sơ sức khỏe theo cân nặng/chiều cao mới nhất.")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from healths.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Dựng lại chỉ mục tìm kiếm chuyên gia (tên, chuyên môn, giới thiệu) từ dữ liệu gốc"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expert', type=int, action='append', dest='experts',
+                            help="Chỉ dựng lại cho chuyên gia có id này (có thể lặp lại)")
+
+    def handle(self, *args, **options):
+        count = rebuild_index(options['experts'])
+        self.stdout.write(self.style.SUCCESS(f"Đã dựng lại chỉ mục tìm kiếm cho {count} chuyên gia."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from healths.capacity import repair_client_counts
+from healths.directory_cache import bump_directory_version
+
+
+class Command(BaseCommand):
+    help = "Đếm lại số khách hàng đang kết nối (client_count) của chuyên gia từ dữ liệu RegularUser"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expert', type=int, action='append', dest='experts',
+                            help="Chỉ đếm lại cho chuyên gia có id này (có thể lặp lại)")
+
+    def handle(self, *args, **options):
+        updated = repair_client_counts(options['experts'])
+        bump_directory_version()
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật số khách hàng cho {updated} chuyên gia."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from healths.directory_cache import bump_directory_version
+from healths.ratings import repair_ratings
+
+
+class Command(BaseCommand):
+    help = "Tính lại tổng đánh giá (rating_sum, rating_count, rating_score) của chuyên gia từ bảng Review"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expert', type=int, action='append', dest='experts',
+                            help="Chỉ tính lại cho chuyên gia có id này (có thể lặp lại)")
+
+    def handle(self, *args, **options):
+        updated = repair_ratings(options['experts'])
+        bump_directory_version()
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật đánh giá cho {updated} chuyên gia."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from healths.exports import run_export
+from healths.models import DataExportJob, JobStatus
+
+
+class Command(BaseCommand):
+    help = "Chạy các job xuất dữ liệu đang chờ (ví dụ job bị bỏ dở khi server khởi động lại)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-running', action='store_true',
+                            help="Chạy lại cả các job đang ở trạng thái 'đang xử lý'")
+
+    def handle(self, *args, **options):
+        if options['retry_running']:
+            DataExportJob.objects.filter(status=JobStatus.RUNNING).update(status=JobStatus.PENDING)
+
+        job_ids = list(DataExportJob.objects.filter(status=JobStatus.PENDING).order_by('id').values_list('id', flat=True))
+        for job_id in job_ids:
+            job = run_export(job_id)
+            self.stdout.write(f"Job {job.pk}: {job.get_status_display()} ({job.row_count} dòng)")
+
+        self.stdout.write(self.style.SUCCESS(f"Đã xử lý {len(job_ids)} job xuất dữ liệu."))
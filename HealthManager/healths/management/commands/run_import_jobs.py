@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from healths.imports import run_import
+from healths.models import HealthImportJob, JobStatus
+
+
+class Command(BaseCommand):
+    help = "Chạy các job nhập dữ liệu đang chờ (ví dụ job bị bỏ dở khi server khởi động lại)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-running', action='store_true',
+                            help="Chạy lại cả các job đang ở trạng thái 'đang xử lý'")
+
+    def handle(self, *args, **options):
+        if options['retry_running']:
+            HealthImportJob.objects.filter(status=JobStatus.RUNNING).update(status=JobStatus.PENDING)
+
+        job_ids = list(HealthImportJob.objects.filter(status=JobStatus.PENDING).order_by('id')
+                       .values_list('id', flat=True))
+        for job_id in job_ids:
+            job = run_import(job_id)
+            self.stdout.write(f"Job {job.pk}: {job.get_status_display()}")
+
+        self.stdout.write(self.style.SUCCESS(f"Đã xử lý {len(job_ids)} job nhập dữ liệu."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from healths.models import ReportJob, JobStatus
+from healths.report_jobs import run_report_job
+
+
+class Command(BaseCommand):
+    help = "Chạy các job báo cáo đang chờ ngay trong tiến trình hiện tại (ví dụ job bị bỏ dở khi server khởi động lại)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-running', action='store_true',
+                            help="Chạy lại cả các job đang ở trạng thái 'đang xử lý'")
+
+    def handle(self, *args, **options):
+        if options['retry_running']:
+            ReportJob.objects.filter(status=JobStatus.RUNNING).update(status=JobStatus.PENDING)
+
+        job_ids = list(ReportJob.objects.filter(status=JobStatus.PENDING).order_by('id').values_list('id', flat=True))
+        for job_id in job_ids:
+            run_report_job(job_id)
+            job = ReportJob.objects.get(pk=job_id)
+            self.stdout.write(f"Job {job.pk}: {job.get_status_display()}")
+
+        self.stdout.write(self.style.SUCCESS(f"Đã xử lý {len(job_ids)} job báo cáo."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0010_remove_reminder_send_at_reminder_remind_time_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntradaySampleChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('metric', models.CharField(choices=[('steps', 'Bước chân'), ('heart_rate', 'Nhịp tim')], max_length=20)),
+                ('samples', models.BinaryField()),
+                ('sample_count', models.PositiveSmallIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intraday_chunks', to='healths.regularuser')),
+            ],
+            options={
+                'unique_together': {('user', 'date', 'metric')},
+            },
+        ),
+    ]
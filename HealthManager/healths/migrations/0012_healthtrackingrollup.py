@@ -0,0 +1,61 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum, Count, FloatField
+from django.db.models.functions import TruncWeek, TruncMonth, TruncYear, Cast
+
+
+def backfill_rollups(apps, schema_editor):
+    # Như lệnh backfill_rollups: mỗi loại kỳ một truy vấn gom nhóm cho mọi người dùng
+    HealthTracking = apps.get_model('healths', 'HealthTracking')
+    HealthTrackingRollup = apps.get_model('healths', 'HealthTrackingRollup')
+    for period_type, truncate in (('week', TruncWeek), ('month', TruncMonth), ('year', TruncYear)):
+        rows = HealthTracking.objects.annotate(start=truncate('date')).values('user_id', 'start').annotate(
+            days=Count('id'),
+            total_steps=Sum('steps'),
+            heart_rate_sum=Sum('heart_rate'),
+            heart_rate_count=Count('heart_rate'),
+            total_water=Sum('water_intake'),
+            bmi_sum=Sum(Cast('bmi', FloatField())),
+            bmi_count=Count('bmi'),
+        ).order_by()
+        HealthTrackingRollup.objects.bulk_create([HealthTrackingRollup(
+            user_id=row['user_id'], period_type=period_type, period_start=row['start'],
+            days=row['days'], total_steps=row['total_steps'] or 0, heart_rate_sum=row['heart_rate_sum'] or 0,
+            heart_rate_count=row['heart_rate_count'], total_water=row['total_water'] or 0.0,
+            bmi_sum=row['bmi_sum'] or 0.0, bmi_count=row['bmi_count'],
+        ) for row in rows.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0011_intradaysamplechunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthTrackingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('period_type', models.CharField(choices=[('week', 'Tuần'), ('month', 'Tháng'), ('year', 'Năm')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('days', models.PositiveIntegerField(default=0)),
+                ('total_steps', models.BigIntegerField(default=0)),
+                ('heart_rate_sum', models.BigIntegerField(default=0)),
+                ('heart_rate_count', models.PositiveIntegerField(default=0)),
+                ('total_water', models.FloatField(default=0.0)),
+                ('bmi_sum', models.FloatField(default=0.0)),
+                ('bmi_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracking_rollups', to='healths.regularuser')),
+            ],
+            options={
+                'unique_together': {('user', 'period_type', 'period_start')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:18
+
+import django.db.models.deletion
+import healths.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0012_healthtrackingrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'Đang chờ'), ('running', 'Đang xử lý'), ('completed', 'Hoàn thành'), ('failed', 'Thất bại')], default='pending', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, storage=healths.models.export_storage, upload_to='')),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='healths.regularuser')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
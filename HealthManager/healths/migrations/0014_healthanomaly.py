@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0013_dataexportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('metric', models.CharField(choices=[('heart_rate', 'Nhịp tim'), ('steps', 'Bước chân')], max_length=20)),
+                ('value', models.FloatField()),
+                ('baseline', models.FloatField(help_text='Trung bình của các ngày trước đó')),
+                ('z_score', models.FloatField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='healths.regularuser')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-date'], name='healths_hea_user_id_026e60_idx')],
+                'unique_together': {('user', 'date', 'metric')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:32
+
+import django.db.models.deletion
+import healths.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0016_challenge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('week_start', models.DateField()),
+                ('file', models.FileField(storage=healths.models.export_storage, upload_to='')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_reports', to='healths.regularuser')),
+                ('expert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_reports', to='healths.expert')),
+            ],
+            options={
+                'unique_together': {('expert', 'client', 'week_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:36
+
+from django.db import migrations, models
+from django.db.models import Case, When, Value, F, FloatField, OuterRef, Subquery, Sum, Count, IntegerField
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    Expert = apps.get_model('healths', 'Expert')
+    Review = apps.get_model('healths', 'Review')
+    reviews = Review.objects.filter(expert=OuterRef('pk')).order_by().values('expert')
+    Expert.objects.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'),
+                                     output_field=IntegerField()), 0),
+        rating_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count'),
+                                       output_field=IntegerField()), 0),
+    )
+    Expert.objects.update(rating_score=Case(
+        When(rating_count=0, then=Value(-1.0)),
+        default=Cast('rating_sum', FloatField()) / F('rating_count'),
+        output_field=FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0017_weeklyreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expert',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='expert',
+            name='rating_score',
+            field=models.FloatField(default=-1, editable=False, help_text='Điểm trung bình, -1 nếu chưa có đánh giá'),
+        ),
+        migrations.AddField(
+            model_name='expert',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='expert',
+            index=models.Index(fields=['expert_type', '-rating_score'], name='healths_exp_expert__5db5bd_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
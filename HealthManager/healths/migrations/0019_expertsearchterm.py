@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0018_expert_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpertSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('expert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='healths.expert')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'expert'], name='healths_exp_term_301ca2_idx')],
+                'unique_together': {('expert', 'term')},
+            },
+        ),
+    ]
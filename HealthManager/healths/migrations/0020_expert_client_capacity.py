@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:46
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Count, IntegerField
+from django.db.models.functions import Coalesce
+
+
+def backfill_client_counts(apps, schema_editor):
+    Expert = apps.get_model('healths', 'Expert')
+    RegularUser = apps.get_model('healths', 'RegularUser')
+
+    def client_count(field):
+        clients = RegularUser.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        return Coalesce(Subquery(clients.annotate(count=Count('id')).values('count'), output_field=IntegerField()), 0)
+
+    Expert.objects.update(client_count=client_count('connected_trainer') + client_count('connected_nutritionist'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0019_expertsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expert',
+            name='client_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='expert',
+            name='max_clients',
+            field=models.PositiveIntegerField(blank=True, help_text='Số khách hàng tối đa, để trống nếu không giới hạn', null=True),
+        ),
+        migrations.RunPython(backfill_client_counts, migrations.RunPython.noop),
+    ]
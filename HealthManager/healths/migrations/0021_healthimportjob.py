@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:05
+
+import django.db.models.deletion
+import healths.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healths', '0020_expert_client_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'Đang chờ'), ('running', 'Đang xử lý'), ('completed', 'Hoàn thành'), ('failed', 'Thất bại')], default='pending', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, storage=healths.models.export_storage, upload_to='imports/')),
+                ('file_format', models.CharField(max_length=10)),
+                ('on_conflict', models.CharField(max_length=10)),
+                ('summary', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='healths.regularuser')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -1,8 +1,16 @@
-from django.db import models
+from django.db import models, connection, transaction
 from django.contrib.auth.models import AbstractUser
 from ckeditor.fields import RichTextField
 from cloudinary.models import CloudinaryField
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.dispatch import Signal
+
+
+# Gửi sau khi HealthTracking.bulk_upsert ghi nhiều bản ghi (bulk_create không phát post_save)
+# Tham số: user_id, dates
+tracking_bulk_saved = Signal()
 
 
 # Base Model
@@ -67,6 +75,38 @@ class MoodType(models.TextChoices):
     STRESSED = 'stressed', 'Căng thẳng'
 
 
+class PeriodType(models.TextChoices):
+    WEEK = 'week', 'Tuần'
+    MONTH = 'month', 'Tháng'
+    YEAR = 'year', 'Năm'
+
+
+class AnomalyMetric(models.TextChoices):
+    HEART_RATE = 'heart_rate', 'Nhịp tim'
+    STEPS = 'steps', 'Bước chân'
+
+
+class ChallengeMetric(models.TextChoices):
+    STEPS = 'steps', 'Bước chân'
+    WATER = 'water_intake', 'Uống nước'
+
+
+class ReportType(models.TextChoices):
+    CLIENT_PROGRESS = 'client_progress', 'Tiến độ sức khỏe và luyện tập theo kỳ'
+
+
+class JobStatus(models.TextChoices):
+    PENDING = 'pending', 'Đang chờ'
+    RUNNING = 'running', 'Đang xử lý'
+    COMPLETED = 'completed', 'Hoàn thành'
+    FAILED = 'failed', 'Thất bại'
+
+
+class SampleMetric(models.TextChoices):
+    STEPS = 'steps', 'Bước chân'
+    HEART_RATE = 'heart_rate', 'Nhịp tim'
+
+
 class ReminderType(models.TextChoices):
     WATER = 'water', 'Uống nước'
     WORKOUT = 'workout', 'Tập luyện'
@@ -91,11 +131,59 @@ class Expert(BaseModel):
     specialization = models.CharField(max_length=255)
     experience_years = models.PositiveIntegerField()
     bio = RichTextField()
+    # Tổng hợp đánh giá, được cập nhật khi ghi Review (xem healths/ratings.py)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_score = models.FloatField(default=-1, editable=False, help_text="Điểm trung bình, -1 nếu chưa có đánh giá")
+    # Số khách hàng đang kết nối, được cập nhật trong RegularUser.save
+    client_count = models.PositiveIntegerField(default=0, editable=False)
+    max_clients = models.PositiveIntegerField(null=True, blank=True,
+                                              help_text="Số khách hàng tối đa, để trống nếu không giới hạn")
+
+    class Meta:
+        indexes = [models.Index(fields=['expert_type', '-rating_score'])]
+
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    # Các bộ đếm chỉ được ghi bằng UPDATE nguyên tử (ratings.py, RegularUser.save);
+    # save() của một instance đã đọc từ trước không được ghi đè chúng bằng giá trị cũ
+    COUNTER_FIELDS = ('rating_sum', 'rating_count', 'rating_score', 'client_count')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+    @property
+    def is_full(self):
+        return self.max_clients is not None and self.client_count >= self.max_clients
+
+    @staticmethod
+    def available_filter():
+        """Điều kiện chuyên gia còn nhận thêm khách hàng."""
+        return models.Q(max_clients__isnull=True) | models.Q(client_count__lt=models.F('max_clients'))
 
     def __str__(self):
         return f"{self.user.username} - {self.get_expert_type_display()}"
 
 
+# Chỉ mục tìm kiếm chuyên gia: mỗi dòng là một từ (đã bỏ dấu) và trọng số của nó, xem healths/search.py
+class ExpertSearchTerm(models.Model):
+    expert = models.ForeignKey(Expert, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('expert', 'term')
+        indexes = [models.Index(fields=['term', 'expert'])]
+
+    def __str__(self):
+        return f"{self.term} ({self.expert_id})"
+
+
 # Regular User Model
 class RegularUser(BaseModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="regular_profile")
@@ -119,9 +207,48 @@ class RegularUser(BaseModel):
         elif self.tracking_mode == TrackingMode.CONNECTED and not (self.connected_trainer or self.connected_nutritionist):
             raise ValidationError("Phải chọn ít nhất một chuyên gia khi ở chế độ kết nối.")
 
+    CONNECTION_FIELDS = ('connected_trainer_id', 'connected_nutritionist_id')
+
+    def locked_connections(self):
+        """
+        Chuyên gia đang kết nối theo dòng hiện tại trong DB, dòng được khóa (SELECT ... FOR UPDATE) đến hết
+        transaction: hai lần lưu đồng thời từ các instance cũ sẽ lần lượt tính chênh lệch trên dữ liệu mới nhất.
+        """
+        if self._state.adding:
+            return dict.fromkeys(self.CONNECTION_FIELDS)
+        row = RegularUser.objects.select_for_update().filter(pk=self.pk).values(*self.CONNECTION_FIELDS).first()
+        return row or dict.fromkeys(self.CONNECTION_FIELDS)
+
+    def update_client_counts(self, update_fields=None):
+        """
+        Trừ số khách hàng của chuyên gia cũ, cộng cho chuyên gia mới bằng UPDATE có điều kiện:
+        chuyên gia đã đủ khách thì không có dòng nào được cập nhật và kết nối bị từ chối.
+        Phải gọi trong transaction để khóa dòng của người dùng được giữ đến khi lưu xong.
+        """
+        old = self.locked_connections()
+        changed = False
+        for field in self.CONNECTION_FIELDS:
+            if update_fields is not None and field[:-len('_id')] not in update_fields and field not in update_fields:
+                continue
+            old_id, new_id = old[field], getattr(self, field)
+            if old_id == new_id:
+                continue
+            changed = True
+            if old_id is not None:
+                Expert.objects.filter(pk=old_id, client_count__gt=0).update(client_count=models.F('client_count') - 1)
+            if new_id is not None:
+                updated = Expert.objects.filter(Expert.available_filter(), pk=new_id).update(
+                    client_count=models.F('client_count') + 1
+                )
+                if not updated:
+                    raise ValidationError("Chuyên gia đã nhận đủ số lượng khách hàng.")
+        return changed
+
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            self._connections_changed = self.update_client_counts(kwargs.get('update_fields'))
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.user.username
@@ -157,12 +284,117 @@ class HealthTracking(BaseModel):
     class Meta:
         unique_together = ['user', 'date']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giữ lại giá trị đã đọc để tính phần chênh lệch khi cập nhật bảng tổng hợp
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.bmi and self.user.health_profiles.exists():
             latest = self.user.health_profiles.latest('created_date')
-            self.bmi = latest.calculate_bmi()
+            self.bmi = round(latest.calculate_bmi(), 1)
         super().save(*args, **kwargs)
 
+    METRIC_FIELDS = ('steps', 'heart_rate', 'water_intake')
+
+    @classmethod
+    def bulk_upsert(cls, user, rows):
+        """
+        Ghi nhiều bản ghi của một người dùng bằng upsert trên (user, date).
+        Dòng chỉ gửi một phần chỉ số sẽ chỉ ghi đè các chỉ số đó: các dòng được gom theo tập trường
+        có mặt, mỗi nhóm một lệnh upsert. BMI được tính một lần cho cả lô từ hồ sơ sức khỏe mới nhất.
+        Trả về tập các ngày đã có bản ghi trước khi ghi.
+        """
+        latest = user.health_profiles.order_by('-created_date').first()
+        bmi = round(latest.calculate_bmi(), 1) if latest else None
+
+        dates = [row['date'] for row in rows]
+        existing = set(cls.objects.filter(user=user, date__in=dates).values_list('date', flat=True))
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(f for f in cls.METRIC_FIELDS if f in row), []).append(row)
+
+        with transaction.atomic():
+            for fields, group in groups.items():
+                options = {'update_conflicts': True, 'update_fields': [*fields, 'updated_date']}
+                if connection.features.supports_update_conflicts_with_target:
+                    options['unique_fields'] = ['user', 'date']
+                cls.objects.bulk_create([cls(user=user, bmi=bmi, **row) for row in group], **options)
+            # Giống save(): bản ghi cũ giữ BMI đã lưu, chỉ điền khi còn trống
+            if bmi is not None and existing:
+                cls.objects.filter(user=user, date__in=existing, bmi__isnull=True).update(bmi=bmi)
+            tracking_bulk_saved.send(sender=cls, user_id=user.pk, dates=dates)
+        return existing
+
+
+# Health Tracking Rollup
+class HealthTrackingRollup(BaseModel):
+    """
+    Tổng hợp HealthTracking theo tuần/tháng/năm của từng người dùng.
+    Được cập nhật dần khi bản ghi theo dõi thay đổi (xem healths/rollups.py).
+    """
+    user = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='tracking_rollups')
+    period_type = models.CharField(max_length=10, choices=PeriodType.choices)
+    period_start = models.DateField()
+    days = models.PositiveIntegerField(default=0)
+    total_steps = models.BigIntegerField(default=0)
+    heart_rate_sum = models.BigIntegerField(default=0)
+    heart_rate_count = models.PositiveIntegerField(default=0)
+    total_water = models.FloatField(default=0.0)
+    bmi_sum = models.FloatField(default=0.0)
+    bmi_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'period_type', 'period_start']
+
+    @property
+    def avg_heart_rate(self):
+        return self.heart_rate_sum / self.heart_rate_count if self.heart_rate_count else None
+
+    @property
+    def avg_bmi(self):
+        return self.bmi_sum / self.bmi_count if self.bmi_count else None
+
+
+# Health Anomaly
+class HealthAnomaly(BaseModel):
+    user = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='anomalies')
+    date = models.DateField()
+    metric = models.CharField(max_length=20, choices=AnomalyMetric.choices)
+    value = models.FloatField()
+    baseline = models.FloatField(help_text="Trung bình của các ngày trước đó")
+    z_score = models.FloatField()
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['user', 'date', 'metric']
+        indexes = [models.Index(fields=['user', '-date'])]
+
+    def __str__(self):
+        return f"Bất thường {self.get_metric_display()} của {self.user} ngày {self.date}"
+
+
+# Intraday Samples
+class IntradaySampleChunk(BaseModel):
+    """
+    Toàn bộ mẫu trong ngày (theo phút) của một chỉ số, lưu thành một mảng nén thay vì mỗi mẫu một dòng.
+    Xem healths/intraday.py để biết định dạng mã hóa.
+    """
+    user = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='intraday_chunks')
+    date = models.DateField()
+    metric = models.CharField(max_length=20, choices=SampleMetric.choices)
+    samples = models.BinaryField()
+    sample_count = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'date', 'metric']
+
+    def __str__(self):
+        return f"{self.user} - {self.date} - {self.metric}"
+
 
 # Workout & Plan
 class Workout(BaseModel):
@@ -309,6 +541,21 @@ class Review(models.Model):
     class Meta:
         unique_together = ('expert', 'reviewer')
 
+    def locked_values(self):
+        """
+        Chuyên gia và điểm theo dòng hiện tại trong DB (None nếu chưa có dòng), khóa dòng đến hết transaction
+        để hai lần sửa đồng thời không cùng trừ phần chênh lệch từ một điểm cũ.
+        """
+        if self._state.adding:
+            return None
+        return Review.objects.select_for_update().filter(pk=self.pk).values('expert_id', 'rating').first()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # Dùng trong signal post_save để cập nhật tổng hợp đánh giá của chuyên gia theo phần chênh lệch
+            self._previous_values = self.locked_values()
+            super().save(*args, **kwargs)
+
 
 # Chat
 class ChatMessage(BaseModel):
@@ -333,3 +580,96 @@ class ChatMessage(BaseModel):
 
     def __str__(self):
         return f"{self.sender} -> {self.receiver}"
+
+
+# Data Export
+def export_storage():
+    return FileSystemStorage(location=settings.EXPORT_ROOT)
+
+
+class DataExportJob(BaseModel):
+    user = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='export_jobs')
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING)
+    file = models.FileField(storage=export_storage, null=True, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Xuất dữ liệu {self.user} - {self.get_status_display()}"
+
+
+# Health Import
+class HealthImportJob(BaseModel):
+    user = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='import_jobs')
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING)
+    # File tải lên nằm trong thư mục riêng tư như file xuất, bị xóa sau khi nhập xong
+    file = models.FileField(storage=export_storage, upload_to='imports/', null=True, blank=True)
+    file_format = models.CharField(max_length=10)
+    on_conflict = models.CharField(max_length=10)
+    summary = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Nhập dữ liệu {self.user} - {self.get_status_display()}"
+
+
+# Report Job
+class ReportJob(BaseModel):
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    report_type = models.CharField(max_length=30, choices=ReportType.choices, default=ReportType.CLIENT_PROGRESS)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Báo cáo {self.get_report_type_display()} của {self.requested_by} - {self.get_status_display()}"
+
+
+# Challenge
+class Challenge(BaseModel):
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    metric = models.CharField(max_length=20, choices=ChallengeMetric.choices, default=ChallengeMetric.STEPS)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    def clean(self):
+        super().clean()
+        if self.start_date and self.end_date and self.end_date < self.start_date:
+            raise ValidationError("Ngày kết thúc phải lớn hơn hoặc bằng ngày bắt đầu.")
+
+    def __str__(self):
+        return self.name
+
+
+class ChallengeParticipant(BaseModel):
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='challenge_entries')
+    score = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = ['challenge', 'user']
+        # Bảng xếp hạng đọc theo chỉ mục này: top-N và đếm số người điểm cao hơn đều là quét một khoảng chỉ mục
+        indexes = [models.Index(fields=['challenge', '-score', 'id'])]
+
+    def __str__(self):
+        return f"{self.user} - {self.challenge}"
+
+
+# Weekly Report
+class WeeklyReport(BaseModel):
+    expert = models.ForeignKey(Expert, on_delete=models.CASCADE, related_name='weekly_reports')
+    client = models.ForeignKey(RegularUser, on_delete=models.CASCADE, related_name='weekly_reports')
+    week_start = models.DateField()
+    file = models.FileField(storage=export_storage)
+
+    class Meta:
+        unique_together = ['expert', 'client', 'week_start']
+
+    def __str__(self):
+        return f"Báo cáo tuần {self.week_start} của {self.client}"
@@ -0,0 +1,22 @@
+from django.db.models import Sum, Count
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+
+def daily_nutrition(plan_meals):
+    """Tổng dinh dưỡng theo ngày của các MealPlanMeal, gom nhóm trong DB (bỏ qua bữa ăn chưa có ngày)."""
+    return plan_meals.exclude(date__isnull=True).values('date').annotate(
+        meals=Count('id'), **{name: Sum(f'meal__{name}') for name in NUTRIENTS}
+    ).order_by('date')
+
+
+def summarize_days(days):
+    """Tổng và trung bình mỗi ngày từ kết quả daily_nutrition (số dòng bằng số ngày, không phải số bữa ăn)."""
+    totals = dict.fromkeys(NUTRIENTS, 0)
+    totals['meals'] = 0
+    for day in days:
+        for name in totals:
+            totals[name] += day[name] or 0
+    count = len(days)
+    average = {name: round(totals[name] / count, 1) if count else 0 for name in NUTRIENTS}
+    return {'days': count, 'totals': totals, 'daily_average': average}
@@ -1,5 +1,148 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError, FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class HealthPagination(PageNumberPagination):
-    page_size = 3
\ No newline at end of file
+    page_size = 3
+
+
+class KeysetPagination(BasePagination):
+    """
+    Phân trang theo khóa (keyset) với cursor mờ: không COUNT(*), không OFFSET,
+    nên trang sâu tốn chi phí như trang đầu tiên.
+    Thứ tự lấy từ order_by() của queryset (mặc định `ordering`), luôn được bổ sung id để ổn định.
+    """
+    ordering = ('-id',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor không hợp lệ.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        position, reverse = self.decode_cursor(request, queryset)
+        ordering = [self.flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Đi lùi thì luôn còn trang sau (trang vừa rời đi), đi tới thì còn trang trước nếu đã có cursor
+        has_next = reverse or has_more
+        has_previous = has_more if reverse else position is not None
+        self.next_position = self.position_of(rows[-1]) if rows and has_next else None
+        self.previous_position = self.position_of(rows[0]) if rows and has_previous else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.next_position, reverse=False),
+            'previous': self.encode_cursor(self.previous_position, reverse=True),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or list(self.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def position_of(self, obj):
+        values = []
+        for field in self.ordering:
+            name = 'id' if field.lstrip('-') == 'pk' else field.lstrip('-')
+            # Dòng .values() (dict) có sẵn khóa theo lookup, model instance thì đi theo thuộc tính
+            value = obj[name] if isinstance(obj, dict) else reduce(getattr, name.split('__'), obj)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    @staticmethod
+    def after(ordering, position):
+        # (a, b, c) > (x, y, z) theo từng chiều sắp xếp: a > x OR (a = x AND b > y) OR ...
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = f"{name}__lt" if field.startswith('-') else f"{name}__gt"
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def ordering_field(queryset, name):
+        """Field (hoặc output_field của annotation) ứng với một trường sắp xếp, đi theo các lookup `a__b`."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model, parts = queryset.model, name.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        field = model._meta.pk if parts[-1] == 'pk' else model._meta.get_field(parts[-1])
+        return field.target_field if field.is_relation else field
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = payload['p'], bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursor giải mã được nhưng giá trị sai kiểu (vd. ngày không hợp lệ) thì lỗi ngay ở đây, không phải khi chạy truy vấn
+        try:
+            position = [self.ordering_field(queryset, field.lstrip('-')).to_python(value)
+                        for field, value in zip(self.ordering, position)]
+        except (ValidationError, FieldDoesNotExist, TypeError, ValueError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    @staticmethod
+    def cursor_token(position, reverse):
+        """Chuỗi cursor (không kèm URL) của một vị trí, None nếu không có trang."""
+        if position is None:
+            return None
+        payload = {'p': position, 'r': 1} if reverse else {'p': position}
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+
+    def get_cursor_link(self, request, token):
+        """Link tới trang có cursor `token`, dựng từ URL (host, scheme) của chính request này."""
+        if token is None:
+            return None
+        return replace_query_param(request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def encode_cursor(self, position, reverse):
+        token = self.cursor_token(position, reverse)
+        return None if token is None else replace_query_param(self.base_url, self.cursor_query_param, token)
@@ -0,0 +1,159 @@
+from datetime import date
+
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import api_settings, ISO_8601
+
+from .models import ExpertType, WorkoutSession
+from .serializers import (DynamicFieldsMixin, HealthTrackingSerializer, ChatMessageSerializer,
+                          WorkoutSessionSerializer)
+
+# Trường serializer có biểu diễn trùng với một hàm dựng sẵn khi giá trị đọc từ DB khác None
+FAST_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+    serializers.BooleanField: bool,
+    serializers.CharField: str,
+}
+
+
+def _identity(value):
+    return value
+
+
+def _iso_format(field, setting):
+    return getattr(field, 'format', setting) in (ISO_8601, 'iso-8601')
+
+
+class DateTimeConverter:
+    """
+    Như DateTimeField.to_representation (ISO 8601, đổi sang múi giờ hiện tại, '+00:00' -> 'Z')
+    nhưng múi giờ chỉ lấy một lần cho cả danh sách thay vì mỗi dòng.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def bind(self):
+        field = self.field
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if isinstance(value, str) or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+
+def converter_for(field):
+    if isinstance(field, serializers.RelatedField):
+        # values() trả về thẳng khóa chính của quan hệ
+        return _identity
+    if isinstance(field, serializers.ChoiceField):
+        return field.to_representation
+    if isinstance(field, serializers.DateTimeField) and _iso_format(field, api_settings.DATETIME_FORMAT):
+        return DateTimeConverter(field)
+    if isinstance(field, serializers.DateField) and _iso_format(field, api_settings.DATE_FORMAT):
+        return date.isoformat
+    return FAST_CONVERTERS.get(type(field), field.to_representation)
+
+
+class Projection:
+    """
+    Đường đọc nhanh cho danh sách: dựng dict trực tiếp từ các dòng .values() theo danh sách cột biên dịch sẵn
+    từ serializer, cùng tên trường, thứ tự và định dạng giá trị, bỏ qua việc tạo model instance và máy móc
+    của từng field. `computed`: {tên trường: (các lookup cần đọc, hàm(row) -> giá trị)} cho trường không
+    đọc thẳng từ một cột (SerializerMethodField, to_representation tùy biến).
+    """
+
+    def __init__(self, serializer_class, computed=None):
+        self.serializer_class = serializer_class
+        computed = computed or {}
+        self.columns = []
+        lookups = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in computed:
+                needed, function = computed[name]
+                lookups.extend(needed)
+                self.columns.append((name, None, function))
+            else:
+                lookup = field.source.replace('.', '__')
+                lookups.append(lookup)
+                self.columns.append((name, lookup, converter_for(field)))
+        self.lookups = list(dict.fromkeys(lookups))
+
+    def queryset(self, queryset):
+        """queryset.values() với mọi cột cần thiết, kèm các trường sắp xếp để phân trang keyset."""
+        ordering = [field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)]
+        extra = [field for field in ordering if field not in self.lookups and field != 'pk']
+        return queryset.values(*self.lookups, *extra)
+
+    def render(self, rows, request=None):
+        """Danh sách dict cùng schema với serializer; tôn trọng ?fields= như DynamicFieldsMixin."""
+        columns = self.columns
+        sparse = DynamicFieldsMixin.sparse_params(request)
+        if sparse is not None and sparse[0] is not None:
+            columns = [column for column in columns if column[0] in sparse[0] or column[0] in sparse[1]]
+
+        columns = [(name, lookup, convert.bind() if isinstance(convert, DateTimeConverter) else convert)
+                   for name, lookup, convert in columns]
+        result = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in columns:
+                if lookup is None:
+                    item[name] = convert(row)
+                else:
+                    value = row[lookup]
+                    item[name] = None if value is None else convert(value)
+            result.append(item)
+        return result
+
+
+def _cloudinary_url(resource):
+    if not resource:
+        return None
+    try:
+        return resource.url
+    except Exception:
+        return None
+
+
+def _sender_name(row):
+    # Cùng cách hiển thị với ChatMessageSerializer.get_sender_name
+    name = f"{row['sender__first_name']} {row['sender__last_name']}".strip() or row['sender__username']
+    expert_type = row['sender__expert_profile__expert_type']
+    if expert_type == ExpertType.TRAINER:
+        return f"HLV {name}"
+    if expert_type == ExpertType.NUTRITIONIST:
+        return f"Chuyên gia Dinh Dưỡng {name}"
+    return name
+
+
+HEALTH_TRACKING_PROJECTION = Projection(HealthTrackingSerializer)
+
+CHAT_MESSAGE_PROJECTION = Projection(ChatMessageSerializer, computed={
+    'sender_name': (('sender__first_name', 'sender__last_name', 'sender__username',
+                     'sender__expert_profile__expert_type'), _sender_name),
+    'sender_avatar': (('sender__avatar',), lambda row: _cloudinary_url(row['sender__avatar'])),
+    'image': (('image',), lambda row: _cloudinary_url(row['image'])),
+})
+
+WORKOUT_SESSION_PROJECTION = Projection(WorkoutSessionSerializer)
+
+
+def plan_sessions(plans):
+    """
+    {id kế hoạch: [buổi tập]} cho context['plan_sessions'] của WorkoutPlanSerializer, một truy vấn cho mọi kế hoạch.
+    Giữ thứ tự mặc định của WorkoutSession, giống khi serializer đọc plan.sessions.all().
+    """
+    rows = list(WORKOUT_SESSION_PROJECTION.queryset(WorkoutSession.objects.filter(workout_plan__in=plans)))
+    sessions = {plan.pk: [] for plan in plans}
+    for row, item in zip(rows, WORKOUT_SESSION_PROJECTION.render(rows)):
+        sessions[row['workout_plan']].append(item)
+    return sessions
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import Case, When, Value, F, FloatField, OuterRef, Subquery, Sum, Count, IntegerField
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Expert, Review
+
+
+def score_expression():
+    """Điểm xếp hạng: trung bình đánh giá, -1 khi chưa có đánh giá nào (xếp cuối khi sắp xếp giảm dần)."""
+    return Case(
+        When(rating_count=0, then=Value(-1.0)),
+        default=Cast('rating_sum', FloatField()) / F('rating_count'),
+        output_field=FloatField(),
+    )
+
+
+def apply_rating_change(expert_id, sum_delta, count_delta):
+    """
+    Cộng phần chênh lệch vào tổng đánh giá bằng UPDATE nguyên tử rồi tính lại điểm từ các cột đã cập nhật.
+    Tách hai lệnh vì thứ tự gán trong một UPDATE khác nhau giữa MySQL và các DB khác.
+    """
+    if not sum_delta and not count_delta:
+        return
+    experts = Expert.objects.filter(pk=expert_id)
+    with transaction.atomic():
+        experts.update(rating_sum=F('rating_sum') + sum_delta, rating_count=F('rating_count') + count_delta)
+        experts.update(rating_score=score_expression())
+
+
+def review_values(review):
+    return {'expert_id': review.expert_id, 'rating': review.rating}
+
+
+def previous_review_values(review):
+    """Giá trị đã khóa và đọc từ DB ngay trước khi lưu/xóa (xem Review.locked_values)."""
+    return getattr(review, '_previous_values', None)
+
+
+def apply_review_change(old=None, new=None):
+    """old=None: đánh giá mới; new=None: đánh giá bị xóa; đổi chuyên gia thì trừ bên cũ, cộng bên mới."""
+    deltas = {}
+    for values, sign in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        total, count = deltas.get(values['expert_id'], (0, 0))
+        deltas[values['expert_id']] = (total + sign * values['rating'], count + sign)
+    for expert_id, (sum_delta, count_delta) in deltas.items():
+        apply_rating_change(expert_id, sum_delta, count_delta)
+
+
+def repair_ratings(expert_ids=None):
+    """Tính lại tổng đánh giá từ bảng Review, trả về số chuyên gia được cập nhật."""
+    reviews = Review.objects.filter(expert=OuterRef('pk')).order_by().values('expert')
+    experts = Expert.objects.all()
+    if expert_ids:
+        experts = experts.filter(pk__in=expert_ids)
+    with transaction.atomic():
+        updated = experts.update(
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'),
+                                         output_field=IntegerField()), 0),
+            rating_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count'),
+                                           output_field=IntegerField()), 0),
+        )
+        experts.update(rating_score=score_expression())
+    return updated
@@ -0,0 +1,117 @@
+import numpy as np
+from django.core.cache import cache
+
+from .directory_cache import directory_version
+from .models import Expert, ExpertSearchTerm, HealthGoal
+from .search import tokenize
+
+# Từ khóa chuyên môn phù hợp với từng mục tiêu, so khớp trên chỉ mục tìm kiếm (đã bỏ dấu)
+GOAL_KEYWORDS = {
+    HealthGoal.GAIN_MUSCLE: tokenize('tăng cơ thể hình gym sức mạnh tạ protein'),
+    HealthGoal.LOSE_WEIGHT: tokenize('giảm cân giảm mỡ ăn kiêng cardio đốt calo'),
+    HealthGoal.MAINTAIN: tokenize('sức khỏe dinh dưỡng yoga cân bằng lối sống'),
+}
+
+# Trọng số các thành phần của điểm đề xuất
+SCORE_WEIGHTS = {'relevance': 0.4, 'rating': 0.3, 'experience': 0.15, 'availability': 0.15}
+# Điểm đánh giá được làm trơn Bayes: như thể mỗi chuyên gia có thêm chừng này đánh giá ở mức trung bình chung
+RATING_PRIOR_COUNT = 5
+MAX_RATING = 5
+# Kinh nghiệm từ chừng này năm trở lên được tính điểm tối đa
+MAX_EXPERIENCE_YEARS = 20
+# Số khách hàng làm điểm "còn nhận khách" giảm một nửa
+LOAD_HALF_CLIENTS = 10
+
+# Vector đặc trưng cache theo version danh sách chuyên gia (đổi khi chuyên gia, đánh giá hoặc số khách hàng thay đổi)
+FEATURE_CACHE_TIMEOUT = 300
+MAX_RECOMMENDATIONS = 50
+
+
+def build_features():
+    """Đặc trưng của mọi chuyên gia đang hoạt động dưới dạng mảng numpy, mỗi vị trí là một chuyên gia."""
+    rows = list(Expert.objects.filter(active=True).order_by('id').values_list(
+        'id', 'expert_type', 'rating_sum', 'rating_count', 'experience_years', 'client_count', 'max_clients'
+    ))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    position = {expert_id: i for i, expert_id in enumerate(ids.tolist())}
+
+    relevance = {goal: np.zeros(len(ids)) for goal in GOAL_KEYWORDS}
+    term_goals = {}
+    for goal, keywords in GOAL_KEYWORDS.items():
+        for term in keywords:
+            term_goals.setdefault(term, set()).add(goal)
+    for expert_id, term, weight in ExpertSearchTerm.objects.filter(term__in=term_goals) \
+            .values_list('expert_id', 'term', 'weight'):
+        if expert_id in position:
+            for goal in term_goals[term]:
+                relevance[goal][position[expert_id]] += weight
+
+    return {
+        'ids': ids,
+        'types': np.array([row[1] for row in rows], dtype=str),
+        'rating_sum': np.array([row[2] for row in rows], dtype=float),
+        'rating_count': np.array([row[3] for row in rows], dtype=float),
+        'experience': np.array([row[4] for row in rows], dtype=float),
+        'clients': np.array([row[5] for row in rows], dtype=float),
+        # 0 = không giới hạn số khách hàng
+        'capacity': np.array([row[6] or 0 for row in rows], dtype=float),
+        'relevance': relevance,
+    }
+
+
+def cached_features():
+    key = f"experts:recommend:features:{directory_version()}"
+    features = cache.get(key)
+    if features is None:
+        features = build_features()
+        cache.set(key, features, timeout=FEATURE_CACHE_TIMEOUT)
+    return features
+
+
+def availability(clients, capacity):
+    """Phần chỗ còn trống nếu có giới hạn, ngược lại giảm dần theo số khách hàng hiện tại."""
+    limited = capacity > 0
+    remaining = 1 - clients / np.where(limited, capacity, 1)
+    return np.where(limited, np.clip(remaining, 0, 1), LOAD_HALF_CLIENTS / (LOAD_HALF_CLIENTS + clients))
+
+
+def score_experts(features, goal=None, expert_type=None):
+    """Điểm đề xuất (0..1) và từng thành phần cho mọi chuyên gia, tính một lượt trên cả mảng."""
+    rating_sum, rating_count = features['rating_sum'], features['rating_count']
+    total_count = rating_count.sum()
+    mean = rating_sum.sum() / total_count if total_count else MAX_RATING / 2
+    components = {
+        'rating': (RATING_PRIOR_COUNT * mean + rating_sum) / (RATING_PRIOR_COUNT + rating_count) / MAX_RATING,
+        'experience': np.minimum(features['experience'], MAX_EXPERIENCE_YEARS) / MAX_EXPERIENCE_YEARS,
+        'availability': availability(features['clients'], features['capacity']),
+    }
+    relevance = features['relevance'].get(goal)
+    if relevance is not None and relevance.max() > 0:
+        components['relevance'] = relevance / relevance.max()
+    else:
+        # Chưa có mục tiêu thì không tính độ phù hợp chuyên môn
+        components['relevance'] = np.zeros(len(features['ids']))
+
+    scores = sum(SCORE_WEIGHTS[name] * values for name, values in components.items())
+    # Loại chuyên gia khác loại yêu cầu và chuyên gia đã đủ khách
+    excluded = (features['capacity'] > 0) & (features['clients'] >= features['capacity'])
+    if expert_type:
+        excluded |= features['types'] != expert_type
+    scores = np.where(excluded, -np.inf, scores)
+    return scores, components
+
+
+def recommend(goal=None, expert_type=None, limit=10):
+    """Danh sách (expert_id, điểm, chi tiết điểm) của `limit` chuyên gia phù hợp nhất, điểm giảm dần."""
+    features = cached_features()
+    if not len(features['ids']):
+        return []
+    scores, components = score_experts(features, goal, expert_type)
+
+    limit = min(limit, len(scores))
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    # Cùng điểm thì chuyên gia có id nhỏ hơn đứng trước
+    top = top[np.lexsort((features['ids'][top], -scores[top]))]
+    return [(int(features['ids'][i]), round(float(scores[i]), 4),
+             {name: round(float(values[i]), 4) for name, values in components.items()})
+            for i in top if np.isfinite(scores[i])]
@@ -0,0 +1,71 @@
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import localdate
+
+# Kết quả cũ không bao giờ bị đọc lại sau khi version đổi, timeout chỉ để dọn bộ nhớ
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+
+REPORT_NAMES = ('health_progress', 'workout_stats', 'meal_stats')
+
+# Bộ đếm trúng/trượt giữ trong tiến trình: ghi vào cache dùng chung ở mỗi lần đọc sẽ tốn hơn chính lần đọc đó
+_stats = Counter()
+
+
+def _version_key(user_id):
+    return f"report:version:{user_id}"
+
+
+def _new_version():
+    # Giá trị khởi tạo khác mọi version trước đó, kể cả khi khóa version bị cache đẩy ra
+    return time.time_ns()
+
+
+def data_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    # Ghi đè bằng giá trị mới thay vì incr: không lỗi khi khóa version đã bị cache đẩy ra
+    cache.set(_version_key(user_id), _new_version(), timeout=None)
+
+
+def bump_version_on_commit(user_id):
+    """Đổi version sau khi transaction commit, tránh request khác cache lại dữ liệu cũ trong lúc đang ghi."""
+    if user_id is not None:
+        transaction.on_commit(lambda: bump_version(user_id))
+
+
+def cached_report(name, user_id, period, compute):
+    """
+    Trả về kết quả báo cáo từ cache nếu dữ liệu của người dùng chưa đổi, ngược lại tính bằng compute() và lưu lại.
+    Khóa gồm ngày hiện tại vì các kỳ tuần/tháng/năm được tính đến hôm nay.
+    """
+    key = f"report:{name}:{user_id}:{data_version(user_id)}:{period}:{localdate().isoformat()}"
+    result = cache.get(key)
+    if result is not None:
+        _stats[name, 'hits'] += 1
+        return result
+
+    _stats[name, 'misses'] += 1
+    result = compute()
+    cache.set(key, result, timeout=REPORT_CACHE_TIMEOUT)
+    return result
+
+
+def report_cache_stats():
+    """Thống kê của tiến trình hiện tại, tính từ lúc tiến trình khởi động."""
+    stats = {}
+    for name in REPORT_NAMES:
+        hits = _stats[name, 'hits']
+        misses = _stats[name, 'misses']
+        total = hits + misses
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+    return stats
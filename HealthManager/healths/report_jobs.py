@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import Sum
+from django.utils.timezone import now
+
+from .models import ReportJob, ReportType, JobStatus, HealthTrackingRollup, WorkoutSession, RegularUser
+from .rollups import TRUNCATE, period_start, next_period_start, summary_expressions
+from .workers import init_worker, spawn_context
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'REPORT_WORKERS', 2),
+                mp_context=spawn_context(),
+                initializer=init_worker,
+            )
+        return _executor
+
+
+def submit(task, job_id):
+    """Chạy task(job_id) trong pool worker; task phải là hàm cấp module để truyền được sang tiến trình con."""
+    global _executor
+    try:
+        get_executor().submit(task, job_id)
+    except BrokenProcessPool:
+        # Một worker bị chết: tạo pool mới và gửi lại
+        with _executor_lock:
+            _executor = None
+        get_executor().submit(task, job_id)
+
+
+def queue_report_job(requested_by, report_type, params):
+    """Tạo job và đưa vào pool worker sau khi transaction hiện tại commit."""
+    job = ReportJob.objects.create(requested_by=requested_by, report_type=report_type, params=params)
+    transaction.on_commit(lambda: submit(run_report_job, job.pk))
+    return job
+
+
+def client_progress(params):
+    """
+    Chuỗi tiến độ theo tuần/tháng/năm của nhiều khách hàng: chỉ số sức khỏe đọc từ bảng tổng hợp,
+    thống kê luyện tập gom nhóm theo kỳ, mỗi phần một truy vấn cho toàn bộ khách hàng.
+    Khoảng ngày được nới ra trọn kỳ ở cả hai đầu để hai phần cùng tính trên một khoảng.
+    """
+    client_ids = params['client_ids']
+    period = params['period']
+    start = period_start(period, date.fromisoformat(params['date_from']))
+    end = next_period_start(period, period_start(period, date.fromisoformat(params['date_to']))) - timedelta(days=1)
+
+    series = {}
+    rollups = HealthTrackingRollup.objects.filter(
+        user_id__in=client_ids, period_type=period, period_start__gte=start, period_start__lte=end
+    ).values('user_id', 'period_start').annotate(**summary_expressions()).order_by('user_id', 'period_start')
+    for row in rollups:
+        series.setdefault(row['user_id'], {})[row['period_start']] = {
+            'steps': row['total_steps'] or 0,
+            'avg_heart_rate': row['avg_heart_rate'],
+            'water_intake': row['total_water_intake'] or 0,
+            'avg_bmi': row['avg_bmi'],
+        }
+
+    sessions = WorkoutSession.objects.filter(
+        workout_plan__user_id__in=client_ids, date__gte=start, date__lte=end
+    ).annotate(start=TRUNCATE[period]('date')).values('workout_plan__user_id', 'start').annotate(
+        duration=Sum('duration'), calories=Sum('workout__calories_burned')
+    ).order_by()
+    for row in sessions:
+        point = series.setdefault(row['workout_plan__user_id'], {}).setdefault(row['start'], {})
+        point['workout_duration'] = row['duration'] or 0
+        point['calories_burned'] = row['calories'] or 0
+
+    clients = RegularUser.objects.filter(id__in=client_ids).values('id', 'user__username').order_by('id')
+    return {
+        'period': period,
+        'date_from': start.isoformat(),
+        'date_to': end.isoformat(),
+        'clients': [{
+            'id': client['id'],
+            'username': client['user__username'],
+            'series': [{'period_start': day.isoformat(), **values}
+                       for day, values in sorted(series.get(client['id'], {}).items())],
+        } for client in clients],
+    }
+
+
+REPORTS = {
+    ReportType.CLIENT_PROGRESS: client_progress,
+}
+
+
+def run_report_job(job_id):
+    """Chạy trong tiến trình worker (hoặc trực tiếp từ lệnh quản trị)."""
+    close_old_connections()
+    try:
+        updated = ReportJob.objects.filter(pk=job_id, status=JobStatus.PENDING).update(status=JobStatus.RUNNING)
+        if not updated:
+            return
+        job = ReportJob.objects.get(pk=job_id)
+        try:
+            job.result = REPORTS[job.report_type](job.params)
+            job.status = JobStatus.COMPLETED
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        job.finished_date = now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_date', 'updated_date'])
+    finally:
+        close_old_connections()
@@ -0,0 +1,166 @@
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Sum, Count, F, FloatField, ExpressionWrapper
+from django.db.models.functions import TruncWeek, TruncMonth, TruncYear, Cast, NullIf
+
+from .models import HealthTracking, HealthTrackingRollup, PeriodType
+
+TRUNCATE = {
+    PeriodType.WEEK: TruncWeek,
+    PeriodType.MONTH: TruncMonth,
+    PeriodType.YEAR: TruncYear,
+}
+
+COUNTERS = ['days', 'total_steps', 'heart_rate_sum', 'heart_rate_count', 'total_water', 'bmi_sum', 'bmi_count']
+
+TRACKED_FIELDS = ('date', 'steps', 'heart_rate', 'water_intake', 'bmi')
+
+
+def period_start(period_type, day):
+    if period_type == PeriodType.WEEK:
+        return day - timedelta(days=day.weekday())
+    if period_type == PeriodType.MONTH:
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_period_start(period_type, start):
+    if period_type == PeriodType.WEEK:
+        return start + timedelta(days=7)
+    if period_type == PeriodType.MONTH:
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return date(start.year + 1, 1, 1)
+
+
+def contribution(values):
+    """Phần đóng góp của một bản ghi theo dõi vào các bộ đếm của bảng tổng hợp."""
+    heart_rate = values.get('heart_rate')
+    bmi = values.get('bmi')
+    return {
+        'days': 1,
+        'total_steps': values.get('steps') or 0,
+        'heart_rate_sum': heart_rate or 0,
+        'heart_rate_count': 0 if heart_rate is None else 1,
+        'total_water': values.get('water_intake') or 0.0,
+        'bmi_sum': float(bmi) if bmi is not None else 0.0,
+        'bmi_count': 0 if bmi is None else 1,
+    }
+
+
+def counter_aggregates():
+    """Biểu thức tính các bộ đếm của bảng tổng hợp trực tiếp từ HealthTracking."""
+    return {
+        'days': Count('id'),
+        'total_steps': Sum('steps'),
+        'heart_rate_sum': Sum('heart_rate'),
+        'heart_rate_count': Count('heart_rate'),
+        'total_water': Sum('water_intake'),
+        'bmi_sum': Sum(Cast('bmi', FloatField())),
+        'bmi_count': Count('bmi'),
+    }
+
+
+def totals_until(user_id, period_type, day):
+    """
+    Bộ đếm của kỳ chứa `day`, chỉ tính đến hết ngày `day`: dòng tổng hợp của kỳ trừ đi các bản ghi có ngày sau
+    `day` trong cùng kỳ (thường không có). Cả hai truy vấn đều đi theo chỉ mục, không quét các ngày đã qua.
+    """
+    start = period_start(period_type, day)
+    totals = HealthTrackingRollup.objects.filter(
+        user_id=user_id, period_type=period_type, period_start=start
+    ).values(*COUNTERS).first() or dict.fromkeys(COUNTERS, 0)
+    future = HealthTracking.objects.filter(
+        user_id=user_id, date__gt=day, date__lt=next_period_start(period_type, start)
+    ).aggregate(**counter_aggregates())
+    return {name: totals[name] - (future[name] or 0) for name in COUNTERS}
+
+
+def tracking_values(tracking):
+    return {field: getattr(tracking, field) for field in TRACKED_FIELDS}
+
+
+def loaded_values(tracking):
+    """Giá trị của bản ghi tại thời điểm đọc từ DB, None nếu không có đủ (instance mới hoặc dùng only/defer)."""
+    values = getattr(tracking, '_loaded_values', None)
+    if values is None or not all(field in values for field in TRACKED_FIELDS):
+        return None
+    return values
+
+
+def apply_change(user_id, old=None, new=None):
+    """
+    Cập nhật bảng tổng hợp theo chênh lệch giữa giá trị cũ và mới của một bản ghi.
+    old=None nghĩa là bản ghi vừa được tạo, new=None nghĩa là bản ghi vừa bị xóa.
+    """
+    deltas = {}
+    for values, sign in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        for period_type in PeriodType.values:
+            key = (period_type, period_start(period_type, values['date']))
+            bucket = deltas.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, amount in contribution(values).items():
+                bucket[name] += sign * amount
+
+    with transaction.atomic():
+        for (period_type, start), delta in deltas.items():
+            delta = {name: amount for name, amount in delta.items() if amount}
+            if not delta:
+                continue
+            if new is not None:
+                # Khi chỉ trừ đi (xóa bản ghi) thì không tạo dòng mới, tránh tạo lại dòng đang bị xóa dây chuyền
+                HealthTrackingRollup.objects.get_or_create(user_id=user_id, period_type=period_type, period_start=start)
+            HealthTrackingRollup.objects.filter(
+                user_id=user_id, period_type=period_type, period_start=start
+            ).update(**{name: F(name) + amount for name, amount in delta.items()})
+
+
+def refresh_rollups(user_id, dates=None):
+    """
+    Tính lại các kỳ tổng hợp chứa những ngày được chỉ định từ dữ liệu gốc, mỗi loại kỳ một truy vấn gom nhóm.
+    dates=None sẽ tính lại toàn bộ lịch sử của người dùng (dùng cho backfill).
+    """
+    trackings = HealthTracking.objects.filter(user_id=user_id)
+    rollups = HealthTrackingRollup.objects.filter(user_id=user_id)
+    dates = list(dates) if dates is not None else None
+    if dates == []:
+        return
+
+    with transaction.atomic():
+        for period_type, truncate in TRUNCATE.items():
+            qs, existing = trackings, rollups.filter(period_type=period_type)
+            if dates is not None:
+                start = period_start(period_type, min(dates))
+                end = next_period_start(period_type, period_start(period_type, max(dates)))
+                qs = qs.filter(date__gte=start, date__lt=end)
+                existing = existing.filter(period_start__gte=start, period_start__lt=end)
+
+            rows = qs.annotate(start=truncate('date')).values('start').annotate(**counter_aggregates()).order_by()
+
+            objs = [HealthTrackingRollup(
+                user_id=user_id, period_type=period_type, period_start=row['start'],
+                **{name: row[name] or 0 for name in COUNTERS}
+            ) for row in rows]
+
+            existing.exclude(period_start__in=[obj.period_start for obj in objs]).delete()
+            upsert_rollups(objs)
+
+
+def upsert_rollups(objs):
+    options = {'update_conflicts': True, 'update_fields': COUNTERS + ['updated_date']}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['user', 'period_type', 'period_start']
+    HealthTrackingRollup.objects.bulk_create(objs, batch_size=1000, **options)
+
+
+def summary_expressions():
+    """Biểu thức gộp các dòng tổng hợp: tổng bước chân, nhịp tim trung bình, tổng nước và BMI trung bình."""
+    return {
+        'total_steps': Sum('total_steps'),
+        'avg_heart_rate': ExpressionWrapper(
+            Cast(Sum('heart_rate_sum'), FloatField()) / NullIf(Sum('heart_rate_count'), 0), output_field=FloatField()
+        ),
+        'total_water_intake': Sum('total_water'),
+        'avg_bmi': ExpressionWrapper(Sum('bmi_sum') / NullIf(Sum('bmi_count'), 0), output_field=FloatField()),
+    }
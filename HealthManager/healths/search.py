@@ -0,0 +1,118 @@
+import html
+import math
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q, Case, When, Value, Sum, Count, OuterRef, Subquery, IntegerField
+from django.utils.html import strip_tags
+
+from .models import Expert, ExpertSearchTerm
+
+# Trọng số theo trường: khớp tên quan trọng hơn chuyên môn, chuyên môn hơn phần giới thiệu
+FIELD_WEIGHTS = {'name': 3.0, 'specialization': 2.0, 'bio': 1.0}
+
+MAX_TERM_LENGTH = 64
+# Giới hạn số từ trong một truy vấn tìm kiếm
+MAX_QUERY_TERMS = 8
+# Từ cuối của truy vấn được khớp theo tiền tố (gõ dở) khi đủ dài
+MIN_PREFIX_LENGTH = 2
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Bỏ thẻ HTML, chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d) để so khớp không phân biệt dấu."""
+    text = html.unescape(strip_tags(text or '')).lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(normalize(text))]
+
+
+def expert_fields(expert):
+    user = expert.user
+    return {
+        'name': ' '.join(filter(None, [user.first_name, user.last_name, user.username])),
+        'specialization': expert.specialization,
+        'bio': expert.bio,
+    }
+
+
+def term_weights(fields):
+    """Trọng số mỗi từ = tổng theo trường của trọng số trường * (1 + log số lần xuất hiện)."""
+    weights = {}
+    for field, text in fields.items():
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            weights[token] = weights.get(token, 0) + FIELD_WEIGHTS[field] * (1 + math.log(count))
+    return weights
+
+
+def index_experts(experts):
+    """Ghi lại toàn bộ các từ của các chuyên gia (đã select_related user): một lệnh xóa và một lệnh chèn."""
+    rows = [ExpertSearchTerm(expert_id=expert.pk, term=term, weight=weight)
+            for expert in experts for term, weight in term_weights(expert_fields(expert)).items()]
+    with transaction.atomic():
+        ExpertSearchTerm.objects.filter(expert_id__in=[expert.pk for expert in experts]).delete()
+        ExpertSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+def index_expert(expert):
+    index_experts([expert])
+
+
+def rebuild_index(expert_ids=None, batch_size=500):
+    """Dựng lại chỉ mục cho các chuyên gia (mặc định tất cả) theo từng lô, trả về số chuyên gia đã xử lý."""
+    experts = Expert.objects.select_related('user').order_by('id')
+    if expert_ids:
+        experts = experts.filter(id__in=expert_ids)
+
+    count = 0
+    batch = []
+    for expert in experts.iterator(chunk_size=batch_size):
+        batch.append(expert)
+        if len(batch) == batch_size:
+            index_experts(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        index_experts(batch)
+        count += len(batch)
+    return count
+
+
+def search_matches(q):
+    """
+    Các chuyên gia chứa đủ mọi từ trong q, kèm điểm liên quan (tổng trọng số các từ khớp).
+    Từ cuối được khớp theo tiền tố; mọi điều kiện đều dùng được chỉ mục (term, expert). Trả về None nếu q rỗng.
+    """
+    tokens = list(dict.fromkeys(tokenize(q)))[:MAX_QUERY_TERMS]
+    if not tokens:
+        return None
+
+    conditions = [Q(term=token) for token in tokens]
+    if len(tokens[-1]) >= MIN_PREFIX_LENGTH:
+        conditions[-1] = Q(term__startswith=tokens[-1])
+
+    # Đánh số từ truy vấn mà mỗi dòng khớp, để yêu cầu khớp đủ tất cả các từ
+    token_index = Case(*[When(condition, then=Value(i)) for i, condition in enumerate(conditions)],
+                       output_field=IntegerField())
+    return ExpertSearchTerm.objects.filter(reduce(or_, conditions)).values('expert').annotate(
+        relevance=Sum('weight'), matched=Count(token_index, distinct=True)
+    ).filter(matched=len(tokens)).order_by()
+
+
+def search_experts(queryset, q):
+    """Lọc queryset chuyên gia theo q và gắn điểm `relevance`; trả về nguyên queryset nếu q rỗng."""
+    matches = search_matches(q)
+    if matches is None:
+        return queryset
+    relevance = matches.filter(expert=OuterRef('pk')).values('relevance')
+    return queryset.filter(pk__in=matches.values('expert')).annotate(relevance=Subquery(relevance))
@@ -1,22 +1,111 @@
+import html
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from rest_framework.serializers import ModelSerializer
 from healths.models import (User, UserRole, TrackingMode, Expert, ExpertType, RegularUser, HealthProfile, HealthTracking,
                            Workout, WorkoutPlan, WorkoutSession, Gender,
                            Meal, MealPlan, MealPlanMeal,
-                           HealthJournal, Reminder, ChatMessage, Review)
+                           HealthJournal, Reminder, ChatMessage, Review, SampleMetric, DataExportJob, JobStatus,
+                           HealthImportJob, HealthAnomaly, ReportJob, PeriodType, Challenge, WeeklyReport)
+from healths.intraday import MAX_SAMPLE_VALUE
+from healths.imports import IMPORT_FORMATS, ConflictMode
+from healths.nutrition import daily_nutrition
+
+# Ảnh đại diện thu nhỏ (px) và độ dài đoạn giới thiệu trong danh sách chuyên gia
+EXPERT_AVATAR_SIZE = 96
+EXPERT_BIO_EXCERPT_LENGTH = 160
+
+
+def query_list(request, name):
+    """Tập giá trị của tham số dạng ?name=a,b; None nếu không có tham số."""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+# ------DynamicFieldsMixin------
+class DynamicFieldsMixin:
+    """
+    ?fields=a,b: chỉ trả về các trường này. ?expand=x,y: chỉ lồng các quan hệ trong Meta.expandable_fields
+    được yêu cầu, quan hệ không được mở rộng trả về id (khóa ngoại) hoặc bị bỏ (quan hệ ngược).
+    Không có cả hai tham số thì dữ liệu giữ nguyên như trước. Chỉ áp dụng cho GET và serializer gốc
+    (cần context có request); trường bị bỏ không được serialize nên quan hệ của nó cũng không bị truy vấn.
+    Meta.expandable_fields: {tên trường: lookup prefetch_related khi được mở rộng}.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        sparse = self.sparse_params(self.context.get('request'))
+        if sparse is None:
+            return
+
+        fields, expand = sparse
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in list(self.fields):
+            if name in expandable and name not in expand:
+                self.collapse(name)
+            elif fields is not None and name not in fields and name not in expand:
+                self.fields.pop(name)
+
+    @staticmethod
+    def sparse_params(request):
+        """(fields, expand) của request, None nếu dùng dữ liệu đầy đủ."""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        fields, expand = query_list(request, 'fields'), query_list(request, 'expand')
+        if fields is None and expand is None:
+            return None
+        return fields, expand or set()
+
+    def collapse(self, name):
+        field = self.fields[name]
+        try:
+            model_field = self.Meta.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            model_field = None
+        fields = self.sparse_params(self.context.get('request'))[0]
+        if model_field is not None and model_field.concrete and (fields is None or name in fields):
+            self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+        else:
+            self.fields.pop(name)
+
+    @classmethod
+    def includes(cls, name, request):
+        """Trường `name` có được trả về dạng đầy đủ (lồng) với ?fields/?expand của request hay không."""
+        sparse = cls.sparse_params(request)
+        if sparse is None:
+            return True
+        fields, expand = sparse
+        if name in getattr(cls.Meta, 'expandable_fields', {}):
+            return name in expand
+        return fields is None or name in fields or name in expand
+
+    @classmethod
+    def expand_queryset(cls, queryset, request):
+        """prefetch_related cho các quan hệ lồng sẽ được trả về (tất cả nếu không có ?fields/?expand)."""
+        expandable = getattr(cls.Meta, 'expandable_fields', {})
+        sparse = cls.sparse_params(request)
+        lookups = [lookup for name, lookup in expandable.items() if sparse is None or name in sparse[1]]
+        return queryset.prefetch_related(*lookups) if lookups else queryset
 
 
 # ------ItemSerializer------
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        data['image'] = instance.image.url
+        if 'image' in data:
+            data['image'] = instance.image.url if instance.image else None
 
         return data
 
 # ------UserSerializer------
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -32,7 +121,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['avatar'] = instance.avatar.url if instance.avatar else None
+        if 'avatar' in data:
+            data['avatar'] = instance.avatar.url if instance.avatar else None
         return data
 
     def create(self, validated_data):
@@ -68,7 +158,7 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 # ------ExpertSerializer------
-class ExpertSerializer(serializers.ModelSerializer):
+class ExpertSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
     avg_rating = serializers.FloatField(read_only=True, allow_null=True)
 
@@ -77,8 +167,10 @@ class ExpertSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user',
             'expert_type', 'specialization',
-            'experience_years', 'bio', 'avg_rating'
+            'experience_years', 'bio', 'avg_rating', 'rating_count',
+            'client_count', 'max_clients'
         ]
+        read_only_fields = ['client_count']
 
     def create(self, validated_data):
         user_data = validated_data.pop('user')
@@ -106,10 +198,45 @@ class ExpertSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+# ------ExpertDirectorySerializer------
+class ExpertDirectorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Bản rút gọn cho danh sách chuyên gia; hồ sơ đầy đủ ở /experts/<id>/detail/. Cần select_related('user')."""
+    display_name = serializers.SerializerMethodField()
+    avatar = serializers.SerializerMethodField()
+    bio_excerpt = serializers.SerializerMethodField()
+    avg_rating = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Expert
+        fields = [
+            'id', 'display_name', 'avatar', 'expert_type', 'specialization', 'experience_years',
+            'bio_excerpt', 'avg_rating', 'rating_count', 'client_count', 'max_clients'
+        ]
+
+    def get_display_name(self, obj):
+        return obj.user.get_full_name() or obj.user.username
+
+    def get_avatar(self, obj):
+        avatar = obj.user.avatar
+        if not avatar:
+            return None
+        return avatar.build_url(width=EXPERT_AVATAR_SIZE, height=EXPERT_AVATAR_SIZE, crop='fill', secure=True)
+
+    def get_bio_excerpt(self, obj):
+        return Truncator(html.unescape(strip_tags(obj.bio or '')).strip()).chars(EXPERT_BIO_EXCERPT_LENGTH)
+
 # ------UserConnectedSerializer------
-class UserConnectedSerializer(serializers.ModelSerializer):
+class UserConnectedSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     connected_trainer = ExpertSerializer(read_only=True)
     connected_nutritionist = ExpertSerializer(read_only=True)
+    connected_trainer_id = serializers.PrimaryKeyRelatedField(
+        source='connected_trainer', queryset=Expert.objects.filter(expert_type=ExpertType.TRAINER),
+        write_only=True, required=False, allow_null=True
+    )
+    connected_nutritionist_id = serializers.PrimaryKeyRelatedField(
+        source='connected_nutritionist', queryset=Expert.objects.filter(expert_type=ExpertType.NUTRITIONIST),
+        write_only=True, required=False, allow_null=True
+    )
 
     class Meta:
         model = RegularUser
@@ -118,13 +245,21 @@ class UserConnectedSerializer(serializers.ModelSerializer):
             'tracking_mode',
             'connected_trainer',
             'connected_nutritionist',
+            'connected_trainer_id',
+            'connected_nutritionist_id',
         ]
+        expandable_fields = {'connected_trainer': 'connected_trainer__user',
+                             'connected_nutritionist': 'connected_nutritionist__user'}
 
     def validate(self, data):
         # Lấy giá trị mới cập nhật hoặc giữ nguyên instance cũ
         mode = data.get('tracking_mode', getattr(self.instance, 'tracking_mode', TrackingMode.PERSONAL))
         trainer = data.get('connected_trainer', getattr(self.instance, 'connected_trainer', None))
         nutritionist = data.get('connected_nutritionist', getattr(self.instance, 'connected_nutritionist', None))
+        if mode == TrackingMode.PERSONAL and 'tracking_mode' in data:
+            # Chuyển sang cá nhân: các kết nối cũ được xóa trong update()
+            trainer = data.get('connected_trainer')
+            nutritionist = data.get('connected_nutritionist')
 
         # Nếu chế độ là cá nhân thì không được chọn chuyên gia
         if mode == TrackingMode.PERSONAL and (trainer or nutritionist):
@@ -134,6 +269,11 @@ class UserConnectedSerializer(serializers.ModelSerializer):
         if mode == TrackingMode.CONNECTED and not (trainer or nutritionist):
             raise serializers.ValidationError("Khi chọn chế độ kết nối chuyên gia phải chọn ít nhất một chuyên gia.")
 
+        # Chuyên gia mới phải còn nhận khách (kiểm tra lại khi lưu bằng UPDATE có điều kiện)
+        for field, expert in (('connected_trainer', trainer), ('connected_nutritionist', nutritionist)):
+            if field in data and expert and expert != getattr(self.instance, field, None) and expert.is_full:
+                raise serializers.ValidationError({f"{field}_id": "Chuyên gia đã nhận đủ số lượng khách hàng."})
+
         return data
 
     def update(self, instance, validated_data):
@@ -146,11 +286,19 @@ class UserConnectedSerializer(serializers.ModelSerializer):
             instance.connected_trainer = None
             instance.connected_nutritionist = None
 
-        instance.save()
+        try:
+            instance.save()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
+        # Số khách hàng của chuyên gia vừa được cập nhật trong DB
+        for expert in (instance.connected_trainer, instance.connected_nutritionist):
+            if expert is not None:
+                expert.refresh_from_db(fields=['client_count'])
         return instance
 
 # ------HealthProfileSerializer------
-class HealthProfileSerializer(serializers.ModelSerializer):
+class HealthProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = HealthProfile
         fields = ['id', 'user', 'height', 'weight', 'age', 'goal', 'created_date']
@@ -162,7 +310,7 @@ class HealthProfileSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 # ------HealthTrackingSerializer------
-class HealthTrackingSerializer(serializers.ModelSerializer):
+class HealthTrackingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = HealthTracking
         fields = ['id', 'user', 'date', 'bmi', 'steps', 'heart_rate', 'water_intake', 'created_date']
@@ -172,6 +320,31 @@ class HealthTrackingSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user.regular_profile
         return super().create(validated_data)
 
+# ------HealthTrackingBulkItemSerializer------
+class HealthTrackingBulkItemSerializer(serializers.ModelSerializer):
+    # Dùng để kiểm tra từng dòng của lô đồng bộ, không kiểm tra unique (user, date) vì sẽ upsert
+    class Meta:
+        model = HealthTracking
+        fields = ['date', 'steps', 'heart_rate', 'water_intake']
+        validators = []
+
+# ------IntradaySampleSerializer------
+class IntradaySampleSerializer(serializers.Serializer):
+    timestamp = serializers.DateTimeField()
+    value = serializers.IntegerField(min_value=0, max_value=MAX_SAMPLE_VALUE)
+
+
+class IntradaySampleBatchSerializer(serializers.Serializer):
+    metric = serializers.ChoiceField(choices=SampleMetric.choices)
+    samples = IntradaySampleSerializer(many=True, allow_empty=False, max_length=10000)
+
+
+class IntradaySampleQuerySerializer(serializers.Serializer):
+    """Tham số GET của /health-trackings/samples/, thiếu date thì lấy hôm nay."""
+    date = serializers.DateField(required=False)
+    metric = serializers.ChoiceField(choices=SampleMetric.choices, default=SampleMetric.HEART_RATE)
+    user_id = serializers.IntegerField(required=False, min_value=1)
+
 # ------WorkoutSerializer------
 class WorkoutSerializer(ItemSerializer):
     class Meta:
@@ -191,7 +364,7 @@ class WorkoutSerializer(ItemSerializer):
         return super().create(validated_data)
 
 # ------WorkoutSessionSerializer------
-class WorkoutSessionSerializer(serializers.ModelSerializer):
+class WorkoutSessionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     workout_name = serializers.CharField(source='workout.name', read_only=True)
 
     class Meta:
@@ -208,14 +381,33 @@ class WorkoutSessionSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Ngày buổi tập phải nằm trong khoảng thời gian của kế hoạch.")
         return data
 
+class PlanSessionListSerializer(serializers.ListSerializer):
+    """
+    Buổi tập của một kế hoạch. Nếu context có 'plan_sessions' ({id kế hoạch: [buổi tập đã serialize]},
+    dựng sẵn cho cả danh sách bằng một truy vấn .values()) thì dùng thẳng dữ liệu đó.
+    """
+
+    def get_attribute(self, instance):
+        sessions = self.context.get('plan_sessions')
+        if sessions is None:
+            return super().get_attribute(instance)
+        return sessions.get(instance.pk, [])
+
+    def to_representation(self, data):
+        if self.context.get('plan_sessions') is None:
+            return super().to_representation(data)
+        return data
+
+
 # ------WorkoutPlanSerializer------
-class WorkoutPlanSerializer(serializers.ModelSerializer):
-    sessions = WorkoutSessionSerializer(many=True)
+class WorkoutPlanSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    sessions = PlanSessionListSerializer(child=WorkoutSessionSerializer())
 
     class Meta:
         model = WorkoutPlan
         fields = ['id', 'user', 'plan_name', 'description', 'start_date', 'end_date', 'goal', 'workout', 'sessions']
         read_only_fields = ['user']
+        expandable_fields = {'sessions': 'sessions__workout'}
 
     def validate(self, data):
         start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
@@ -283,7 +475,7 @@ class MealSerializer(ItemSerializer):
         return super().create(validated_data)
 
 # ------MealPlanMealSerializer------
-class MealPlanMealSerializer(serializers.ModelSerializer):
+class MealPlanMealSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     meal_name = serializers.CharField(source='meal.name', read_only=True)
 
     class Meta:
@@ -301,13 +493,14 @@ class MealPlanMealSerializer(serializers.ModelSerializer):
         return data
 
 # ------MealPlanSerializer------
-class MealPlanSerializer(serializers.ModelSerializer):
+class MealPlanSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     mealplan_meals = MealPlanMealSerializer(many=True)
 
     class Meta:
         model = MealPlan
         fields = ['id', 'user', 'plan_name', 'description', 'start_date', 'end_date', 'goal', 'meals', 'mealplan_meals']
         read_only_fields = ['user']
+        expandable_fields = {'mealplan_meals': 'mealplan_meals__meal'}
 
     def validate(self, data):
         start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
@@ -357,8 +550,19 @@ class MealPlanSerializer(serializers.ModelSerializer):
 
         return instance
 
+
+class MealPlanDetailSerializer(MealPlanSerializer):
+    nutrition_summary = serializers.SerializerMethodField()
+
+    class Meta(MealPlanSerializer.Meta):
+        fields = MealPlanSerializer.Meta.fields + ['nutrition_summary']
+
+    def get_nutrition_summary(self, obj):
+        # Tổng calo, protein, carbs, fat theo từng ngày của kế hoạch
+        return list(daily_nutrition(obj.mealplan_meals.all()))
+
 # ------HealthJournalSerializer------
-class HealthJournalSerializer(serializers.ModelSerializer):
+class HealthJournalSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = HealthJournal
         fields = ['id', 'user', 'date', 'note', 'mood']
@@ -369,7 +573,7 @@ class HealthJournalSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 # ------ReminderSerializer------
-class ReminderSerializer(serializers.ModelSerializer):
+class ReminderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     repeat_days = serializers.ListField(
         child=serializers.ChoiceField(choices=[
             ('mon', 'Thứ Hai'), ('tue', 'Thứ Ba'), ('wed', 'Thứ Tư'),
@@ -408,7 +612,7 @@ class ReviewerSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'avatar']
 
 # ------ReviewSerializer------
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     reviewer = ReviewerSerializer(read_only=True)  # Hiển thị nested
     rating = serializers.IntegerField(min_value=1, max_value=5)
     comment = serializers.CharField(allow_blank=True)
@@ -422,6 +626,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id', 'expert', 'reviewer_id', 'reviewer', 'rating', 'comment', 'created_at']
         read_only_fields = ['id', 'reviewer', 'created_at']
+        expandable_fields = {'reviewer': 'reviewer__user'}
 
 # ------ChatMessageSerializer------
 class ChatMessageSerializer(ItemSerializer):
@@ -464,3 +669,104 @@ class ChatMessageSerializer(ItemSerializer):
             except Exception:
                 return None
         return None
+
+
+# ------HealthAnomalySerializer------
+class HealthAnomalySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    username = serializers.CharField(source='user.user.username', read_only=True)
+
+    class Meta:
+        model = HealthAnomaly
+        fields = ['id', 'user', 'username', 'date', 'metric', 'value', 'baseline', 'z_score', 'is_read', 'created_date']
+        read_only_fields = fields
+
+
+# ------HealthImportSerializer------
+class HealthImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
+    on_conflict = serializers.ChoiceField(choices=ConflictMode.choices, default=ConflictMode.UPDATE)
+
+
+# ------HealthImportJobSerializer------
+class HealthImportJobSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = HealthImportJob
+        fields = ['id', 'status', 'file_format', 'on_conflict', 'summary', 'error', 'created_date', 'finished_date']
+        read_only_fields = fields
+
+
+# ------DataExportJobSerializer------
+class DataExportJobSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DataExportJob
+        fields = ['id', 'status', 'row_count', 'error', 'created_date', 'finished_date', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != JobStatus.COMPLETED or not obj.file:
+            return None
+        url = reverse('data-export-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+# ------ReportJobSerializer------
+class ReportJobSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'report_type', 'params', 'status', 'error', 'created_date', 'finished_date']
+        read_only_fields = fields
+
+
+class ReportJobDetailSerializer(ReportJobSerializer):
+    class Meta(ReportJobSerializer.Meta):
+        fields = ReportJobSerializer.Meta.fields + ['result']
+        read_only_fields = fields
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    client_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    period = serializers.ChoiceField(choices=PeriodType.choices, default=PeriodType.MONTH)
+
+    def validate(self, attrs):
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from phải trước date_to.")
+        if (attrs['date_to'] - attrs['date_from']).days > 366 * 10:
+            raise serializers.ValidationError("Khoảng thời gian tối đa là 10 năm.")
+        return attrs
+
+
+# ------ChallengeSerializer------
+class ChallengeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Challenge
+        fields = ['id', 'name', 'description', 'metric', 'start_date', 'end_date', 'created_by']
+        read_only_fields = ['created_by']
+
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError("Ngày kết thúc phải lớn hơn hoặc bằng ngày bắt đầu.")
+        return data
+
+
+# ------WeeklyReportSerializer------
+class WeeklyReportSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    client_username = serializers.CharField(source='client.user.username', read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = WeeklyReport
+        fields = ['id', 'client', 'client_username', 'week_start', 'created_date', 'updated_date', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        url = reverse('expert-weekly-report-download', kwargs={'report_id': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,157 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import (User, UserRole, Expert, RegularUser, HealthTracking, HealthProfile, Workout, WorkoutSession,
+                     Meal, MealPlanMeal, Review, tracking_bulk_saved)
+from .challenges import apply_tracking_change, refresh_scores
+from .capacity import release_experts
+from .ratings import apply_review_change, review_values, previous_review_values, repair_ratings
+from .report_cache import bump_version_on_commit
+from .directory_cache import bump_directory_on_commit
+from .search import index_expert
+from .rollups import apply_change, refresh_rollups, tracking_values, loaded_values
+
+
+# ------HealthTracking------
+@receiver(post_save, sender=HealthTracking)
+def tracking_saved(sender, instance, created, **kwargs):
+    old = loaded_values(instance)
+    if not created and old is None:
+        # Không biết giá trị trước khi sửa (instance không được đọc từ DB), tính lại kỳ chứa ngày này
+        refresh_rollups(instance.user_id, [instance.date])
+        refresh_scores(instance.user_id, [instance.date])
+    else:
+        apply_change(instance.user_id, old=None if created else old, new=tracking_values(instance))
+        apply_tracking_change(instance.user_id, old=None if created else old, new=tracking_values(instance))
+    instance._loaded_values = tracking_values(instance)
+    bump_version_on_commit(instance.user_id)
+
+
+@receiver(post_delete, sender=HealthTracking)
+def tracking_deleted(sender, instance, **kwargs):
+    old = loaded_values(instance) or tracking_values(instance)
+    apply_change(instance.user_id, old=old)
+    apply_tracking_change(instance.user_id, old=old)
+    bump_version_on_commit(instance.user_id)
+
+
+@receiver(tracking_bulk_saved, sender=HealthTracking)
+def tracking_bulk_saved_handler(sender, user_id, dates, **kwargs):
+    refresh_rollups(user_id, dates)
+    refresh_scores(user_id, dates)
+    bump_version_on_commit(user_id)
+
+
+# ------Expert------
+@receiver(post_save, sender=Expert)
+def expert_saved(sender, instance, **kwargs):
+    index_expert(instance)
+    bump_directory_on_commit()
+
+
+@receiver(post_delete, sender=Expert)
+def expert_deleted(sender, instance, **kwargs):
+    bump_directory_on_commit()
+
+
+@receiver(post_save, sender=User)
+def expert_user_saved(sender, instance, **kwargs):
+    # Tên hiển thị, ảnh đại diện nằm trên User, đổi thì cập nhật lại chỉ mục và danh sách
+    if instance.role != UserRole.EXPERT:
+        return
+    expert = Expert.objects.filter(user=instance).select_related('user').first()
+    if expert is not None:
+        index_expert(expert)
+        bump_directory_on_commit()
+
+
+# ------RegularUser------
+@receiver(post_save, sender=RegularUser)
+def regular_user_saved(sender, instance, **kwargs):
+    # Số khách hàng của chuyên gia đã được cập nhật trong RegularUser.save
+    if getattr(instance, '_connections_changed', False):
+        bump_directory_on_commit()
+
+
+@receiver(post_delete, sender=RegularUser)
+def regular_user_deleted(sender, instance, **kwargs):
+    connections = {field: getattr(instance, field) for field in RegularUser.CONNECTION_FIELDS}
+    if any(connections.values()):
+        release_experts(connections)
+        bump_directory_on_commit()
+
+
+# ------Review------
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    old = previous_review_values(instance)
+    if not created and old is None:
+        # Không biết điểm cũ, tính lại từ bảng Review
+        repair_ratings([instance.expert_id])
+    else:
+        apply_review_change(old=None if created else old, new=review_values(instance))
+    bump_directory_on_commit()
+
+
+@receiver(pre_delete, sender=Review)
+def review_deleting(sender, instance, **kwargs):
+    # Chạy trong transaction của lệnh xóa: khóa dòng và lấy điểm hiện tại thay vì giá trị instance đã đọc trước đó
+    instance._previous_values = instance.locked_values()
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    old = previous_review_values(instance)
+    if old is not None:
+        apply_review_change(old=old)
+        bump_directory_on_commit()
+
+
+# ------Report cache------
+@receiver(post_save, sender=HealthProfile)
+@receiver(post_delete, sender=HealthProfile)
+def health_profile_changed(sender, instance, **kwargs):
+    bump_version_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=WorkoutSession)
+def workout_session_saved(sender, instance, **kwargs):
+    bump_version_on_commit(instance.workout_plan.user_id)
+
+
+@receiver(pre_delete, sender=WorkoutSession)
+def workout_session_deleted(sender, instance, **kwargs):
+    # pre_delete: khi xóa dây chuyền từ WorkoutPlan, kế hoạch vẫn còn để lấy người dùng
+    bump_version_on_commit(instance.workout_plan.user_id)
+
+
+@receiver(post_save, sender=Workout)
+def workout_saved(sender, instance, created, **kwargs):
+    # Đổi lượng calo của bài tập ảnh hưởng thống kê của mọi người dùng có buổi tập với bài này
+    if created:
+        return
+    user_ids = WorkoutSession.objects.filter(workout=instance, workout_plan__user__isnull=False) \
+        .values_list('workout_plan__user_id', flat=True).distinct()
+    for user_id in user_ids:
+        bump_version_on_commit(user_id)
+
+
+@receiver(post_save, sender=MealPlanMeal)
+def meal_plan_meal_saved(sender, instance, **kwargs):
+    bump_version_on_commit(instance.meal_plan.user_id)
+
+
+@receiver(pre_delete, sender=MealPlanMeal)
+def meal_plan_meal_deleted(sender, instance, **kwargs):
+    bump_version_on_commit(instance.meal_plan.user_id)
+
+
+@receiver(post_save, sender=Meal)
+def meal_saved(sender, instance, created, **kwargs):
+    # Đổi dinh dưỡng của món ăn ảnh hưởng thống kê của mọi người dùng có kế hoạch chứa món này
+    if created:
+        return
+    user_ids = MealPlanMeal.objects.filter(meal=instance, meal_plan__user__isnull=False) \
+        .values_list('meal_plan__user_id', flat=True).distinct()
+    for user_id in user_ids:
+        bump_version_on_commit(user_id)
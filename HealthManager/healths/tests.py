@@ -1,3 +1,372 @@
+import base64
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APIClient
+
+from healths.models import (User, UserRole, Expert, ExpertType, RegularUser, HealthTracking, ChatMessage,
+                            Workout, WorkoutPlan, WorkoutSession, HealthProfile, HealthGoal, HealthTrackingRollup,
+                            PeriodType, TrackingMode, Review, JobStatus, HealthAnomaly)
+from healths.anomalies import detect_anomalies
+from healths.exports import iter_rows
+from healths.imports import run_import
+from healths.report_jobs import client_progress
+from healths.renderers import ORJSONRenderer, MessagePackRenderer, MessagePackParser
+from healths.projections import HEALTH_TRACKING_PROJECTION, CHAT_MESSAGE_PROJECTION, WORKOUT_SESSION_PROJECTION
+from healths.serializers import (HealthTrackingSerializer, ChatMessageSerializer, WorkoutSessionSerializer,
+                                 WorkoutPlanSerializer)
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class ProjectionParityTests(TestCase):
+    """Đường đọc nhanh (.values() + projection) phải cho ra đúng dữ liệu như serializer tương ứng."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='client', password='x', first_name='Lan', last_name='Trần')
+        cls.regular = RegularUser.objects.create(user=cls.user)
+        cls.nameless = User.objects.create_user(username='nameless', password='x', avatar='avatars/abc')
+        RegularUser.objects.create(user=cls.nameless)
+
+        cls.trainer_user = User.objects.create_user(username='trainer', password='x', role=UserRole.EXPERT,
+                                                    first_name='Minh')
+        Expert.objects.create(user=cls.trainer_user, expert_type=ExpertType.TRAINER, specialization='Tăng cơ',
+                              experience_years=5, bio='<p>HLV</p>')
+        cls.nutritionist_user = User.objects.create_user(username='nutri', password='x', role=UserRole.EXPERT)
+        Expert.objects.create(user=cls.nutritionist_user, expert_type=ExpertType.NUTRITIONIST,
+                              specialization='Ăn kiêng', experience_years=2, bio='<p>CGDD</p>')
+
+        start = date(2025, 1, 1)
+        for i in range(5):
+            HealthTracking.objects.create(
+                user=cls.regular, date=start + timedelta(days=i), steps=1000 * i,
+                heart_rate=None if i % 2 else 70 + i, water_intake=1.5 + i, bmi=Decimal('22.5') if i else None
+            )
+
+        senders = [cls.user, cls.nameless, cls.trainer_user, cls.nutritionist_user]
+        for i, sender in enumerate(senders):
+            receiver = cls.trainer_user if sender != cls.trainer_user else cls.user
+            ChatMessage.objects.create(sender=sender, receiver=receiver, message=f"tin nhắn {i}")
+        ChatMessage.objects.create(sender=cls.user, receiver=cls.trainer_user, image='chat/photo')
+
+        workouts = [Workout.objects.create(name=f"Bài {i}", description='', image='workouts/x', calories_burned=100)
+                    for i in range(2)]
+        for p in range(2):
+            plan = WorkoutPlan.objects.create(user=cls.regular, plan_name=f"Kế hoạch {p}",
+                                              start_date=start, end_date=start + timedelta(days=10))
+            for i in range(3):
+                WorkoutSession.objects.create(workout_plan=plan, workout=workouts[i % 2],
+                                              date=start + timedelta(days=i), duration=30 + i)
+
+    def assertParity(self, projection, serializer_class, queryset, request=None):
+        expected = serializer_class(queryset, many=True, context={'request': request}).data
+        actual = projection.render(list(projection.queryset(queryset)), request)
+        self.assertEqual(render(actual), render(expected))
+
+    def get_request(self, query):
+        return Request(APIRequestFactory().get('/', query))
+
+    def test_health_tracking(self):
+        queryset = HealthTracking.objects.order_by('-date', '-id')
+        self.assertParity(HEALTH_TRACKING_PROJECTION, HealthTrackingSerializer, queryset)
+
+    def test_chat_message(self):
+        queryset = ChatMessage.objects.order_by('-created_date', '-id')
+        self.assertParity(CHAT_MESSAGE_PROJECTION, ChatMessageSerializer, queryset)
+
+    def test_workout_session(self):
+        queryset = WorkoutSession.objects.order_by('-date', 'id')
+        self.assertParity(WORKOUT_SESSION_PROJECTION, WorkoutSessionSerializer, queryset)
+
+    def test_sparse_fields(self):
+        request = self.get_request({'fields': 'id,date,bmi'})
+        queryset = HealthTracking.objects.order_by('-date', '-id')
+        self.assertParity(HEALTH_TRACKING_PROJECTION, HealthTrackingSerializer, queryset, request)
+
+        request = self.get_request({'fields': 'id,sender_name,image'})
+        queryset = ChatMessage.objects.order_by('-created_date', '-id')
+        self.assertParity(CHAT_MESSAGE_PROJECTION, ChatMessageSerializer, queryset, request)
+
+    def test_workout_plan_list(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/workout-plans/')
+        plans = WorkoutPlan.objects.filter(user=self.regular).prefetch_related('sessions')
+        self.assertEqual(render(response.data), render(WorkoutPlanSerializer(plans, many=True).data))
+
+        request = self.get_request({'fields': 'id,plan_name', 'expand': 'sessions'})
+        response = client.get('/workout-plans/', {'fields': 'id,plan_name', 'expand': 'sessions'})
+        expected = WorkoutPlanSerializer(plans, many=True, context={'request': request}).data
+        self.assertEqual(render(response.data), render(expected))
+        self.assertIn('sessions', response.data[0])
+
+
+class RendererTests(TestCase):
+    """orjson phải cho ra đúng byte như JSONRenderer của DRF; MessagePack phải giải mã ra cùng dữ liệu."""
+
+    data = {'id': 1, 'bmi': Decimal('22.50'), 'date': date(2025, 1, 1), 'message': 'xin chào \u2028',
+            'created_date': datetime(2025, 1, 1, 8, 30, tzinfo=timezone.utc), 'items': (1, None, 1.5), 3: True}
+
+    def test_orjson_matches_drf(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), render(self.data))
+
+    def test_msgpack_round_trip(self):
+        body = MessagePackRenderer().render({'note': 'ổn', 'mood': 'happy', 'date': date(2025, 1, 1)})
+        stream = BytesIO(body)
+        self.assertEqual(MessagePackParser().parse(stream), {'note': 'ổn', 'mood': 'happy', 'date': '2025-01-01'})
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(BytesIO(b'\xc1'))
+
+
+class HealthTrackingBulkTests(TestCase):
+    """Đồng bộ theo lô: dòng thiếu chỉ số không được xóa dữ liệu đã lưu."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync', password='x')
+        self.regular = RegularUser.objects.create(user=self.user)
+        HealthProfile.objects.create(user=self.regular, height=170, weight=65, age=30, goal=HealthGoal.MAINTAIN)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.day = date(2025, 3, 3)
+        HealthTracking.objects.bulk_create([HealthTracking(user=self.regular, date=self.day, steps=5000,
+                                                           water_intake=2.0)])
+
+    def post(self, rows):
+        return self.client.post('/health-trackings/bulk/', {'rows': rows}, format='json')
+
+    def test_partial_row_keeps_other_metrics(self):
+        response = self.post([{'date': '2025-03-03', 'heart_rate': 70}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+
+        tracking = HealthTracking.objects.get(user=self.regular, date=self.day)
+        self.assertEqual((tracking.steps, tracking.heart_rate, tracking.water_intake), (5000, 70, 2.0))
+        self.assertEqual(tracking.bmi, Decimal('22.5'))
+        rollup = HealthTrackingRollup.objects.get(user=self.regular, period_type=PeriodType.WEEK,
+                                                  period_start=self.day)
+        self.assertEqual(rollup.total_steps, 5000)
+
+    def test_repeated_dates_are_merged(self):
+        response = self.post([
+            {'date': '2025-03-03', 'steps': 6000},
+            {'date': '2025-03-04', 'steps': 100, 'water_intake': 1.0},
+            {'date': '2025-03-03', 'water_intake': 2.5},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['duplicate', 'created', 'updated'])
+
+        tracking = HealthTracking.objects.get(user=self.regular, date=self.day)
+        self.assertEqual((tracking.steps, tracking.heart_rate, tracking.water_intake), (6000, None, 2.5))
+        created = HealthTracking.objects.get(user=self.regular, date=date(2025, 3, 4))
+        self.assertEqual((created.steps, created.water_intake, created.bmi), (100, 1.0, Decimal('22.5')))
+
+
+class ClientCountTests(TestCase):
+    """Số khách hàng của chuyên gia tính theo dòng hiện tại trong DB, không theo instance đã đọc từ trước."""
+
+    def test_stale_instances_count_once(self):
+        trainer = Expert.objects.create(user=User.objects.create_user(username='t', password='x', role=UserRole.EXPERT),
+                                        expert_type=ExpertType.TRAINER, specialization='', experience_years=1,
+                                        bio='', max_clients=2)
+        regular = RegularUser.objects.create(user=User.objects.create_user(username='u', password='x'))
+
+        first, second = RegularUser.objects.get(pk=regular.pk), RegularUser.objects.get(pk=regular.pk)
+        for instance in (first, second):
+            instance.tracking_mode = TrackingMode.CONNECTED
+            instance.connected_trainer = trainer
+            instance.save()
+
+        trainer.refresh_from_db()
+        self.assertEqual(trainer.client_count, 1)
+        self.assertFalse(trainer.is_full)
+
+
+class RatingTests(TestCase):
+    """Tổng đánh giá của chuyên gia tính chênh lệch từ dòng hiện tại, không từ instance đã đọc từ trước."""
+
+    def setUp(self):
+        self.expert = Expert.objects.create(
+            user=User.objects.create_user(username='t', password='x', role=UserRole.EXPERT),
+            expert_type=ExpertType.TRAINER, specialization='', experience_years=1, bio=''
+        )
+        reviewer = RegularUser.objects.create(user=User.objects.create_user(username='u', password='x'))
+        self.review = Review.objects.create(expert=self.expert, reviewer=reviewer, rating=5)
+
+    def test_stale_updates(self):
+        first, second = Review.objects.get(pk=self.review.pk), Review.objects.get(pk=self.review.pk)
+        first.rating = 3
+        first.save()
+        second.rating = 4
+        second.save()
+
+        self.expert.refresh_from_db()
+        self.assertEqual((self.expert.rating_sum, self.expert.rating_count), (4, 1))
+
+    def test_stale_delete(self):
+        stale = Review.objects.get(pk=self.review.pk)
+        self.review.rating = 2
+        self.review.save()
+        stale.delete()
+        Review.objects.filter(pk=self.review.pk).delete()
+
+        self.expert.refresh_from_db()
+        self.assertEqual((self.expert.rating_sum, self.expert.rating_count, self.expert.rating_score), (0, 0, -1))
+
+
+class HealthImportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='import', password='x')
+        self.regular = RegularUser.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        """Gửi file rồi chạy job ngay trong test (thay cho worker nền), trả về job đã xong."""
+        response = self.client.post('/health-trackings/import/', {'file': SimpleUploadedFile(name, content)},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], JobStatus.PENDING)
+        job = run_import(response.data['id'])
+        self.assertFalse(job.file)
+        return job
+
+    def test_non_finite_and_out_of_range_values_are_invalid(self):
+        job = self.upload('data.csv', b"date,steps,water,heart_rate\n"
+                                      b"2025-01-01,inf,1,70\n2025-01-02,1e30,nan,60\n2025-01-03,100,1.5,-inf\n")
+        self.assertEqual(job.status, JobStatus.COMPLETED)
+        self.assertEqual(job.summary['invalid'], 4)
+        rows = HealthTracking.objects.filter(user=self.regular).order_by('date')
+        self.assertEqual([(row.steps, row.water_intake, row.heart_rate) for row in rows],
+                         [(0, 1.0, 70), (0, 0.0, 60), (100, 1.5, None)])
+
+    def test_apple_health_steps_from_several_sources_are_not_doubled(self):
+        record = ('<Record type="HKQuantityTypeIdentifierStepCount" sourceName="{}" unit="count" '
+                  'startDate="2025-02-01 {}:00:00 +0700" value="{}"/>')
+        records = [record.format('iPhone', 8, 3000), record.format('Apple Watch', 8, 2900),
+                   record.format('iPhone', 9, 1000), record.format('Apple Watch', 9, 1500)]
+        xml = '<?xml version="1.0"?><HealthData>{}</HealthData>'.format(''.join(records)).encode()
+        self.assertEqual(self.upload('export.xml', xml).status, JobStatus.COMPLETED)
+        self.assertEqual(HealthTracking.objects.get(user=self.regular, date=date(2025, 2, 1)).steps, 4400)
+
+    def test_broken_file_fails_the_job(self):
+        job = self.upload('export.xml', b'<HealthData><Record')
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertTrue(job.error.startswith('File không hợp lệ'))
+        self.assertEqual(self.client.get(f'/import-jobs/{job.pk}/').data['status'], JobStatus.FAILED)
+
+
+class AnomalyTests(TestCase):
+
+    def test_anomalies_that_no_longer_qualify_are_removed(self):
+        regular = RegularUser.objects.create(user=User.objects.create_user(username='u', password='x'))
+        today = date(2025, 3, 1)
+        for offset in range(1, 29):
+            HealthTracking.objects.create(user=regular, date=today - timedelta(days=offset), heart_rate=60 + offset % 3)
+        spike = HealthTracking.objects.create(user=regular, date=today, heart_rate=150)
+
+        self.assertEqual(detect_anomalies([regular.pk], today=today), 1)
+        HealthAnomaly.objects.update(is_read=True)
+        self.assertEqual(detect_anomalies([regular.pk], today=today), 1)
+        self.assertTrue(HealthAnomaly.objects.get(user=regular, date=today).is_read)
+
+        spike.heart_rate = 61
+        spike.save()
+        self.assertEqual(detect_anomalies([regular.pk], today=today), 0)
+        self.assertFalse(HealthAnomaly.objects.filter(user=regular).exists())
+
+
+class IntradaySampleTests(TestCase):
+
+    def test_bad_query_parameters_are_rejected(self):
+        user = User.objects.create_user(username='u', password='x')
+        RegularUser.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        for params in ({'date': '2025-13-45'}, {'metric': 'unknown'}, {'user_id': 'abc'}):
+            response = client.get('/health-trackings/samples/', params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(client.get('/health-trackings/samples/', {'date': '2025-01-01'}).status_code, 200)
+
+
+class DataExportTests(TestCase):
+
+    def test_rows_are_read_in_keyset_batches(self):
+        regular = RegularUser.objects.create(user=User.objects.create_user(username='u', password='x'))
+        for day in range(5):
+            HealthTracking.objects.create(user=regular, date=date(2025, 1, 1) + timedelta(days=day), steps=day)
+
+        with mock.patch('healths.exports.EXPORT_CHUNK_SIZE', 2), self.assertNumQueries(3):
+            rows = list(iter_rows(HealthTracking.objects.filter(user=regular)))
+        self.assertEqual([row['steps'] for row in rows], [0, 1, 2, 3, 4])
+
+
+class ReportJobTests(TestCase):
+
+    def test_client_progress_covers_whole_edge_period(self):
+        regular = RegularUser.objects.create(user=User.objects.create_user(username='u', password='x'))
+        HealthTracking.objects.create(user=regular, date=date(2025, 1, 10), steps=100)
+        workout = Workout.objects.create(name='Bài', description='', image='workouts/x', calories_burned=50)
+        plan = WorkoutPlan.objects.create(user=regular, plan_name='Kế hoạch', start_date=date(2025, 1, 1),
+                                          end_date=date(2025, 1, 31))
+        WorkoutSession.objects.create(workout_plan=plan, workout=workout, date=date(2025, 1, 10), duration=30)
+
+        result = client_progress({'client_ids': [regular.pk], 'period': PeriodType.WEEK,
+                                  'date_from': '2025-01-07', 'date_to': '2025-01-08'})
+        self.assertEqual((result['date_from'], result['date_to']), ('2025-01-06', '2025-01-12'))
+        point, = result['clients'][0]['series']
+        self.assertEqual((point['steps'], point['workout_duration']), (100, 30))
+
+
+class KeysetPaginationTests(TestCase):
+
+    def test_cursor_with_bad_values_is_not_found(self):
+        user = User.objects.create_user(username='cursor', password='x')
+        RegularUser.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        for position in (['notadate', 1], [None, 1], ['2025-01-01', 'x']):
+            cursor = base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+            response = client.get('/health-trackings/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+    def test_cached_directory_links_follow_request_host(self):
+        for name in ('a', 'b'):
+            Expert.objects.create(user=User.objects.create_user(username=name, password='x', role=UserRole.EXPERT),
+                                  expert_type=ExpertType.TRAINER, specialization='', experience_years=1, bio='')
+        user = User.objects.create_user(username='cursor', password='x')
+        RegularUser.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        for host in ('first.example', 'second.example'):
+            response = client.get('/experts/trainers/', {'page_size': 1}, HTTP_HOST=host)
+            self.assertTrue(response.data['data']['next'].startswith(f'http://{host}/experts/trainers/'), host)
+
+
+class HealthProgressTests(TestCase):
+
+    def test_future_dated_rows_are_not_counted(self):
+        user = User.objects.create_user(username='progress', password='x')
+        regular = RegularUser.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        today = date(2025, 3, 12)
+        for day, steps in ((today - timedelta(days=1), 100), (today, 200), (today + timedelta(days=1), 5000)):
+            HealthTracking.objects.create(user=regular, date=day, steps=steps, heart_rate=60, water_intake=1.0)
 
-# Create your tests here.
+        with mock.patch('healths.views.now', return_value=datetime(2025, 3, 12, 12, tzinfo=timezone.utc)):
+            week = client.get('/reports/user-health-progress/', {'period': 'week'}).data
+            month = client.get('/reports/user-health-progress/', {'period': 'month'}).data
+        self.assertEqual((week['steps'], week['water_intake']), (300, 2.0))
+        self.assertEqual(month['steps'], 300)
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+
+def lttb(points, threshold):
+    """
+    Giảm số điểm của chuỗi thời gian bằng thuật toán Largest-Triangle-Three-Buckets.
+    points: danh sách tuple (x, y, ...) đã sắp xếp theo x, x và y là số, các phần tử sau được giữ nguyên.
+    Trả về tối đa `threshold` điểm, luôn giữ điểm đầu và điểm cuối.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Điểm trung bình của bucket kế tiếp
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in span) / len(span)
+        avg_y = sum(p[1] for p in span) / len(span)
+
+        # Chọn điểm trong bucket hiện tại tạo tam giác lớn nhất với điểm đã chọn trước và điểm trung bình
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = points[a][0], points[a][1]
+        max_area, chosen = -1.0, start
+        for j in range(start, end):
+            x, y = points[j][0], points[j][1]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > max_area:
+                max_area, chosen = area, j
+
+        sampled.append(points[chosen])
+        a = chosen
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def bucket_start(granularity, day):
+    """Ngày bắt đầu của kỳ chứa `day`, khớp với TruncDay/TruncWeek/TruncMonth (tuần bắt đầu thứ Hai)."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def iter_bucket_starts(granularity, start, end):
+    """Sinh ngày bắt đầu của mọi kỳ giao với [start, end], kể cả kỳ không có dữ liệu."""
+    current = bucket_start(granularity, start)
+    while current <= end:
+        yield current
+        if granularity == 'week':
+            current += timedelta(days=7)
+        elif granularity == 'month':
+            current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        else:
+            current += timedelta(days=1)
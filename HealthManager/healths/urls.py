@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (UserViewSet, ExpertViewSet, HealthProfileViewSet, HealthTrackingViewSet, WorkoutViewSet,
                     WorkoutPlanViewSet, MealViewSet, MealPlanViewSet, HealthJournalViewSet, ReminderViewSet,
-                    ChatMessageViewSet, ReviewViewSet, ReportViewSet)
+                    ChatMessageViewSet, ReviewViewSet, ReportViewSet, DataExportViewSet,
+                    HealthImportJobViewSet, ReportJobViewSet, ChallengeViewSet)
 
 router = DefaultRouter()
 router.register('users', UserViewSet, basename='user')
@@ -18,6 +19,10 @@ router.register(r'reminders', ReminderViewSet, basename='reminder')
 router.register(r'reviews', ReviewViewSet, basename='review')
 router.register(r'chats', ChatMessageViewSet, basename='chat')
 router.register(r'reports', ReportViewSet, basename='reports')
+router.register(r'exports', DataExportViewSet, basename='data-export')
+router.register(r'import-jobs', HealthImportJobViewSet, basename='health-import-job')
+router.register(r'report-jobs', ReportJobViewSet, basename='report-job')
+router.register(r'challenges', ChallengeViewSet, basename='challenge')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,16 +1,59 @@
+import time
+
 from rest_framework import viewsets, status, generics, permissions, parsers, serializers
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
 from .models import (User, Expert, Workout, Review, RegularUser, ExpertType, Gender, HealthProfile, HealthTracking,
-                     WorkoutPlan, MealPlan, Meal, HealthJournal, Reminder, ChatMessage, WorkoutSession)
-from .serializers import (UserSerializer, ReviewSerializer, UserConnectedSerializer, ExpertSerializer, MealSerializer,
+                     WorkoutPlan, MealPlan, MealPlanMeal, Meal, HealthJournal, Reminder, ChatMessage, WorkoutSession,
+                     IntradaySampleChunk, PeriodType, DataExportJob, HealthImportJob, JobStatus,
+                     HealthAnomaly, ReportJob, ReportType, Challenge, ChallengeParticipant, WeeklyReport)
+from .serializers import (UserSerializer, ReviewSerializer, UserConnectedSerializer, ExpertSerializer,
+                          ExpertDirectorySerializer, MealSerializer,
                           HealthProfileSerializer, HealthTrackingSerializer, WorkoutSerializer, WorkoutPlanSerializer,
-                          MealPlanSerializer, HealthJournalSerializer, ReminderSerializer, ChatMessageSerializer)
+                          MealPlanSerializer, HealthJournalSerializer, ReminderSerializer, ChatMessageSerializer,
+                          HealthTrackingBulkItemSerializer, IntradaySampleBatchSerializer, DataExportJobSerializer,
+                          IntradaySampleQuerySerializer, HealthImportSerializer, HealthImportJobSerializer,
+                          HealthAnomalySerializer, ReportJobSerializer, ReportJobDetailSerializer,
+                          ReportJobCreateSerializer, ChallengeSerializer, MealPlanDetailSerializer,
+                          WeeklyReportSerializer)
+from .intraday import merge_samples, decode_slots, iter_samples
+from .rollups import period_start, summary_expressions, totals_until
+from .timeseries import lttb, iter_bucket_starts
+from .exports import start_export
+from .imports import start_import, detect_format
+from .anomalies import detect_anomalies
+from .report_cache import cached_report, report_cache_stats
+from .directory_cache import cached_directory
+from .report_jobs import queue_report_job
+from .challenges import top_entries, rank_of, compute_score, MAX_LEADERBOARD_SIZE
+from .renderers import ORJSONParser, MessagePackParser
+from .nutrition import daily_nutrition, summarize_days
+from .search import search_experts
+from .recommendations import recommend, MAX_RECOMMENDATIONS
+from .cohort import cohort_queryset, COHORT_FIELDS, COHORT_METRICS, COHORT_ORDERING
+from .paginators import KeysetPagination
+from .projections import HEALTH_TRACKING_PROJECTION, CHAT_MESSAGE_PROJECTION, plan_sessions
 from .perm import CanReviewExpert, IsExpert, IsRegularUser, IsOwnerOrExpertConnected, IsTrainer
-from django.db.models import Q, Avg, F, Case, When, Value, FloatField, Sum
-from django.utils.timezone import now, timedelta
+from django.db.models import Q, Avg, F, Sum, Min, Max, Count
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils.dateparse import parse_date
+from django.utils.timezone import now, timedelta, localtime
+
+# Số bản ghi tối đa cho một lần đồng bộ từ thiết bị
+MAX_BULK_TRACKING_ROWS = 1000
+
+# Chuỗi dữ liệu cho biểu đồ (HealthTrackingViewSet.list với from/to/bucket/max_points)
+SERIES_PARAMS = ('from', 'to', 'bucket', 'max_points')
+SERIES_BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+SERIES_AGGREGATES = {'steps': Sum, 'water_intake': Sum, 'heart_rate': Avg, 'bmi': Avg}
+DEFAULT_SERIES_POINTS = 200
+MAX_SERIES_POINTS = 2000
+
+# Báo cáo theo khoảng thời gian bất kỳ (ReportViewSet.health_range)
+MAX_REPORT_BUCKETS = 1000
 
 
 def success_response(message, data, status_code=status.HTTP_200_OK):
@@ -69,11 +112,11 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
 
             user.save()
 
-            serializer = UserSerializer(user)
+            serializer = UserSerializer(user, context={'request': request})
             return success_response("Cập nhật thông tin người dùng thành công", serializer.data)
 
         # GET method: trả về thông tin user
-        serializer = UserSerializer(user)
+        serializer = UserSerializer(user, context={'request': request})
         return success_response("Lấy thông tin người dùng", serializer.data)
 
     @action(methods=['get', 'patch'], url_path='tracking', detail=False,
@@ -89,13 +132,15 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
             serializer.save()
             return success_response("Cập nhật chế độ theo dõi thành công", serializer.data)
 
-        return success_response("Thông tin chế độ theo dõi", UserConnectedSerializer(regular).data)
+        serializer = UserConnectedSerializer(regular, context={'request': request})
+        return success_response("Thông tin chế độ theo dõi", serializer.data)
 
 # ------ExpertViewSet------
 class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
     queryset = Expert.objects.all()
     serializer_class = ExpertSerializer
-    parser_classes = [parsers.JSONParser, parsers.MultiPartParser]
+    pagination_class = KeysetPagination
+    parser_classes = [ORJSONParser, MessagePackParser, parsers.MultiPartParser]
 
 
     def create(self, request, *args, **kwargs):
@@ -111,7 +156,7 @@ class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
         expert = request.user.expert_profile
         user = request.user
 
-        allowed_expert_fields = ['specialization', 'experience_years', 'bio']
+        allowed_expert_fields = ['specialization', 'experience_years', 'bio', 'max_clients']
         allowed_user_fields = ['first_name', 'last_name', 'email', 'phone', 'gender', 'avatar']
 
         if request.method == 'PATCH':
@@ -136,6 +181,23 @@ class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
                         status_code=status.HTTP_400_BAD_REQUEST
                     )
 
+            # Giới hạn số khách hàng: số nguyên dương, để trống là không giới hạn
+            if 'max_clients' in data:
+                max_clients = data['max_clients']
+                if max_clients in ('', None):
+                    max_clients = None
+                else:
+                    try:
+                        max_clients = int(max_clients)
+                        if max_clients < 1:
+                            raise ValueError
+                    except (TypeError, ValueError):
+                        return error_response(
+                            {"max_clients": "Số khách hàng tối đa phải là số nguyên dương."},
+                            status_code=status.HTTP_400_BAD_REQUEST
+                        )
+                data = {**data, 'max_clients': max_clients}
+
             # Cập nhật expert fields
             for field in allowed_expert_fields:
                 if field in data:
@@ -153,91 +215,126 @@ class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
             expert.save()
             user.save()
 
-            serializer = ExpertSerializer(expert)
+            serializer = ExpertSerializer(expert, context={'request': request})
             return success_response("Cập nhật thông tin chuyên gia thành công", serializer.data)
 
         # GET method: trả về dữ liệu chuyên gia
-        serializer = ExpertSerializer(expert)
+        serializer = ExpertSerializer(expert, context={'request': request})
         return success_response("Lấy thông tin chuyên gia", serializer.data)
 
-    @action(methods=['get'], detail=False, url_path='trainers',
-            permission_classes=[permissions.IsAuthenticated, IsRegularUser])
-    def list_trainers(self, request):
-        queryset = Expert.objects.filter(expert_type=ExpertType.TRAINER).annotate(
-            avg_rating=Avg('reviews__rating')
-        ).annotate(
-            sort_rating=Case(
-                When(avg_rating__isnull=True, then=Value(-1)),
-                default=F('avg_rating'),
-                output_field=FloatField()
-            )
-        )
+    @staticmethod
+    def _directory_filters(request):
+        """Chuẩn hóa bộ lọc danh sách chuyên gia, giá trị không hợp lệ bị bỏ qua như trước."""
+        params = request.query_params
+        filters = {}
 
         # Lọc theo min_rating nếu có
-        min_rating = request.query_params.get('min_rating')
-        if min_rating is not None:
-            try:
-                min_rating = float(min_rating)
-                queryset = queryset.filter(avg_rating__gte=min_rating)
-            except ValueError:
-                pass
+        try:
+            filters['min_rating'] = float(params['min_rating'])
+        except (KeyError, ValueError):
+            pass
 
         # Lọc theo specialization nếu có
-        specialization = request.query_params.get('specialization')
-        if specialization:
-            queryset = queryset.filter(specialization__icontains=specialization)
+        if params.get('specialization'):
+            filters['specialization'] = params['specialization']
 
         # Lọc theo min_experience nếu có
-        min_experience = request.query_params.get('min_experience')
-        if min_experience is not None:
-            try:
-                min_experience = int(min_experience)
-                queryset = queryset.filter(experience_years__gte=min_experience)
-            except ValueError:
-                pass
-
-        queryset = queryset.order_by('-sort_rating', 'user__last_name')
+        try:
+            filters['min_experience'] = int(params['min_experience'])
+        except (KeyError, ValueError):
+            pass
+
+        q = params.get('q', '').strip()
+        if q:
+            filters['q'] = q
+
+        # Chỉ lấy chuyên gia còn nhận khách
+        if params.get('available') in ('1', 'true'):
+            filters['available'] = True
+        return filters
+
+    @staticmethod
+    def _directory_queryset(expert_type, filters):
+        # Điểm đánh giá, số khách hàng đã được lưu sẵn trên Expert; user lấy cùng truy vấn bằng join
+        queryset = Expert.objects.filter(expert_type=expert_type).select_related('user')
+
+        if 'min_rating' in filters:
+            queryset = queryset.filter(rating_count__gt=0, rating_score__gte=filters['min_rating'])
+        if 'specialization' in filters:
+            queryset = queryset.filter(specialization__icontains=filters['specialization'])
+        if 'min_experience' in filters:
+            queryset = queryset.filter(experience_years__gte=filters['min_experience'])
+        if filters.get('available'):
+            queryset = queryset.filter(Expert.available_filter())
+
+        # Tìm kiếm theo tên, chuyên môn, giới thiệu (không phân biệt dấu), xếp theo độ liên quan
+        if 'q' in filters:
+            return search_experts(queryset, filters['q']).order_by('-relevance', '-rating_score', 'user__last_name')
+        return queryset.order_by('-rating_score', 'user__last_name')
+
+    def _directory(self, request, expert_type):
+        """
+        Một trang danh sách chuyên gia (phân trang keyset) ở dạng rút gọn.
+        Kết quả được cache theo bộ lọc và trang, mọi thay đổi Expert/User/Review làm mới toàn bộ (xem signals.py).
+        Cache chỉ giữ cursor, link next/previous được dựng theo host của từng request.
+        """
+        filters = self._directory_filters(request)
+        paginator = KeysetPagination()
+        page_key = {**filters, 'cursor': request.query_params.get(paginator.cursor_query_param),
+                    'page_size': paginator.get_page_size(request), 'fields': request.query_params.get('fields'),
+                    'expand': request.query_params.get('expand')}
+
+        def compute():
+            page = paginator.paginate_queryset(self._directory_queryset(expert_type, filters), request, self)
+            serializer = ExpertDirectorySerializer(page, many=True, context={'request': request})
+            return {'next': paginator.cursor_token(paginator.next_position, reverse=False),
+                    'previous': paginator.cursor_token(paginator.previous_position, reverse=True),
+                    'results': serializer.data}
+
+        data = cached_directory(expert_type, page_key, compute)
+        return {'next': paginator.get_cursor_link(request, data['next']),
+                'previous': paginator.get_cursor_link(request, data['previous']),
+                'results': data['results']}
 
-        serializer = ExpertSerializer(queryset, many=True)
-        return success_response("Danh sách huấn luyện viên", serializer.data)
+    @action(methods=['get'], detail=False, url_path='trainers',
+            permission_classes=[permissions.IsAuthenticated, IsRegularUser])
+    def list_trainers(self, request):
+        return success_response("Danh sách huấn luyện viên", self._directory(request, ExpertType.TRAINER))
 
     @action(methods=['get'], detail=False, url_path='nutritionists',
             permission_classes=[permissions.IsAuthenticated, IsRegularUser])
     def list_nutritionists(self, request):
-        queryset = Expert.objects.filter(expert_type=ExpertType.NUTRITIONIST).annotate(
-            avg_rating=Avg('reviews__rating')
-        ).annotate(
-            sort_rating=Case(
-                When(avg_rating__isnull=True, then=Value(-1)),
-                default=F('avg_rating'),
-                output_field=FloatField()
-            )
-        )
-
-        min_rating = request.query_params.get('min_rating')
-        if min_rating is not None:
-            try:
-                min_rating = float(min_rating)
-                queryset = queryset.filter(avg_rating__gte=min_rating)
-            except ValueError:
-                pass
-
-        specialization = request.query_params.get('specialization')
-        if specialization:
-            queryset = queryset.filter(specialization__icontains=specialization)
-
-        min_experience = request.query_params.get('min_experience')
-        if min_experience is not None:
-            try:
-                min_experience = int(min_experience)
-                queryset = queryset.filter(experience_years__gte=min_experience)
-            except ValueError:
-                pass
-
-        queryset = queryset.order_by('-sort_rating', 'user__last_name')
+        return success_response("Danh sách chuyên gia dinh dưỡng", self._directory(request, ExpertType.NUTRITIONIST))
 
-        serializer = ExpertSerializer(queryset, many=True)
-        return success_response("Danh sách chuyên gia dinh dưỡng", serializer.data)
+    @action(methods=['get'], detail=False, url_path='recommended',
+            permission_classes=[permissions.IsAuthenticated, IsRegularUser])
+    def recommended(self, request):
+        """Chuyên gia phù hợp với mục tiêu trong hồ sơ sức khỏe mới nhất của người dùng, kèm điểm đề xuất."""
+        expert_type = request.query_params.get('expert_type')
+        if expert_type and expert_type not in ExpertType.values:
+            return error_response("expert_type không hợp lệ.")
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return error_response("limit phải là số nguyên.")
+        limit = max(1, min(limit, MAX_RECOMMENDATIONS))
+
+        goal = HealthProfile.objects.filter(user=request.user.regular_profile) \
+            .order_by('-created_date', '-id').values_list('goal', flat=True).first()
+        ranked = recommend(goal, expert_type, limit)
+
+        experts = Expert.objects.select_related('user').in_bulk([expert_id for expert_id, _, _ in ranked])
+        data = []
+        for expert_id, score, details in ranked:
+            # Đặc trưng được cache theo version danh sách, chuyên gia có thể vừa bị xóa hoặc vừa đủ khách
+            expert = experts.get(expert_id)
+            if expert is None or expert.is_full:
+                continue
+            item = ExpertSerializer(expert).data
+            item['match_score'] = score
+            item['score_details'] = details
+            data.append(item)
+        return success_response("Chuyên gia được đề xuất", {'goal': goal, 'results': data})
 
     @action(methods=['get'], url_path='connected-users', detail=False,
             permission_classes=[permissions.IsAuthenticated, IsExpert])
@@ -261,25 +358,140 @@ class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
                 Q(last_name__icontains=search_query)
             )
 
-        users_queryset = users_queryset.order_by('last_name')  # Sắp xếp
+        users_queryset = users_queryset.order_by('last_name', 'id')  # Sắp xếp
+
+        page = self.paginate_queryset(users_queryset)
+        serializer = UserSerializer(page, many=True, context={'request': request})
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], url_path='cohort', detail=False,
+            permission_classes=[permissions.IsAuthenticated, IsExpert])
+    def cohort(self, request):
+        """
+        Toàn bộ người dùng đang kết nối kèm chỉ số mới nhất và tổng tuần hiện tại, trong một truy vấn.
+        ?ordering=-week_steps (nhiều trường cách nhau dấu phẩy), ?goal=, ?q=, ?min_<chỉ số>=, ?max_<chỉ số>=.
+        """
+        expert = request.user.expert_profile
+        clients = RegularUser.objects.filter(Q(connected_trainer=expert) | Q(connected_nutritionist=expert))
+        today = localtime().date()
+        queryset = cohort_queryset(clients, period_start(PeriodType.WEEK, today), until=today)
+
+        search_query = request.query_params.get('q')
+        if search_query:
+            queryset = queryset.filter(
+                Q(user__username__icontains=search_query) |
+                Q(user__first_name__icontains=search_query) |
+                Q(user__last_name__icontains=search_query)
+            )
+        goal = request.query_params.get('goal')
+        if goal:
+            queryset = queryset.filter(goal=goal)
+        for metric in COHORT_METRICS:
+            for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+                value = request.query_params.get(f'{bound}_{metric}')
+                if value is None:
+                    continue
+                try:
+                    queryset = queryset.filter(**{f'{metric}__{lookup}': float(value)})
+                except ValueError:
+                    return error_response(f"{bound}_{metric} phải là số.")
+
+        ordering = []
+        for field in request.query_params.get('ordering', 'last_name').split(','):
+            name = field.strip().lstrip('-')
+            if name not in COHORT_ORDERING:
+                return error_response(f"Không thể sắp xếp theo '{name}'.")
+            expression = F(name)
+            ordering.append(expression.desc(nulls_last=True) if field.strip().startswith('-')
+                            else expression.asc(nulls_last=True))
+        queryset = queryset.order_by(*ordering, 'id')
+
+        return success_response("Tổng quan khách hàng", list(queryset.values(*COHORT_FIELDS)))
+
+    @action(methods=['get'], url_path='anomalies', detail=False,
+            permission_classes=[permissions.IsAuthenticated, IsExpert])
+    def anomalies(self, request):
+        """
+        Các chỉ số bất thường (nhịp tim, bước chân) của người dùng đang kết nối.
+        Lọc theo ?metric=, ?user_id=, ?unread=1. Chạy lại phát hiện bằng POST anomalies/refresh/.
+        """
+        expert = request.user.expert_profile
+        clients = RegularUser.objects.filter(Q(connected_trainer=expert) | Q(connected_nutritionist=expert))
+
+        queryset = HealthAnomaly.objects.filter(user__in=clients).select_related('user__user')
+        metric = request.query_params.get('metric')
+        if metric:
+            queryset = queryset.filter(metric=metric)
+        user_id = request.query_params.get('user_id')
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        if request.query_params.get('unread') == '1':
+            queryset = queryset.filter(is_read=False)
+
+        page = self.paginate_queryset(queryset.order_by('-date', '-id'))
+        serializer = HealthAnomalySerializer(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['post'], url_path='anomalies/refresh', detail=False,
+            permission_classes=[permissions.IsAuthenticated, IsExpert])
+    def refresh_anomalies(self, request):
+        """Chạy lại phát hiện bất thường cho toàn bộ khách hàng đang kết nối."""
+        expert = request.user.expert_profile
+        client_ids = RegularUser.objects.filter(
+            Q(connected_trainer=expert) | Q(connected_nutritionist=expert)
+        ).values_list('id', flat=True)
+        return success_response("Đã cập nhật bất thường", {"detected": detect_anomalies(client_ids)})
+
+    @action(methods=['post'], url_path='anomalies/mark-read', detail=False,
+            permission_classes=[permissions.IsAuthenticated, IsExpert])
+    def mark_anomalies_read(self, request):
+        expert = request.user.expert_profile
+        ids = request.data.get('ids')
+        if not isinstance(ids, list):
+            return error_response("ids phải là danh sách.")
+        updated = HealthAnomaly.objects.filter(
+            Q(user__connected_trainer=expert) | Q(user__connected_nutritionist=expert), id__in=ids
+        ).update(is_read=True)
+        return success_response("Đã đánh dấu đã xem", {"updated": updated})
+
+    @action(methods=['get'], url_path='weekly-reports', detail=False,
+            permission_classes=[permissions.IsAuthenticated, IsExpert])
+    def weekly_reports(self, request):
+        """Báo cáo tuần đã sinh cho khách hàng (lệnh generate_weekly_reports), lọc theo ?week_start=, ?client_id=."""
+        queryset = WeeklyReport.objects.filter(expert=request.user.expert_profile).select_related('client__user')
+        week_start = parse_date(request.query_params.get('week_start', '') or '')
+        if week_start:
+            queryset = queryset.filter(week_start=week_start)
+        client_id = request.query_params.get('client_id')
+        if client_id:
+            queryset = queryset.filter(client_id=client_id)
 
-        serializer = UserSerializer(users_queryset, many=True)
+        page = self.paginate_queryset(queryset.order_by('-week_start', '-id'))
+        serializer = WeeklyReportSerializer(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
 
-        return success_response("Danh sách người dùng đang kết nối", serializer.data)
+    @action(methods=['get'], url_path=r'weekly-reports/(?P<report_id>[^/.]+)/download', detail=False,
+            url_name='weekly-report-download', permission_classes=[permissions.IsAuthenticated, IsExpert])
+    def weekly_report_download(self, request, report_id=None):
+        report = get_object_or_404(WeeklyReport, pk=report_id, expert=request.user.expert_profile)
+        try:
+            handle = report.file.open('rb')
+        except FileNotFoundError:
+            raise Http404("File báo cáo không còn tồn tại.")
+        filename = f"bao_cao_tuan_{report.week_start.isoformat()}_{report.client_id}.html"
+        return FileResponse(handle, as_attachment=True, filename=filename, content_type='text/html; charset=utf-8')
 
     @action(methods=['get'], url_path='connected-user-count', detail=False,
             permission_classes=[permissions.IsAuthenticated, IsExpert])
     def connected_user_count(self, request):
         expert = request.user.expert_profile
 
-        if expert.expert_type == ExpertType.TRAINER:
-            total_count = User.objects.filter(regular_profile__connected_trainer=expert).count()
-        elif expert.expert_type == ExpertType.NUTRITIONIST:
-            total_count = User.objects.filter(regular_profile__connected_nutritionist=expert).count()
-        else:
-            total_count = 0
-
-        return success_response("Số lượng người dùng đang kết nối", {"total_count": total_count})
+        # Bộ đếm được cập nhật khi người dùng kết nối/hủy kết nối, không cần COUNT
+        return success_response("Số lượng người dùng đang kết nối", {
+            "total_count": expert.client_count,
+            "max_clients": expert.max_clients,
+        })
 
     @action(methods=['get'], detail=True, url_path='user-detail',
             permission_classes=[permissions.IsAuthenticated, IsExpert])
@@ -293,7 +505,7 @@ class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
             return error_response("Bạn không có quyền xem người dùng này", status.HTTP_403_FORBIDDEN)
 
         user = user_profile.user
-        serializer = UserSerializer(user)
+        serializer = UserSerializer(user, context={'request': request})
 
         return success_response("Chi tiết người dùng kết nối", serializer.data)
 
@@ -302,7 +514,7 @@ class ExpertViewSet(viewsets.ViewSet, generics.CreateAPIView):
                 permission_classes=[permissions.IsAuthenticated, IsRegularUser])
     def expert_detail(self, request, pk=None):
         expert = get_object_or_404(Expert, pk=pk)
-        serializer = ExpertSerializer(expert)
+        serializer = ExpertSerializer(expert, context={'request': request})
         return success_response("Chi tiết chuyên gia", serializer.data)
 
 # ------HealthProfileViewSet------
@@ -378,6 +590,7 @@ class HealthProfileViewSet(viewsets.ViewSet, generics.CreateAPIView):
 class HealthTrackingViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.DestroyAPIView):
     queryset = HealthTracking.objects.all()
     serializer_class = HealthTrackingSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrExpertConnected]
 
     def get_queryset(self):
@@ -399,8 +612,62 @@ class HealthTrackingViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.D
         if field in ['bmi', 'steps', 'heart_rate', 'water_intake']:
             queryset = queryset.exclude(**{f"{field}__isnull": True})
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        if any(param in request.query_params for param in SERIES_PARAMS):
+            return self._series(request, queryset, field)
+
+        # Đường đọc nhanh: dựng dữ liệu từ .values(), cùng schema với HealthTrackingSerializer
+        page = self.paginate_queryset(HEALTH_TRACKING_PROJECTION.queryset(queryset.order_by('-date', '-id')))
+        return self.get_paginated_response(HEALTH_TRACKING_PROJECTION.render(page, request))
+
+    def _series(self, request, queryset, field):
+        """
+        Chuỗi dữ liệu của một chỉ số để vẽ biểu đồ: gom nhóm theo ngày/tuần/tháng trong DB
+        rồi giảm còn tối đa max_points điểm bằng LTTB.
+        """
+        if field not in SERIES_AGGREGATES:
+            return Response({"detail": "Tham số field không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = request.query_params
+        user_id = params.get('user_id')
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+
+        try:
+            date_from = parse_date(params['from']) if params.get('from') else None
+            date_to = parse_date(params['to']) if params.get('to') else None
+            max_points = min(max(int(params.get('max_points', DEFAULT_SERIES_POINTS)), 3), MAX_SERIES_POINTS)
+        except ValueError:
+            return Response({"detail": "Tham số from/to/max_points không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+
+        bucket = params.get('bucket', 'auto')
+        if bucket == 'auto':
+            bounds = queryset.aggregate(first=Min('date'), last=Max('date'))
+            first, last = date_from or bounds['first'], date_to or bounds['last']
+            days = (last - first).days + 1 if first and last else 0
+            # Chọn bucket nhỏ nhất mà số điểm không vượt quá ~4 lần max_points, phần còn lại để LTTB giảm
+            bucket = 'day' if days <= max_points * 4 else 'week' if days <= max_points * 28 else 'month'
+        if bucket not in SERIES_BUCKETS:
+            return Response({"detail": "Tham số bucket không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = queryset.annotate(bucket=SERIES_BUCKETS[bucket]('date')).values('bucket').annotate(
+            value=SERIES_AGGREGATES[field](field)
+        ).order_by('bucket').values_list('bucket', 'value')
+
+        points = [(day.toordinal(), float(value), day) for day, value in rows if value is not None]
+        points = lttb(points, max_points)
+
+        return Response({
+            "field": field,
+            "bucket": bucket,
+            "from": date_from,
+            "to": date_to,
+            "points": [{"date": day, "value": value} for _, value, day in points],
+        })
 
     def create(self, request, *args, **kwargs):
         reg_user = RegularUser.objects.get(user=request.user)
@@ -409,6 +676,119 @@ class HealthTrackingViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.D
         serializer.save(user=reg_user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(methods=['post'], url_path='bulk', detail=False)
+    def bulk(self, request):
+        """
+        Đồng bộ nhiều ngày dữ liệu từ thiết bị trong một request.
+        Mỗi dòng được kiểm tra riêng, các dòng hợp lệ được upsert theo (user, date).
+        Chỉ số không có trong dòng được giữ nguyên ở bản ghi đã có.
+        """
+        started = time.perf_counter()
+        reg_user = RegularUser.objects.get(user=request.user)
+
+        rows = request.data.get('rows') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"detail": "Dữ liệu phải là danh sách các bản ghi."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > MAX_BULK_TRACKING_ROWS:
+            return Response({"detail": f"Tối đa {MAX_BULK_TRACKING_ROWS} bản ghi mỗi lần đồng bộ."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(rows)
+        valid = {}  # date -> (index, data), dòng sau cùng của cùng một ngày được giữ lại
+        for index, row in enumerate(rows):
+            item = HealthTrackingBulkItemSerializer(data=row)
+            if not item.is_valid():
+                results[index] = {"index": index, "status": "invalid", "errors": item.errors}
+                continue
+            data = item.validated_data
+            if data['date'] in valid:
+                duplicate_index, previous = valid[data['date']]
+                results[duplicate_index] = {"index": duplicate_index, "date": data['date'], "status": "duplicate"}
+                # Các chỉ số chỉ có ở dòng trước vẫn được giữ, dòng sau ghi đè phần trùng
+                data = {**previous, **data}
+            valid[data['date']] = (index, data)
+
+        existing = HealthTracking.bulk_upsert(reg_user, [data for _, data in valid.values()]) if valid else set()
+
+        for day, (index, _) in valid.items():
+            results[index] = {"index": index, "date": day, "status": "updated" if day in existing else "created"}
+
+        elapsed = time.perf_counter() - started
+        return Response({
+            "received": len(rows),
+            "written": len(valid),
+            "created": len(valid) - len(existing),
+            "updated": len(existing),
+            "invalid": sum(1 for r in results if r['status'] == 'invalid'),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "rows_per_second": round(len(valid) / elapsed, 1) if elapsed else None,
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], url_path='import', detail=False, parser_classes=[parsers.MultiPartParser])
+    def import_file(self, request):
+        """
+        Nhập dữ liệu lịch sử từ file CSV hoặc export của Apple Health (.xml/.zip).
+        on_conflict=update ghi đè các ngày đã có, on_conflict=skip giữ nguyên chúng.
+        File được lưu lại và nhập trong worker nền, theo dõi kết quả ở /import-jobs/<id>/.
+        """
+        reg_user = RegularUser.objects.get(user=request.user)
+        serializer = HealthImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = serializer.validated_data['file']
+        file_format = serializer.validated_data.get('format') or detect_format(upload.name)
+        if file_format is None:
+            return Response({"detail": "Không nhận diện được định dạng file, hãy truyền format=csv hoặc xml."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        job = start_import(reg_user, upload, file_format, serializer.validated_data['on_conflict'])
+        return Response(HealthImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(methods=['get', 'post'], url_path='samples', detail=False)
+    def samples(self, request):
+        """
+        GET: trả về các mẫu theo phút của một ngày (?date=&metric=, expert dùng thêm ?user_id=).
+        POST: ghi mẫu theo phút từ thiết bị, giá trị theo ngày của HealthTracking được cập nhật tự động.
+        """
+        if request.method == 'POST':
+            reg_user = RegularUser.objects.get(user=request.user)
+            serializer = IntradaySampleBatchSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            metric = serializer.validated_data['metric']
+
+            by_day = {}
+            for sample in serializer.validated_data['samples']:
+                local = localtime(sample['timestamp'])
+                by_day.setdefault(local.date(), []).append((local.hour * 60 + local.minute, sample['value']))
+
+            chunks = [merge_samples(reg_user, day, metric, day_samples) for day, day_samples in sorted(by_day.items())]
+            return Response({
+                "metric": metric,
+                "days": [{"date": chunk.date, "sample_count": chunk.sample_count} for chunk in chunks],
+            }, status=status.HTTP_201_CREATED)
+
+        params = IntradaySampleQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        user_id = params.validated_data.get('user_id')
+        if user_id:
+            reg_user = get_object_or_404(RegularUser, pk=user_id)
+        else:
+            reg_user = get_object_or_404(RegularUser, user=request.user)
+        self.check_object_permissions(request, HealthTracking(user=reg_user))
+
+        metric = params.validated_data['metric']
+        day = params.validated_data.get('date') or now().date()
+        chunk = IntradaySampleChunk.objects.filter(user=reg_user, date=day, metric=metric).first()
+        slots = decode_slots(chunk.samples if chunk else None)
+
+        return Response({
+            "date": day,
+            "metric": metric,
+            "samples": [{"minute": minute, "time": f"{minute // 60:02d}:{minute % 60:02d}", "value": value}
+                        for minute, value in iter_samples(slots)],
+        })
+
     @action(methods=['get'], url_path='by-user/(?P<user_id>[^/.]+)', detail=False)
     def list_by_user(self, request, user_id=None):
         try:
@@ -452,6 +832,7 @@ class HealthTrackingViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.D
 class WorkoutViewSet(viewsets.ViewSet, generics.CreateAPIView):
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated, IsRegularUser | IsTrainer]
 
     def get_queryset(self):
@@ -550,24 +931,27 @@ class WorkoutViewSet(viewsets.ViewSet, generics.CreateAPIView):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có bài tập nào."}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='own')
     def own(self, request):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có bài tập nào bạn đã tạo."}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='suggested-by-expert')
     def suggested_by_expert(self, request):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có bài tập nào được chuyên gia gợi ý."}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 # ------WorkoutPlanViewSet------
 class WorkoutPlanViewSet(viewsets.ViewSet, generics.CreateAPIView):
@@ -585,13 +969,21 @@ class WorkoutPlanViewSet(viewsets.ViewSet, generics.CreateAPIView):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có kế hoạch luyện tập nào."}, status=status.HTTP_200_OK)
-        serializer = self.serializer_class(queryset, many=True)
+
+        if self.serializer_class.includes('workout', request):
+            queryset = queryset.prefetch_related('workout')
+        plans = list(queryset)
+        context = {'request': request}
+        if self.serializer_class.includes('sessions', request):
+            # Buổi tập của mọi kế hoạch lấy bằng một truy vấn .values() thay vì serializer lồng cho từng buổi
+            context['plan_sessions'] = plan_sessions(plans)
+        serializer = self.serializer_class(plans, many=True, context=context)
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         queryset = self.get_queryset()
         plan = get_object_or_404(queryset, pk=pk)
-        serializer = WorkoutPlanSerializer(plan)
+        serializer = WorkoutPlanSerializer(plan, context={'request': request})
         return Response(serializer.data)
 
     def create(self, request):
@@ -617,6 +1009,7 @@ class WorkoutPlanViewSet(viewsets.ViewSet, generics.CreateAPIView):
 class MealViewSet(viewsets.ViewSet, generics.CreateAPIView):
     queryset = Meal.objects.all()
     serializer_class = MealSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated, IsRegularUser | IsExpert]
 
     def get_queryset(self):
@@ -704,24 +1097,27 @@ class MealViewSet(viewsets.ViewSet, generics.CreateAPIView):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có bữa ăn nào."}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='own')
     def own(self, request):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có bữa ăn nào bạn đã tạo."}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='suggested-by-expert')
     def suggested_by_expert(self, request):
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có bữa ăn nào được chuyên gia gợi ý."}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 # ------MealPlanViewSet------
@@ -737,15 +1133,16 @@ class MealPlanViewSet(viewsets.ViewSet, generics.CreateAPIView):
         return MealPlan.objects.filter(user=regular_profile)
 
     def list(self, request):
-        queryset = self.get_queryset()
+        # Chỉ prefetch các quan hệ lồng sẽ được trả về (?fields=/?expand=)
+        queryset = self.serializer_class.expand_queryset(self.get_queryset(), request)
         if not queryset.exists():
             return Response({"detail": "Chưa có kế hoạch dinh dưỡng nào."}, status=status.HTTP_200_OK)
-        serializer = self.serializer_class(queryset, many=True)
+        serializer = self.serializer_class(queryset, many=True, context={'request': request})
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         plan = get_object_or_404(self.get_queryset(), pk=pk)
-        serializer = self.serializer_class(plan)
+        serializer = MealPlanDetailSerializer(plan, context={'request': request})
         return Response(serializer.data)
 
     def create(self, request):
@@ -775,6 +1172,7 @@ class HealthJournalViewSet(viewsets.ViewSet,
                            generics.DestroyAPIView):
     serializer_class = HealthJournalSerializer
     permission_classes = [permissions.IsAuthenticated, IsRegularUser]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -784,11 +1182,12 @@ class HealthJournalViewSet(viewsets.ViewSet,
         return HealthJournal.objects.filter(user=regular_profile, active=True)
 
     def list(self, request):
-        queryset = self.get_queryset().order_by('-date')
+        queryset = self.get_queryset().order_by('-date', '-id')
         if not queryset.exists():
             return Response({"detail": "Chưa có nhật ký sức khỏe nào."}, status=status.HTTP_200_OK)
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.serializer_class(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request):
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -798,7 +1197,7 @@ class HealthJournalViewSet(viewsets.ViewSet,
 
     def retrieve(self, request, pk=None):
         journal = get_object_or_404(self.get_queryset(), pk=pk)
-        serializer = self.serializer_class(journal)
+        serializer = self.serializer_class(journal, context={'request': request})
         return Response(serializer.data)
 
     def partial_update(self, request, pk=None):  # PATCH only
@@ -832,7 +1231,7 @@ class ReminderViewSet(viewsets.ViewSet,
         queryset = self.get_queryset()
         if not queryset.exists():
             return Response({"detail": "Chưa có nhắc nhở nào."}, status=status.HTTP_200_OK)
-        serializer = self.serializer_class(queryset, many=True)
+        serializer = self.serializer_class(queryset, many=True, context={'request': request})
         return Response(serializer.data)
 
     def create(self, request):
@@ -843,7 +1242,7 @@ class ReminderViewSet(viewsets.ViewSet,
 
     def retrieve(self, request, pk=None):
         reminder = get_object_or_404(self.get_queryset(), pk=pk)
-        serializer = self.serializer_class(reminder)
+        serializer = self.serializer_class(reminder, context={'request': request})
         return Response(serializer.data)
 
     def partial_update(self, request, pk=None):  # PATCH (update một phần)
@@ -862,16 +1261,17 @@ class ReminderViewSet(viewsets.ViewSet,
 class ReviewViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView, generics.RetrieveAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated, CanReviewExpert]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Lấy tất cả review của một chuyên gia
         expert_id = self.kwargs.get('expert_pk')
-        return Review.objects.filter(expert_id=expert_id).order_by('-created_at')
+        return Review.objects.filter(expert_id=expert_id).order_by('-created_at', '-id')
 
     def list(self, request, expert_pk=None):
-        queryset = self.get_queryset()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(self.serializer_class.expand_queryset(self.get_queryset(), request))
+        serializer = self.serializer_class(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, expert_pk=None):
         user = request.user
@@ -906,7 +1306,7 @@ class ReviewViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIVi
                 return Response({"detail": "Không thể chỉnh sửa đánh giá vì chưa có đánh giá."}, status=400)
 
         if request.method == 'GET':
-            serializer = self.serializer_class(review)
+            serializer = self.serializer_class(review, context={'request': request})
             return Response(serializer.data)
 
         elif request.method == 'PATCH':
@@ -923,6 +1323,7 @@ class ChatMessageViewSet(viewsets.ViewSet,
                          generics.DestroyAPIView):
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -935,16 +1336,16 @@ class ChatMessageViewSet(viewsets.ViewSet,
             return ChatMessage.objects.filter(
                 (Q(sender=user) & Q(receiver__id=receiver_id)) |
                 (Q(sender__id=receiver_id) & Q(receiver=user))
-            ).order_by('created_at')
+            ).order_by('created_date', 'id')
         else:
             return ChatMessage.objects.filter(
                 Q(sender=user) | Q(receiver=user)
-            ).order_by('-created_at')
+            ).order_by('-created_date', '-id')
 
     def list(self, request):
-        queryset = self.get_queryset()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        # Đường đọc nhanh: dựng dữ liệu từ .values(), cùng schema với ChatMessageSerializer
+        page = self.paginate_queryset(CHAT_MESSAGE_PROJECTION.queryset(self.get_queryset()))
+        return self.get_paginated_response(CHAT_MESSAGE_PROJECTION.render(page, request))
 
     def create(self, request):
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -980,7 +1381,7 @@ class ChatMessageViewSet(viewsets.ViewSet,
 
     def retrieve(self, request, pk=None):
         message = get_object_or_404(self.get_queryset(), pk=pk)
-        serializer = self.serializer_class(message)
+        serializer = self.serializer_class(message, context={'request': request})
         return Response(serializer.data)
 
     def partial_update(self, request, pk=None):
@@ -1009,6 +1410,136 @@ class ChatMessageViewSet(viewsets.ViewSet,
 
         return Response({"detail": "Tin nhắn đã được thu hồi."}, status=status.HTTP_200_OK)
 
+# ------DataExportViewSet------
+class DataExportViewSet(viewsets.ViewSet):
+    serializer_class = DataExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated, IsRegularUser]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return DataExportJob.objects.none()
+        return DataExportJob.objects.filter(user=self.request.user.regular_profile).order_by('-created_date')
+
+    def list(self, request):
+        serializer = self.serializer_class(self.get_queryset(), many=True, context={'request': request})
+        return Response(serializer.data)
+
+    def create(self, request):
+        # Đã có job đang chờ/đang chạy thì trả lại job đó, tránh xuất trùng
+        job = self.get_queryset().filter(status__in=[JobStatus.PENDING, JobStatus.RUNNING]).first()
+        if job:
+            return Response(self.serializer_class(job, context={'request': request}).data, status=status.HTTP_200_OK)
+        job = start_export(request.user.regular_profile)
+        return Response(self.serializer_class(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(self.serializer_class(job, context={'request': request}).data)
+
+    @action(methods=['get'], detail=True, url_path='download', url_name='download')
+    def download(self, request, pk=None):
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        if job.status != JobStatus.COMPLETED or not job.file:
+            return Response({"detail": "Dữ liệu chưa xuất xong."}, status=status.HTTP_409_CONFLICT)
+        try:
+            handle = job.file.open('rb')
+        except FileNotFoundError:
+            raise Http404("File xuất dữ liệu không còn tồn tại.")
+        return FileResponse(handle, as_attachment=True, filename=f"health_export_{job.pk}.zip")
+
+# ------HealthImportJobViewSet------
+class HealthImportJobViewSet(viewsets.ViewSet):
+    """Trạng thái và kết quả các lần nhập file (tạo job qua POST /health-trackings/import/)."""
+    serializer_class = HealthImportJobSerializer
+    permission_classes = [permissions.IsAuthenticated, IsRegularUser]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return HealthImportJob.objects.none()
+        return HealthImportJob.objects.filter(user=self.request.user.regular_profile).order_by('-created_date')
+
+    def list(self, request):
+        return Response(self.serializer_class(self.get_queryset(), many=True).data)
+
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(self.serializer_class(job).data)
+
+# ------ChallengeViewSet------
+class ChallengeViewSet(viewsets.ViewSet, generics.CreateAPIView):
+    """
+    Thử thách bước chân/uống nước theo khoảng thời gian. Chuyên gia tạo, người dùng tham gia.
+    Điểm được cộng dồn khi ghi HealthTracking nên bảng xếp hạng chỉ đọc chỉ mục, không tính lại tổng.
+    """
+    serializer_class = ChallengeSerializer
+    pagination_class = KeysetPagination
+
+    def get_permissions(self):
+        if self.action == 'create':
+            return [permissions.IsAuthenticated(), IsExpert()]
+        if self.action in ('join', 'leave', 'my_rank'):
+            return [permissions.IsAuthenticated(), IsRegularUser()]
+        return [permissions.IsAuthenticated()]
+
+    def get_queryset(self):
+        return Challenge.objects.filter(active=True)
+
+    def list(self, request):
+        queryset = self.get_queryset()
+        if request.query_params.get('ongoing') == '1':
+            today = localtime().date()
+            queryset = queryset.filter(start_date__lte=today, end_date__gte=today)
+        page = self.paginate_queryset(queryset.order_by('-start_date', '-id'))
+        serializer = self.serializer_class(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    def retrieve(self, request, pk=None):
+        challenge = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(self.serializer_class(challenge, context={'request': request}).data)
+
+    @action(methods=['post'], detail=True, url_path='join')
+    def join(self, request, pk=None):
+        challenge = get_object_or_404(self.get_queryset(), pk=pk)
+        if challenge.end_date < localtime().date():
+            return Response({"detail": "Thử thách đã kết thúc."}, status=status.HTTP_400_BAD_REQUEST)
+        participant, created = ChallengeParticipant.objects.get_or_create(
+            challenge=challenge, user=request.user.regular_profile
+        )
+        if created:
+            # Điểm ban đầu là tổng dữ liệu đã ghi trong khoảng thời gian thử thách
+            participant.score = compute_score(participant)
+            participant.save(update_fields=['score', 'updated_date'])
+        return Response({"score": participant.score, "rank": rank_of(participant)},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=True, url_path='leave')
+    def leave(self, request, pk=None):
+        challenge = get_object_or_404(self.get_queryset(), pk=pk)
+        challenge.participants.filter(user=request.user.regular_profile).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['get'], detail=True, url_path='leaderboard')
+    def leaderboard(self, request, pk=None):
+        challenge = get_object_or_404(self.get_queryset(), pk=pk)
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({"detail": "limit phải là số nguyên."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_LEADERBOARD_SIZE))
+        return Response(top_entries(challenge, limit))
+
+    @action(methods=['get'], detail=True, url_path='my-rank')
+    def my_rank(self, request, pk=None):
+        challenge = get_object_or_404(self.get_queryset(), pk=pk)
+        participant = challenge.participants.filter(user=request.user.regular_profile).first()
+        if participant is None:
+            return Response({"detail": "Bạn chưa tham gia thử thách này."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"score": participant.score, "rank": rank_of(participant),
+                         "participants": challenge.participants.count()})
+
 # ------ReportViewSet------
 class ReportViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
@@ -1038,6 +1569,35 @@ class ReportViewSet(viewsets.ViewSet):
             queryset = queryset.filter(date__gte=start_date, date__lte=today)
         return queryset
 
+    def _health_progress(self, regular_user, period):
+        """
+        Tiến độ sức khỏe trong tuần/tháng/năm hiện tại tính đến hôm nay, đọc từ bảng tổng hợp thay vì quét
+        toàn bộ HealthTracking. Kỳ không hợp lệ được hiểu là toàn bộ lịch sử (gộp các dòng tổng hợp theo năm).
+        """
+        if period in PeriodType.values:
+            # Như trước đây (date <= hôm nay): bản ghi có ngày trong tương lai của kỳ hiện tại không được tính
+            totals = totals_until(regular_user.pk, period, now().date())
+            summary = {
+                'total_steps': totals['total_steps'],
+                'avg_heart_rate': totals['heart_rate_sum'] / totals['heart_rate_count']
+                if totals['heart_rate_count'] else None,
+                'total_water_intake': totals['total_water'],
+            }
+        else:
+            summary = regular_user.tracking_rollups.filter(period_type=PeriodType.YEAR) \
+                .aggregate(**summary_expressions())
+
+        # Lấy BMI từ bản ghi mới nhất trong khoảng thời gian
+        latest_bmi = self._filter_time_range(regular_user.health_tracking.all(), period) \
+            .exclude(bmi__isnull=True).order_by('-date').values_list('bmi', flat=True).first()
+
+        return {
+            "steps": summary['total_steps'] or 0,
+            "avg_heart_rate": summary['avg_heart_rate'] or 0,
+            "water_intake": summary['total_water_intake'] or 0,
+            "bmi": float(latest_bmi) if latest_bmi is not None else None,
+        }
+
     @action(detail=False, methods=['get'], url_path='user-health-progress')
     def user_health_progress(self, request):
         user = request.user
@@ -1046,25 +1606,78 @@ class ReportViewSet(viewsets.ViewSet):
             return Response({"detail": "User không có profile theo dõi"}, status=status.HTTP_400_BAD_REQUEST)
 
         period = request.query_params.get('period', 'week')
-        health_tracking_qs = regular_profile.health_tracking.all()
-        health_tracking_qs = self._filter_time_range(health_tracking_qs, period)
+        return Response(cached_report('health_progress', regular_profile.pk, period,
+                                      lambda: self._health_progress(regular_profile, period)))
 
-        total_steps = health_tracking_qs.aggregate(total_steps=Sum('steps'))['total_steps'] or 0
-        avg_heart_rate = health_tracking_qs.aggregate(avg_hr=Avg('heart_rate'))['avg_hr'] or 0
-        total_water = health_tracking_qs.aggregate(total_water=Sum('water_intake'))['total_water'] or 0
+    @action(detail=False, methods=['get'], url_path='health-range')
+    def health_range(self, request):
+        """
+        Báo cáo sức khỏe cho khoảng ?from=&to= bất kỳ theo ?granularity=day|week|month, một truy vấn gom nhóm.
+        Kỳ không có dữ liệu vẫn được trả về với giá trị rỗng. Chuyên gia truyền thêm ?client_id=.
+        """
+        client_id = request.query_params.get('client_id')
+        if client_id:
+            client_regular_user = RegularUser.objects.filter(id=client_id).first()
+            if client_regular_user is None:
+                return Response({"detail": "Client không tồn tại"}, status=status.HTTP_404_NOT_FOUND)
+            if not self.is_expert_connected_to_user(request.user, client_regular_user):
+                return Response({"detail": "Bạn không được phép xem dữ liệu của client này"},
+                                status=status.HTTP_403_FORBIDDEN)
+            regular_profile = client_regular_user
+        else:
+            regular_profile = self.get_user_regular_profile(request.user)
+            if not regular_profile:
+                return Response({"detail": "User không có profile theo dõi"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Lấy BMI từ bản ghi mới nhất trong khoảng thời gian
-        latest_tracking = health_tracking_qs.order_by('-date').first()
-        bmi = None
-        if latest_tracking and latest_tracking.height and latest_tracking.weight:
-            height_m = latest_tracking.height / 100  # cm -> m
-            bmi = round(latest_tracking.weight / (height_m ** 2), 2)
+        params = request.query_params
+        try:
+            date_from = parse_date(params.get('from', ''))
+            date_to = parse_date(params.get('to', ''))
+        except ValueError:
+            date_from = date_to = None
+        if not date_from or not date_to or date_from > date_to:
+            return Response({"detail": "Cần from và to hợp lệ (YYYY-MM-DD), from không sau to."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        granularity = params.get('granularity', 'day')
+        if granularity not in SERIES_BUCKETS:
+            return Response({"detail": "granularity chỉ nhận day, week hoặc month."}, status=status.HTTP_400_BAD_REQUEST)
+
+        starts = []
+        for start in iter_bucket_starts(granularity, date_from, date_to):
+            if len(starts) == MAX_REPORT_BUCKETS:
+                return Response({"detail": f"Tối đa {MAX_REPORT_BUCKETS} kỳ mỗi báo cáo, hãy chọn granularity lớn hơn."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            starts.append(start)
+
+        rows = regular_profile.health_tracking.filter(date__gte=date_from, date__lte=date_to).annotate(
+            bucket=SERIES_BUCKETS[granularity]('date')
+        ).values('bucket').annotate(
+            days=Count('id'),
+            steps=Sum('steps'),
+            water_intake=Sum('water_intake'),
+            avg_heart_rate=Avg('heart_rate'),
+            avg_bmi=Avg('bmi'),
+        ).order_by('bucket')
+        by_bucket = {row['bucket']: row for row in rows}
+
+        buckets = []
+        for start in starts:
+            row = by_bucket.get(start)
+            buckets.append({
+                "start": start,
+                "days": row['days'] if row else 0,
+                "steps": row['steps'] if row else 0,
+                "water_intake": row['water_intake'] if row else 0,
+                "avg_heart_rate": round(row['avg_heart_rate'], 1) if row and row['avg_heart_rate'] is not None else None,
+                "avg_bmi": round(float(row['avg_bmi']), 1) if row and row['avg_bmi'] is not None else None,
+            })
 
         return Response({
-            "steps": total_steps,
-            "avg_heart_rate": avg_heart_rate,
-            "water_intake": total_water,
-            "bmi": bmi
+            "from": date_from,
+            "to": date_to,
+            "granularity": granularity,
+            "buckets": buckets,
         })
 
     @action(detail=False, methods=['get'], url_path='user-workout-stats')
@@ -1081,18 +1694,49 @@ class ReportViewSet(viewsets.ViewSet):
         if period not in ['week', 'month']:
             return Response({"detail": "Chỉ cho phép tuần hoặc tháng cho thống kê luyện tập"}, status=status.HTTP_400_BAD_REQUEST)
 
-        workout_sessions = WorkoutSession.objects.filter(workout_plan__user=regular_profile)
+        return Response(cached_report('workout_stats', regular_profile.pk, period,
+                                      lambda: self._workout_stats(regular_profile, period)))
+
+    def _workout_stats(self, regular_user, period):
+        workout_sessions = WorkoutSession.objects.filter(workout_plan__user=regular_user)
         workout_sessions = self._filter_time_range(workout_sessions, period)
 
-        total_duration = workout_sessions.aggregate(total_duration=Sum('duration'))['total_duration'] or 0
-        total_calories = workout_sessions.aggregate(
-            total_calories=Sum('workout__calories_burned')
-        )['total_calories'] or 0
+        totals = workout_sessions.aggregate(
+            total_duration=Sum('duration'),
+            total_calories=Sum('workout__calories_burned'),
+        )
+        return {
+            "total_workout_duration": totals['total_duration'] or 0,
+            "total_calories_burned": totals['total_calories'] or 0,
+        }
 
-        return Response({
-            "total_workout_duration": total_duration,
-            "total_calories_burned": total_calories,
-        })
+    @action(detail=False, methods=['get'], url_path='user-meal-stats')
+    def user_meal_stats(self, request):
+        """
+        Người dùng xem dinh dưỡng (calo, protein, carbs, fat) theo từng ngày và tổng của tuần/tháng/năm
+        """
+        user = request.user
+        regular_profile = self.get_user_regular_profile(user)
+        if not regular_profile:
+            return Response({"detail": "User không có profile theo dõi"}, status=status.HTTP_400_BAD_REQUEST)
+
+        period = request.query_params.get('period', 'week')
+        if period not in PeriodType.values:
+            return Response({"detail": "Chỉ cho phép tuần, tháng hoặc năm cho thống kê dinh dưỡng"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(cached_report('meal_stats', regular_profile.pk, period,
+                                      lambda: self._meal_stats(regular_profile, period)))
+
+    def _meal_stats(self, regular_user, period):
+        plan_meals = self._filter_time_range(MealPlanMeal.objects.filter(meal_plan__user=regular_user), period)
+        days = [{**day, 'date': day['date'].isoformat()} for day in daily_nutrition(plan_meals)]
+        return {"period": period, **summarize_days(days), "per_day": days}
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Số lần đọc trúng/trượt cache của từng loại báo cáo, đếm trong tiến trình đang xử lý request."""
+        return Response(report_cache_stats())
 
     @action(detail=False, methods=['get'], url_path='expert-client-health-progress')
     def expert_client_health_progress(self, request):
@@ -1114,22 +1758,63 @@ class ReportViewSet(viewsets.ViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         period = request.query_params.get('period', 'week')
-        health_tracking_qs = client_regular_user.health_tracking.all()
-        health_tracking_qs = self._filter_time_range(health_tracking_qs, period)
+        return Response(cached_report('health_progress', client_regular_user.pk, period,
+                                      lambda: self._health_progress(client_regular_user, period)))
+
 
-        total_steps = health_tracking_qs.aggregate(total_steps=Sum('steps'))['total_steps'] or 0
-        avg_heart_rate = health_tracking_qs.aggregate(avg_hr=Avg('heart_rate'))['avg_hr'] or 0
-        total_water = health_tracking_qs.aggregate(total_water=Sum('water_intake'))['total_water'] or 0
+# ------ReportJobViewSet------
+class ReportJobViewSet(viewsets.ViewSet):
+    """
+    Báo cáo dài hạn (nhiều năm, nhiều khách hàng) chạy nền trong pool tiến trình worker.
+    POST tạo job, GET /report-jobs/<id>/ để theo dõi trạng thái và lấy kết quả khi hoàn thành.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ReportJob.objects.none()
+        return ReportJob.objects.filter(requested_by=self.request.user).order_by('-id')
 
-        latest_tracking = health_tracking_qs.order_by('-date').first()
-        bmi = None
-        if latest_tracking and latest_tracking.height and latest_tracking.weight:
-            height_m = latest_tracking.height / 100
-            bmi = round(latest_tracking.weight / (height_m ** 2), 2)
+    def list(self, request):
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        return paginator.get_paginated_response(ReportJobSerializer(page, many=True, context={'request': request}).data)
 
-        return Response({
-            "steps": total_steps,
-            "avg_heart_rate": avg_heart_rate,
-            "water_intake": total_water,
-            "bmi": bmi
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(ReportJobDetailSerializer(job, context={'request': request}).data)
+
+    def create(self, request):
+        serializer = ReportJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        user = request.user
+
+        if hasattr(user, 'expert_profile'):
+            expert = user.expert_profile
+            allowed = set(RegularUser.objects.filter(
+                Q(connected_trainer=expert) | Q(connected_nutritionist=expert)
+            ).values_list('id', flat=True))
+            client_ids = data.get('client_ids') or sorted(allowed)
+            if not set(client_ids) <= allowed:
+                return Response({"detail": "Bạn không được phép xem dữ liệu của một số client này"},
+                                status=status.HTTP_403_FORBIDDEN)
+        elif hasattr(user, 'regular_profile'):
+            own = user.regular_profile.pk
+            client_ids = data.get('client_ids') or [own]
+            if client_ids != [own]:
+                return Response({"detail": "Chỉ được xem báo cáo của chính mình"}, status=status.HTTP_403_FORBIDDEN)
+        else:
+            return Response({"detail": "User không có profile theo dõi"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not client_ids:
+            return Response({"detail": "Chưa có client nào được kết nối"}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = queue_report_job(user, ReportType.CLIENT_PROGRESS, {
+            'client_ids': client_ids,
+            'date_from': data['date_from'].isoformat(),
+            'date_to': data['date_to'].isoformat(),
+            'period': data['period'],
         })
+        return Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
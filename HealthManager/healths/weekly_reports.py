@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q, Sum, Count
+from django.template.loader import render_to_string
+from django.utils.timezone import now
+
+from .cohort import cohort_queryset, COHORT_FIELDS
+from .models import (Expert, RegularUser, HealthTracking, HealthAnomaly, WorkoutSession, WeeklyReport,
+                     HealthTrackingRollup, PeriodType, export_storage)
+from .workers import init_worker, spawn_context
+
+WEEKLY_REPORT_TEMPLATE = 'reports/weekly_report.html'
+
+
+def report_name(week_start, expert_id, client_id):
+    return f"weekly_reports/{week_start.isoformat()}/expert_{expert_id}_client_{client_id}.html"
+
+
+def collect_payloads(expert, week_start):
+    """
+    Dữ liệu tuần của mọi khách hàng của một chuyên gia, lấy theo lô: mỗi loại dữ liệu một truy vấn cho cả danh sách.
+    Trả về danh sách dict thuần (có thể pickle) để render trong tiến trình worker.
+    """
+    week_end = week_start + timedelta(days=6)
+    previous_start = week_start - timedelta(days=7)
+    clients = RegularUser.objects.filter(Q(connected_trainer=expert) | Q(connected_nutritionist=expert))
+    overview = list(cohort_queryset(clients, week_start).values(*COHORT_FIELDS).order_by('id'))
+    client_ids = [row['id'] for row in overview]
+
+    days = {}
+    for row in HealthTracking.objects.filter(user_id__in=client_ids, date__gte=week_start, date__lte=week_end) \
+            .values('user_id', 'date', 'steps', 'heart_rate', 'water_intake', 'bmi').order_by('date'):
+        days.setdefault(row['user_id'], []).append(row)
+
+    previous = dict(HealthTrackingRollup.objects.filter(
+        user_id__in=client_ids, period_type=PeriodType.WEEK, period_start=previous_start
+    ).values_list('user_id', 'total_steps'))
+
+    workouts = {row['workout_plan__user_id']: row for row in WorkoutSession.objects.filter(
+        workout_plan__user_id__in=client_ids, date__gte=week_start, date__lte=week_end
+    ).values('workout_plan__user_id').annotate(
+        sessions=Count('id'), duration=Sum('duration'), calories=Sum('workout__calories_burned')
+    ).order_by()}
+
+    anomalies = {}
+    for row in HealthAnomaly.objects.filter(user_id__in=client_ids, date__gte=week_start, date__lte=week_end) \
+            .values('user_id', 'date', 'metric', 'value', 'baseline', 'z_score').order_by('date'):
+        anomalies.setdefault(row['user_id'], []).append(row)
+
+    expert_name = expert.user.get_full_name() or expert.user.username
+    return [{
+        'expert_id': expert.pk,
+        'expert_name': expert_name,
+        'week_start': week_start,
+        'week_end': week_end,
+        'client': client,
+        'days': days.get(client['id'], []),
+        'previous_week_steps': previous.get(client['id']),
+        'workouts': workouts.get(client['id']),
+        'anomalies': anomalies.get(client['id'], []),
+        'generated_at': now(),
+    } for client in overview]
+
+
+def render_and_store(payload):
+    """Chạy trong tiến trình worker: render HTML và ghi vào thư mục lưu trữ, trả về (client_id, tên file)."""
+    html = render_to_string(WEEKLY_REPORT_TEMPLATE, payload)
+    name = report_name(payload['week_start'], payload['expert_id'], payload['client']['id'])
+    path = export_storage().path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return payload['expert_id'], payload['client']['id'], name
+
+
+def generate_weekly_reports(week_start, expert_ids=None, workers=None, chunk_size=8):
+    """
+    Sinh báo cáo tuần cho mọi khách hàng của các chuyên gia: lấy dữ liệu theo lô ở tiến trình chính,
+    render song song trong pool tiến trình, sau đó upsert các dòng WeeklyReport. Trả về số báo cáo.
+    """
+    experts = Expert.objects.select_related('user').order_by('id')
+    if expert_ids:
+        experts = experts.filter(id__in=expert_ids)
+
+    payloads = []
+    for expert in experts:
+        payloads.extend(collect_payloads(expert, week_start))
+    if not payloads:
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        # Đóng kết nối trước khi tạo pool, tiến trình con tự mở kết nối riêng nếu cần
+        connection.close()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn_context(), initializer=init_worker) as pool:
+            results = list(pool.map(render_and_store, payloads, chunksize=chunk_size))
+    else:
+        results = [render_and_store(payload) for payload in payloads]
+
+    WeeklyReport.objects.bulk_create(
+        [WeeklyReport(expert_id=expert_id, client_id=client_id, week_start=week_start, file=name)
+         for expert_id, client_id, name in results],
+        batch_size=1000, **_upsert_options()
+    )
+    return len(results)
+
+
+def _upsert_options():
+    options = {'update_conflicts': True, 'update_fields': ['file', 'updated_date']}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['expert', 'client', 'week_start']
+    return options
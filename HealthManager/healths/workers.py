@@ -0,0 +1,19 @@
+"""
+Khởi tạo tiến trình worker cho các tác vụ nặng chạy trong ProcessPoolExecutor.
+Module này không import model để có thể nạp trước khi Django được setup trong tiến trình con.
+"""
+import multiprocessing
+
+
+def init_worker():
+    import django
+    django.setup()
+
+    from django.db import connections
+    # Không dùng lại kết nối DB nào từ tiến trình cha
+    connections.close_all()
+
+
+def spawn_context():
+    # spawn thay vì fork: tiến trình con không kế thừa socket DB hay khóa của tiến trình web
+    return multiprocessing.get_context('spawn')
@@ -32,8 +32,9 @@ const HomeScreen = () => {
         setConnectedExperts(resExpert.data || {});
         setTodayWorkout(resWorkout.data || []);
         setTodayMeals(resMeal.data || []);
-        setSuggestedWorkouts(resSuggWorkout.data || []);
-        setSuggestedMeals(resSuggMeal.data || []);
+        // Danh sách gợi ý được phân trang: { next, previous, results }
+        setSuggestedWorkouts(resSuggWorkout.data?.results || []);
+        setSuggestedMeals(resSuggMeal.data?.results || []);
       } catch (err) {
         console.error(err);
       }